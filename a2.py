@@ -5,8 +5,12 @@ CSSE1001/7030
 Semester 2, 2019
 """
 
+import copy
+import heapq
 import random
 
+from collections import deque
+
 __author__ = "Brae Webb"
 
 
@@ -15,6 +19,8 @@ class Card:
     Abstract representation of a card.
     """
 
+    __slots__ = ()
+
     PLAY_ACTION = "NO_ACTION"
 
     def play(self, player, game):
@@ -29,8 +35,7 @@ class Card:
 
         """
         hand = player.get_hand()
-        slot = hand.get_cards().index(self)
-        hand.remove_card(slot)
+        hand.remove_instance(self)
         hand.add_cards(game.get_pickup_pile().pick())
         game.set_action(self.PLAY_ACTION)
 
@@ -45,6 +50,13 @@ class Card:
         """
         pass
 
+    def get_key(self):
+        """
+        (tuple): Returns a key identifying this card, cards of the same class
+                 with the same number or name have equal keys.
+        """
+        return (self.__class__,)
+
     def __str__(self):
         return f"{self.__class__.__name__}()"
 
@@ -56,6 +68,9 @@ class NumberCard(Card):
     """
     Representation of a card.
     """
+
+    __slots__ = ('_number',)
+
     def __init__(self, number):
         """
         Construct a card with an assigned number.
@@ -70,6 +85,10 @@ class NumberCard(Card):
         """(int): Returns the number assigned to this card."""
         return self._number
 
+    def get_key(self):
+        """(tuple): Returns a key identifying this card by class and number."""
+        return self.__class__, self._number
+
     def play(self, player, game):
         """
         Resolves playing the card and then moves to the next player's turn
@@ -86,6 +105,9 @@ class NumberCard(Card):
 
 
 class NamedCard(Card):
+
+    __slots__ = ('_name',)
+
     def __init__(self, name):
         super().__init__()
         self._name = name
@@ -93,11 +115,18 @@ class NamedCard(Card):
     def get_name(self):
         return self._name
 
+    def get_key(self):
+        """(tuple): Returns a key identifying this card by class and name."""
+        return self.__class__, self._name
+
     def __str__(self):
         return f"{self.__class__.__name__}({self.get_name()})"
 
 
 class CoderCard(NamedCard):
+
+    __slots__ = ()
+
     def play(self, player, game):
         """
         Only sets the action of the game
@@ -111,6 +140,8 @@ class CoderCard(NamedCard):
 
 class TutorCard(NamedCard):
 
+    __slots__ = ()
+
     PLAY_ACTION = "PICKUP_CODER"
 
     def action(self, player, game, slot):
@@ -128,6 +159,9 @@ class TutorCard(NamedCard):
 
 
 class ActionCard(Card):
+
+    __slots__ = ()
+
     def action(self, player, game, slot):
         card = player.get_coders().get_card(slot)
         player.get_coders().remove_card(slot)
@@ -143,6 +177,8 @@ class ActionCard(Card):
 
 class KeyboardKidnapperCard(ActionCard):
 
+    __slots__ = ()
+
     PLAY_ACTION = "STEAL_CODER"
 
     def _perform_action(self, game, player, card):
@@ -152,16 +188,198 @@ class KeyboardKidnapperCard(ActionCard):
 
 class AllNighterCard(ActionCard):
 
+    __slots__ = ()
+
     PLAY_ACTION = "SLEEP_CODER"
 
     def _perform_action(self, game, player, card):
         # place back to sleep
-        for slot, coder in enumerate(game.get_sleeping_coders()):
+        coders = game.get_sleeping_coders()
+        if isinstance(coders, SleepingCoders):
+            slot = coders.first_free_slot()
+            if slot is not None:
+                game.set_sleeping_coder(slot, card)
+            return
+
+        for slot, coder in enumerate(coders):
             if coder is None:
                 game.set_sleeping_coder(slot, card)
                 break
 
 
+class CardPool:
+    """
+    Interns cards so that identical cards are shared as a single flyweight.
+
+    Cards hold no state which changes during a game, so a deck may contain the
+    same instance many times. Card.play removes only the first slot holding
+    the played instance, so exactly one card leaves the hand.
+    """
+    def __init__(self):
+        """
+        Construct an empty pool of cards.
+        """
+        self._cards = {}
+
+    def intern(self, card):
+        """
+        Get the pooled card identical to the given card, adding it to the pool
+        if there is none yet.
+
+        Parameters:
+            card (Card): The card to intern.
+
+        Returns:
+            (Card): The shared instance identical to card.
+        """
+        return self._cards.setdefault(card.get_key(), card)
+
+    def get(self, card_class, *args):
+        """
+        Get the pooled card of a class constructed with the given arguments.
+
+        Parameters:
+            card_class (type): The class of card to get.
+            *args: The number or name of the card, if it has one.
+
+        Returns:
+            (Card): The shared instance of the card.
+        """
+        card = self._cards.get((card_class,) + args)
+        if card is None:
+            card = self.intern(card_class(*args))
+        return card
+
+    def intern_all(self, cards):
+        """
+        Intern every card in a list of cards.
+
+        Parameters:
+            cards (list<Card>): The cards to intern.
+
+        Returns:
+            (list<Card>): The shared instances, in the same order.
+        """
+        intern = self.intern
+        return [intern(card) for card in cards]
+
+    def get_amount(self):
+        """(int): Returns the amount of distinct cards in the pool."""
+        return len(self._cards)
+
+
+class DeckTemplate:
+    """
+    A list of cards compiled once into a table of prototype cards and the id
+    of the prototype at each position, which stamps out decks of new cards.
+
+    New cards are copied from their prototype by setting its slots on a bare
+    instance, one class of card at a time, which costs much less than
+    constructing every card.
+    """
+    def __init__(self, cards):
+        """
+        Compile a list of cards into a template.
+
+        Parameters:
+            cards (list<Card>): The cards of every deck stamped out, in order,
+                                such as a2_support.build_deck(FULL_DECK).
+        """
+        self._prototypes = []
+        self._ids = []
+        prototype_ids = {}
+        for card in cards:
+            card_id = prototype_ids.get(card.get_key())
+            if card_id is None:
+                card_id = prototype_ids[card.get_key()] = len(self._prototypes)
+                self._prototypes.append(card)
+            self._ids.append(card_id)
+
+        self._classes = [self._prototypes[card_id].__class__ for card_id in self._ids]
+        # slot descriptor -> (positions, values) of the cards with the slot set
+        fills = {}
+        # positions of the cards which are not made of slots alone
+        self._copied = []
+        for position, card_id in enumerate(self._ids):
+            prototype = self._prototypes[card_id]
+            if hasattr(prototype, '__dict__'):
+                self._copied.append(position)
+                continue
+            for descriptor, value in _slot_values(prototype):
+                positions, values = fills.setdefault(descriptor, ([], []))
+                positions.append(position)
+                values.append(value)
+        self._fills = [(descriptor.__set__, positions, values)
+                       for descriptor, (positions, values) in fills.items()]
+
+    def get_amount(self):
+        """(int): Returns the amount of cards in each deck."""
+        return len(self._ids)
+
+    def get_prototypes(self):
+        """(list<Card>): Returns the distinct cards, indexed by id."""
+        return self._prototypes
+
+    def get_ids(self):
+        """(list<int>): Returns the id of the prototype of each card, in order."""
+        return self._ids
+
+    def new_cards(self):
+        """(list<Card>): Returns new cards identical to the template's, in order."""
+        cards = list(map(object.__new__, self._classes))
+        for set_slot, positions, values in self._fills:
+            # consume the setter calls without a Python-level loop
+            deque(map(set_slot, map(cards.__getitem__, positions), values), maxlen=0)
+        for position in self._copied:
+            cards[position] = copy.copy(self._prototypes[self._ids[position]])
+        return cards
+
+    def shared_cards(self):
+        """
+        (list<Card>): Returns the prototype of each card, in order, so equal
+                      cards are one flyweight as with a CardPool.
+        """
+        return list(map(self._prototypes.__getitem__, self._ids))
+
+    def new_deck(self, rng=None, shared=False):
+        """
+        Stamp out a deck of the template's cards.
+
+        Parameters:
+            rng (random.Random): If given the deck uses it to shuffle and is
+                                 shuffled.
+            shared (bool): If True the deck holds the prototypes rather than
+                           new cards.
+
+        Returns:
+            (Deck): The new deck.
+        """
+        deck = Deck(self.shared_cards() if shared else self.new_cards())
+        if rng is not None:
+            deck.set_rng(rng)
+            deck.shuffle()
+        return deck
+
+
+def _slot_values(card):
+    """
+    (list<tuple<member_descriptor, object>>): Returns the descriptor and value
+        of each slot set on a card.
+    """
+    slot_values = []
+    for card_class in card.__class__.__mro__:
+        slots = card_class.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for slot in slots:
+            descriptor = card_class.__dict__[slot]
+            try:
+                slot_values.append((descriptor, descriptor.__get__(card)))
+            except AttributeError:
+                pass
+    return slot_values
+
+
 class Deck:
     """
     A collection of ordered cards.
@@ -177,11 +395,167 @@ class Deck:
         if starting_cards is None:
             starting_cards = []
         self._cards = starting_cards
+        # card -> set of slots holding it, only while tracking positions
+        self._positions = None
+        # [amount of decks] sharing self._cards, None if not shared
+        self._owners = None
+        # objects told of every change, None if there are none
+        self._listeners = None
+        # shuffles the deck, None for the random module
+        self._rng = None
+
+    def set_rng(self, rng):
+        """
+        Use a random number generator of its own to shuffle the deck, rather
+        than the random module shared by every deck.
+
+        Parameters:
+            rng (random.Random): The generator to shuffle with, None to use
+                                 the random module again.
+        """
+        self._rng = rng
+
+    def track_positions(self):
+        """
+        Track the slots holding each card so that remove_instance runs in
+        constant time.
+
+        While tracking, a removed card is replaced by the top card rather than
+        shifting every later card down, so the order of the deck is not
+        preserved, and remove_instance removes the card from any slot holding
+        it. The list returned by get_cards must not be modified directly.
+        """
+        positions = {}
+        for slot, card in enumerate(self._cards):
+            positions.setdefault(card, set()).add(slot)
+        self._positions = positions
+
+    def _track(self, card, slot):
+        """Record that a card is held in a slot."""
+        self._positions.setdefault(card, set()).add(slot)
+
+    def _untrack(self, card, slot):
+        """Record that a card is no longer held in a slot."""
+        slots = self._positions[card]
+        slots.remove(slot)
+        if not slots:
+            del self._positions[card]
+
+    def tracks_positions(self):
+        """(bool): True iff the deck is tracking the slots holding each card."""
+        return self._positions is not None
+
+    def add_listener(self, listener):
+        """
+        Tell a listener of every card added to or removed from the deck.
+
+        After a card is placed at a slot, shifting any cards above it up,
+        listener.card_added(deck, slot, card) is called. After a card is taken
+        from a slot, shifting any cards above it down,
+        listener.card_removed(deck, slot, card) is called. Changes made directly
+        to the list returned by get_cards are not seen.
+
+        An operation moving several cards tells its listeners once it is done,
+        so while they are told of the first card the deck may already hold the
+        changes of the rest.
+
+        Parameters:
+            listener (object): The object to tell of changes.
+        """
+        if self._listeners is None:
+            self._listeners = []
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stop telling a listener of changes to the deck.
+
+        Parameters:
+            listener (object): A listener previously added to the deck.
+        """
+        self._listeners.remove(listener)
+        if not self._listeners:
+            self._listeners = None
+
+    def _notify_added(self, slot, cards):
+        """Tell every listener that cards were placed from slot upwards."""
+        for card in cards:
+            for listener in self._listeners:
+                listener.card_added(self, slot, card)
+            slot += 1
+
+    def _notify_removed(self, slot, cards):
+        """Tell every listener that cards were taken from slot downwards."""
+        for card in cards:
+            for listener in self._listeners:
+                listener.card_removed(self, slot, card)
+            slot -= 1
 
     def get_cards(self):
         """(list<Card>): Returns a list of cards in the deck."""
+        if self._owners is not None:
+            self._unshare()
         return self._cards
 
+    def snapshot(self):
+        """
+        Take a copy of this deck in constant time.
+
+        The copy shares the list of cards with this deck until either deck is
+        changed, at which point the changed deck takes its own copy. The copy
+        does not track positions.
+
+        Returns:
+            (Deck): A deck with the same cards as this deck.
+        """
+        deck = Deck()
+        self._share_with(deck)
+        return deck
+
+    def restore(self, snapshot):
+        """
+        Replace the cards in this deck with the cards of a snapshot, sharing
+        them until either deck is changed.
+
+        Parameters:
+            snapshot (Deck): The deck to take the cards of.
+        """
+        replaced = self._cards
+        snapshot._share_with(self)
+        if self._positions is not None:
+            self.track_positions()
+        if self._listeners:
+            self._notify_removed(len(replaced) - 1, replaced[::-1])
+            self._notify_added(0, self._cards)
+
+    def _share_with(self, deck):
+        """
+        Make another deck share the list of cards of this deck.
+
+        Parameters:
+            deck (Deck): The deck whose cards are replaced.
+        """
+        if deck is self:
+            return
+        if deck._owners is not None:
+            deck._owners[0] -= 1
+        if self._owners is None:
+            self._owners = [1]
+        self._owners[0] += 1
+        deck._cards = self._cards
+        deck._owners = self._owners
+
+    def _unshare(self):
+        """
+        Give this deck its own list of cards before it is changed, unless no
+        other deck still shares the list.
+        """
+        owners = self._owners
+        owners[0] -= 1
+        if owners[0]:
+            self._cards = self._cards[:]
+        self._owners = None
+
     def get_card(self, slot):
         """(Card): Return the card at the specified slot in a deck."""
         return self._cards[slot]
@@ -196,7 +570,86 @@ class Deck:
         Parameters:
             slot (int): The slot of the card at which to remove from
         """
-        self._cards.pop(slot)
+        if self._owners is not None:
+            self._unshare()
+        if self._positions is not None:
+            card = self._cards[slot]
+            self._swap_remove(card, slot % len(self._cards))
+        elif self._listeners:
+            card = self._cards.pop(slot)
+            self._notify_removed(slot % (len(self._cards) + 1), (card,))
+        else:
+            self._cards.pop(slot)
+
+    def insert_card(self, slot, card):
+        """
+        Place a card at the given slot in a deck, shifting the cards above it
+        up. While tracking positions the positions of every card are rebuilt.
+
+        Parameters:
+            slot (int): The slot to place the card at.
+            card (Card): The card to place in the deck.
+        """
+        if self._owners is not None:
+            self._unshare()
+        cards = self._cards
+        cards.insert(slot, card)
+        if self._listeners:
+            # the slot the card landed in, as list.insert clamps the slot
+            slot = min(max(slot + len(cards) - 1, 0) if slot < 0 else slot, len(cards) - 1)
+        if self._positions is not None:
+            self.track_positions()
+        if self._listeners:
+            self._notify_added(slot, (card,))
+
+    def remove_instance(self, card):
+        """
+        Remove the first occurrence of a card from the deck, the one in the
+        lowest slot, or while tracking positions the one in any slot.
+
+        Parameters:
+            card (Card): The card to remove, it must be in the deck.
+        """
+        if self._owners is not None:
+            self._unshare()
+        if self._positions is not None:
+            slots = self._positions.get(card)
+            if slots is None:
+                raise ValueError("the card is not in the deck")
+            self._swap_remove(card, next(iter(slots)))
+        elif self._listeners:
+            slot = self._cards.index(card)
+            del self._cards[slot]
+            self._notify_removed(slot, (card,))
+        else:
+            self._cards.remove(card)
+
+    def _swap_remove(self, card, slot):
+        """
+        Remove card from slot by moving the top card into its place.
+
+        Parameters:
+            card (Card): The card held in slot.
+            slot (int): The slot to remove the card from.
+        """
+        cards = self._cards
+        self._untrack(card, slot)
+        top = len(cards) - 1
+        if slot != top:
+            moved = cards[top]
+            cards[slot] = moved
+            self._untrack(moved, top)
+            self._track(moved, slot)
+        cards.pop()
+
+        if self._listeners:
+            if slot != top:
+                # as taking the top card and putting it in place of the removed
+                self._notify_removed(top, (moved,))
+                self._notify_removed(slot, (card,))
+                self._notify_added(slot, (moved,))
+            else:
+                self._notify_removed(slot, (card,))
 
     def get_amount(self):
         """(int): Returns the amount of cards in the deck"""
@@ -206,7 +659,15 @@ class Deck:
         """
         Randomly places all cards in a new order.
         """
-        random.shuffle(self._cards)
+        if self._owners is not None:
+            self._unshare()
+        if self._listeners:
+            self._notify_removed(len(self._cards) - 1, self._cards[::-1])
+        (random if self._rng is None else self._rng).shuffle(self._cards)
+        if self._positions is not None:
+            self.track_positions()
+        if self._listeners:
+            self._notify_added(0, self._cards)
 
     def pick(self, amount=1):
         """
@@ -218,11 +679,41 @@ class Deck:
         Returns:
             (list<Card>): Cards taken from the deck.
         """
-        cards = []
-        for _ in range(amount):
-            cards.append(self._cards.pop())
+        if self._owners is not None:
+            self._unshare()
+        deck = self._cards
+        if amount > len(deck):
+            raise IndexError("pick from a deck with too few cards")
+
+        # slice once rather than popping card by card
+        split = len(deck) - amount
+        cards = deck[split:]
+        cards.reverse()
+        del deck[split:]
+
+        if self._positions is not None:
+            # cards are in the order picked, from the top slot down
+            slot = len(self._cards) + len(cards)
+            for card in cards:
+                slot -= 1
+                self._untrack(card, slot)
+        if self._listeners:
+            self._notify_removed(split + len(cards) - 1, cards)
         return cards
 
+    def deal(self, players, amount):
+        """
+        Deal cards from the deck into the hand of every player, as if each
+        player picked the amount of cards in turn.
+
+        Parameters:
+            players (list<Player>): The players to deal to, in order.
+            amount (int): The amount of cards dealt to each player.
+        """
+        dealt = self.pick(amount * len(players))
+        for seat, player in enumerate(players):
+            player.get_hand().add_cards(dealt[seat * amount:(seat + 1) * amount])
+
     def add_card(self, card):
         """
         Place a single card on the top of the deck.
@@ -230,7 +721,13 @@ class Deck:
         Parameters:
             card (Card): The card to place on the deck.
         """
+        if self._owners is not None:
+            self._unshare()
+        if self._positions is not None:
+            self._track(card, len(self._cards))
         self._cards.append(card)
+        if self._listeners:
+            self._notify_added(len(self._cards) - 1, (card,))
 
     def add_cards(self, cards):
         """
@@ -239,7 +736,19 @@ class Deck:
         Parameters:
             cards (list<Card>): The cards to place on the deck.
         """
-        self._cards.extend(cards)
+        if self._owners is not None:
+            self._unshare()
+        if self._positions is not None:
+            slot = len(self._cards)
+            for card in cards:
+                self._track(card, slot)
+                slot += 1
+        if self._listeners:
+            slot = len(self._cards)
+            self._cards.extend(cards)
+            self._notify_added(slot, self._cards[slot:])
+        else:
+            self._cards.extend(cards)
 
     def copy(self, other_deck):
         """
@@ -248,7 +757,11 @@ class Deck:
         Parameters:
             other_deck (Deck): Another deck with cards to copy into this deck.
         """
-        self.add_cards(other_deck.get_cards())
+        if not self._cards and self._positions is None and self._listeners is None:
+            # nothing to keep, share the other deck's cards until either changes
+            other_deck._share_with(self)
+        else:
+            self.add_cards(other_deck._cards)
 
     def __str__(self):
         card_strings = ', '.join(map(str, self._cards))
@@ -258,6 +771,138 @@ class Deck:
         return str(self)
 
 
+class SleepingCoders(list):
+    """
+    The slots of coders sleeping in a game, a list of coder cards in which an
+    empty slot holds None. Listeners are told whenever a slot is set.
+
+    A min-heap of the empty slots is kept alongside the list, so the first
+    empty slot is found without scanning. The amount of slots is fixed once
+    the game starts, so methods which would add or remove slots raise a
+    ValueError.
+    """
+
+    __slots__ = ('_listeners', '_free', '_occupied')
+
+    def __init__(self, coders=()):
+        """
+        Construct the slots of sleeping coders.
+
+        Parameters:
+            coders (list<CoderCard>): The coder in each slot.
+        """
+        super().__init__(coders)
+        self._listeners = None
+        self._index()
+
+    def _index(self):
+        """Rebuild the heap of empty slots and the count of occupied slots."""
+        # slots emptied since, may hold slots filled again until they surface
+        self._free = [slot for slot, card in enumerate(self) if card is None]
+        self._occupied = len(self) - len(self._free)
+
+    def first_free_slot(self):
+        """(int): Returns the lowest empty slot, None if every slot is occupied."""
+        free = self._free
+        while free:
+            slot = free[0]
+            if self[slot] is None:
+                return slot
+            heapq.heappop(free)
+        return None
+
+    def get_occupied_amount(self):
+        """(int): Returns the amount of slots holding a sleeping coder."""
+        return self._occupied
+
+    def add_listener(self, listener):
+        """
+        Tell a listener of every slot set, by calling
+        listener.slot_changed(coders, slot, old_card, new_card) afterwards.
+
+        Parameters:
+            listener (object): The object to tell of changes.
+        """
+        if self._listeners is None:
+            self._listeners = []
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stop telling a listener of changes to the slots.
+
+        Parameters:
+            listener (object): A listener previously added to the slots.
+        """
+        self._listeners.remove(listener)
+        if not self._listeners:
+            self._listeners = None
+
+    def __setitem__(self, slot, card):
+        if not isinstance(slot, slice):
+            old_card = self[slot]
+            super().__setitem__(slot, card)
+            if old_card is card:
+                return
+            if slot < 0:
+                slot += len(self)
+            if card is None:
+                if old_card is not None:
+                    self._occupied -= 1
+                    if len(self._free) > 2 * len(self):
+                        # too many slots filled again since they were emptied
+                        self._index()
+                    else:
+                        heapq.heappush(self._free, slot)
+            elif old_card is None:
+                self._occupied += 1
+            if self._listeners is not None:
+                for listener in self._listeners:
+                    listener.slot_changed(self, slot, old_card, card)
+            return
+
+        old = self[:]
+        super().__setitem__(slot, card)
+        if len(self) != len(old):
+            super().__setitem__(slice(None), old)
+            raise ValueError("the amount of sleeping coder slots cannot change")
+        self._index()
+
+        if self._listeners is not None:
+            for index, (old_card, new_card) in enumerate(zip(old, self)):
+                if old_card is not new_card:
+                    for listener in self._listeners:
+                        listener.slot_changed(self, index, old_card, new_card)
+
+    def _resize(self, *args, **kwargs):
+        """
+        Raises a ValueError, in place of every list method which would add
+        or remove slots.
+        """
+        raise ValueError("the amount of sleeping coder slots cannot change")
+
+    append = extend = insert = pop = remove = clear = _resize
+    __delitem__ = __iadd__ = __imul__ = _resize
+
+    def sort(self, *, key=None, reverse=False):
+        """
+        Sort the slots in place, telling listeners of every slot changed.
+
+        Parameters:
+            key (callable): Returns the value a coder is compared by.
+            reverse (bool): If True the slots are sorted in descending order.
+        """
+        self[:] = sorted(self, key=key, reverse=reverse)
+
+    def reverse(self):
+        """Reverse the slots in place, telling listeners of every slot changed."""
+        self[:] = self[::-1]
+
+    def __reduce__(self):
+        # listeners belong to the process that added them
+        return self.__class__, (list(self),)
+
+
 class Player:
     """
     The base player in a game.
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Streaming analytics over recorded games of Sleeping Coders
+
+A Pipeline chains generator stages over the games of a replay log or archive:
+
+    Pipeline.open(path).replay().filter(predicate).map(function).aggregate(...)
+
+Games are read, replayed and handed to the next stage one at a time, so a
+pipeline holds a single game in memory however many it processes. Replaying
+plays every recorded move through the real Card.play and Card.action of
+a2.py, so statistics follow the rules of the game.
+"""
+
+import argparse
+import mmap
+
+from collections import namedtuple
+
+from archive import Archive
+from moves import STEAL_CODER
+from replay import ReplayReader
+from simulator import Simulator
+
+# A move of a replayed game, the target is the seat of the player whose
+# coder or slot was chosen and the slot, None if the action had no target
+Move = namedtuple('Move', ['seat', 'card', 'target'])
+
+ReplayedGame = namedtuple('ReplayedGame', ['players', 'winner', 'turns', 'coders', 'moves'])
+
+
+def read_log(path):
+    """
+    Read the games of a replay log file through mmap.
+
+    Parameters:
+        path (str): The log file.
+
+    Yields:
+        (GameRecord): Each game of the log.
+    """
+    with open(path, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield from ReplayReader(data)
+    finally:
+        try:
+            data.close()
+        except BufferError:
+            # records still refer to the map, it is closed once they are freed
+            pass
+
+
+def read_archive(path, start=0, stop=None):
+    """
+    Read a range of the games of an archive.
+
+    Parameters:
+        path (str): The archive file.
+        start (int): The position of the first game.
+        stop (int): The position after the last game, defaults to the end.
+
+    Yields:
+        (GameRecord): Each game in the range.
+    """
+    with Archive(path) as archive:
+        yield from archive.games(start, stop)
+
+
+def replay_game(record):
+    """
+    Replay a recorded game through the rules of a2.py.
+
+    Parameters:
+        record (GameRecord): The game to replay.
+
+    Returns:
+        (ReplayedGame): The outcome and moves of the game.
+    """
+    game, policy = record.new_game()
+    players = game.players
+    seats = {player: seat for seat, player in enumerate(players)}
+    moves = []
+    while policy.has_moves():
+        seat = seats[game.current_player()]
+        Simulator.play_turn(game, policy, None)
+        card, target = policy.get_last_move()
+        if target is not None:
+            owner, slot = target
+            target = seats[owner], slot
+        moves.append(Move(seat, card, target))
+    game.is_over()
+
+    winner = seats[game.winner] if game.winner is not None else None
+    coders = tuple(player.get_coders().get_amount() for player in players)
+    return ReplayedGame(len(players), winner, len(moves), coders, moves)
+
+
+class Pipeline:
+    """
+    A chain of generator stages over a stream of items, usually games.
+    """
+
+    def __init__(self, items):
+        """
+        Parameters:
+            items (iterable): The items entering the pipeline.
+        """
+        self._items = items
+
+    @classmethod
+    def open(cls, path, start=0, stop=None):
+        """
+        Start a pipeline reading the games of a log or an archive.
+
+        Parameters:
+            path (str): The log or archive file.
+            start (int): The position of the first game, archives only.
+            stop (int): The position after the last game, archives only.
+
+        Returns:
+            (Pipeline): A pipeline of GameRecords.
+        """
+        try:
+            Archive(path).close()
+        except ValueError:
+            if start != 0 or stop is not None:
+                raise ValueError("only the games of an archive can be read by range") from None
+            return cls(read_log(path))
+        return cls(read_archive(path, start, stop))
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def filter(self, predicate):
+        """(Pipeline): Returns a pipeline of the items for which predicate is true."""
+        return Pipeline(filter(predicate, self._items))
+
+    def map(self, function):
+        """(Pipeline): Returns a pipeline of function applied to every item."""
+        return Pipeline(map(function, self._items))
+
+    def replay(self):
+        """(Pipeline): Returns a pipeline replaying every GameRecord to a ReplayedGame."""
+        return self.map(replay_game)
+
+    def aggregate(self, *aggregates):
+        """
+        Run the pipeline, adding every item to each aggregate.
+
+        Parameters:
+            *aggregates (Aggregate): The statistics to compute.
+
+        Returns:
+            (tuple): The result of each aggregate.
+        """
+        adds = [aggregate.add for aggregate in aggregates]
+        for item in self._items:
+            for add in adds:
+                add(item)
+        return tuple(aggregate.result() for aggregate in aggregates)
+
+
+class Aggregate:
+    """
+    Abstract statistic computed from a stream of items.
+    """
+
+    def add(self, item):
+        """Account for an item of the stream."""
+        raise NotImplementedError
+
+    def result(self):
+        """Returns the statistic of the items added."""
+        raise NotImplementedError
+
+
+class Count(Aggregate):
+    """
+    The amount of items.
+    """
+
+    def __init__(self):
+        self._count = 0
+
+    def add(self, item):
+        """Count an item."""
+        self._count += 1
+
+    def result(self):
+        """(int): Returns the amount of items added."""
+        return self._count
+
+
+class Mean(Aggregate):
+    """
+    The mean of a value of each item.
+    """
+
+    def __init__(self, key):
+        """
+        Parameters:
+            key (callable): Returns the value of an item.
+        """
+        self._key = key
+        self._total = 0
+        self._count = 0
+
+    def add(self, item):
+        """Add the value of an item."""
+        self._total += self._key(item)
+        self._count += 1
+
+    def result(self):
+        """(float): Returns the mean of the values, 0.0 if there were none."""
+        return self._total / self._count if self._count else 0.0
+
+
+class WinRate(Aggregate):
+    """
+    The share of ReplayedGames won by each seat.
+    """
+
+    def __init__(self):
+        self._wins = []
+        self._games = 0
+
+    def add(self, game):
+        """Count the winner of a game."""
+        self._games += 1
+        if game.winner is not None:
+            wins = self._wins
+            if game.winner >= len(wins):
+                wins.extend([0] * (game.winner + 1 - len(wins)))
+            wins[game.winner] += 1
+
+    def result(self):
+        """(list<float>): Returns the share of the games won by each seat."""
+        return [wins / self._games for wins in self._wins]
+
+
+def action_count(action):
+    """
+    (callable): Returns a function counting the moves of a ReplayedGame which
+                performed action on a target.
+    """
+    def count(game):
+        return sum(1 for move in game.moves
+                   if move.target is not None and move.card.PLAY_ACTION == action)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise recorded games of Sleeping Coders")
+    parser.add_argument("path", help="The replay log or archive to read")
+    parser.add_argument("--start", type=int, default=0,
+                        help="The position of the first game of an archive to read")
+    parser.add_argument("--stop", type=int, default=None,
+                        help="The position after the last game of an archive to read")
+    args = parser.parse_args()
+
+    games, wins, turns, steals = Pipeline.open(args.path, args.start, args.stop).replay().aggregate(
+        Count(), WinRate(), Mean(lambda game: game.turns), Mean(action_count(STEAL_CODER)))
+    print(f"{games} games")
+    print("Win rate by seat: " + ", ".join(f"{rate:.1%}" for rate in wins))
+    print(f"Average game length: {turns:.1f} turns")
+    print(f"Coders stolen per game: {steals:.2f}")
+
+
+if __name__ == "__main__":
+    main()
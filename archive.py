@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Append-only archives of recorded games of Sleeping Coders
+
+An archive is a replay log (see replay.py) split into segments, one written
+by each append, each followed by a footer indexing where its games' records
+start:
+
+    the header of the log, in the first segment only
+    the records of the segment's games
+    the offset of each record, 8 bytes little-endian
+    the offset of the index, the amount of games, the offset after the
+    footer of the segment before (0 for the first) and FOOTER_MAGIC
+
+Appending to an archive leaves its segments in place and adds a new one, so
+each game is indexed once however many appends there are. Readers start from
+the last footer of the file and follow the chain back to the first.
+
+Archives are read through mmap, so opening one costs the same however many
+games it holds: fetching a game or iterating a range of games only touches the
+pages of those games, and their records are never copied. The cards and
+players of a game are only rebuilt when it is replayed.
+
+An append cut short, for example by the process dying, leaves the records it
+wrote after a footer which is still valid. Readers use the last valid footer
+and ignore the rest, which the next append overwrites.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from bisect import bisect_right
+from timeit import default_timer as timer
+
+from replay import ReplayReader, ReplayWriter
+from simulator import POLICIES, Simulator
+
+FOOTER_MAGIC = b"SCRX"
+# index offset, amount of games, end of the footer before, FOOTER_MAGIC
+FOOTER = struct.Struct('<QQQ4s')
+
+
+def _read_footer(data, end):
+    """
+    Parse the footer of a segment of an archive.
+
+    Parameters:
+        data (bytes | mmap.mmap): The contents of the archive.
+        end (int): The offset after the footer.
+
+    Returns:
+        (tuple<int, int, int>): The offset of the index, the amount of games
+                                and the offset after the footer before, None
+                                if there is no valid footer ending at end.
+    """
+    if end < FOOTER.size:
+        return None
+    index, games, previous, magic = FOOTER.unpack_from(data, end - FOOTER.size)
+    if magic != FOOTER_MAGIC or index + 8 * games != end - FOOTER.size or previous > index:
+        return None
+    return index, games, previous
+
+
+def _read_segments(data):
+    """
+    Find the segments of an archive from its last valid footer, looking back
+    past the records of an append cut short if the archive does not end with
+    one.
+
+    Parameters:
+        data (bytes | mmap.mmap): The contents of the archive.
+
+    Returns:
+        (tuple<list<tuple<int, int>>, int>): The offset of the index and the
+            amount of games of each segment in order, and the offset after
+            the last valid footer.
+    """
+    end = len(data)
+    footer = _read_footer(data, end)
+    while footer is None and end >= FOOTER.size:
+        # the footer before ends with the last magic before this one
+        end = data.rfind(FOOTER_MAGIC, 0, end - 1) + len(FOOTER_MAGIC)
+        footer = _read_footer(data, end)
+    if footer is None:
+        raise ValueError("not a game archive")
+
+    segments = []
+    while True:
+        index, games, previous = footer
+        segments.append((index, games))
+        if not previous:
+            break
+        footer = _read_footer(data, previous)
+        if footer is None:
+            raise ValueError("the footer of an archive segment is corrupt")
+    segments.reverse()
+    return segments, end
+
+
+class ArchiveWriter(ReplayWriter):
+    """
+    Records games to the end of an archive, creating it if needed.
+
+    Give it to a Simulator as its recorder, then close it to write the
+    index of the games.
+    """
+
+    def __init__(self, path, cards=None, coders=None):
+        """
+        Open an archive for appending.
+
+        Parameters:
+            path (str): The archive file.
+            cards (list<tuple>): The keys of every card that may be recorded,
+                                 defaults to the cards of the full deck or
+                                 those of the archive if it exists.
+            coders (list<Card>): The sleeping coders every game starts with,
+                                 defaults to CODERS or those of the archive if
+                                 it exists.
+        """
+        # the offsets of the games of this append
+        self._offsets = array('Q')
+        # the games archived before, and the offset after their last footer
+        self._archived = self._previous = 0
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            stream = open(path, 'wb')
+            super().__init__(stream, cards, coders)
+            return
+
+        with Archive(path) as archive:
+            reader = archive.get_reader()
+            if cards is not None and list(cards) != reader.get_cards():
+                raise ValueError("the cards differ from those of the archive")
+            cards = reader.get_cards()
+            if coders is None:
+                coders = reader.get_coders()
+            self._archived = len(archive)
+            self._previous = archive.get_size()
+
+        # the new segment follows the last footer, which stays valid until
+        # close writes a new one, and replaces the records of an append cut short
+        stream = open(path, 'r+b')
+        stream.seek(self._previous)
+        stream.truncate()
+        super().__init__(stream, cards, coders, header=False)
+
+    def get_game_count(self):
+        """(int): Returns the amount of games in the archive."""
+        return self._archived + len(self._offsets)
+
+    def end_game(self):
+        """Write the game recorded to the archive."""
+        self._offsets.append(self._stream.tell())
+        super().end_game()
+
+    def close(self):
+        """Write the index and footer of the games appended and close the archive."""
+        stream = self._stream
+        if stream.closed:
+            return
+        if self._offsets or not self._previous:
+            index = stream.tell()
+            offsets = self._offsets
+            if sys.byteorder != 'little':
+                offsets = array('Q', offsets)
+                offsets.byteswap()
+            stream.write(offsets.tobytes())
+            stream.write(FOOTER.pack(index, len(self._offsets), self._previous, FOOTER_MAGIC))
+        stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _ArchiveReader(ReplayReader):
+    """
+    The reader of the log an archive holds, whose records are split by the
+    index and footer of each segment.
+    """
+
+    def __init__(self, data, archive):
+        """
+        Parameters:
+            data (memoryview): The header and records of the archive.
+            archive (Archive): The archive indexing the records.
+        """
+        super().__init__(data)
+        self._archive = archive
+
+    def __iter__(self):
+        """
+        Yields:
+            (GameRecord): Each game of the archive, in the order written.
+        """
+        return self._archive.games()
+
+
+class Archive:
+    """
+    Random access to the games of an archive, read through mmap.
+    """
+
+    def __init__(self, path):
+        """
+        Map an archive into memory.
+
+        Parameters:
+            path (str): The archive file.
+        """
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            segments, end = _read_segments(self._map)
+        except ValueError:
+            self._map.close()
+            raise
+
+        self._data = data = memoryview(self._map)
+        self._end = end
+        # the offsets of the games of each segment, and the first game of each
+        self._offsets = []
+        self._starts = []
+        games = 0
+        for index, amount in segments:
+            if sys.byteorder == 'little':
+                offsets = data[index:index + 8 * amount].cast('Q')
+            else:
+                offsets = array('Q', data[index:index + 8 * amount])
+                offsets.byteswap()
+            self._offsets.append(offsets)
+            self._starts.append(games)
+            games += amount
+        self._games = games
+        # the records end where the last index starts
+        self._index = segments[-1][0]
+        self._reader = _ArchiveReader(data[:self._index], self)
+
+    def __len__(self):
+        """(int): Returns the amount of games in the archive."""
+        return self._games
+
+    def get_records_size(self):
+        """(int): Returns the offset of the last index, where the header and records of the archive end."""
+        return self._index
+
+    def get_size(self):
+        """
+        (int): Returns the size in bytes of the archive up to its last valid
+               footer, leaving out the records of an append cut short.
+        """
+        return self._end
+
+    def get_offset(self, game):
+        """
+        Find where the record of a game starts.
+
+        Parameters:
+            game (int): The position of the game in the archive.
+
+        Returns:
+            (int): The offset of the record of the game.
+        """
+        segment = bisect_right(self._starts, game) - 1
+        return self._offsets[segment][game - self._starts[segment]]
+
+    def get_reader(self):
+        """
+        (ReplayReader): Returns the reader of the log the archive holds, which
+                        iterates over the games through the index.
+        """
+        return self._reader
+
+    def __getitem__(self, game):
+        """
+        Fetch a game, or a list of games for a slice.
+
+        Parameters:
+            game (int | slice): The position of the game in the archive.
+
+        Returns:
+            (GameRecord): The game, replayed to rebuild its cards and players.
+        """
+        if isinstance(game, slice):
+            return list(self.games(*game.indices(len(self))))
+        if game < 0:
+            game += len(self)
+        if not 0 <= game < len(self):
+            raise IndexError("game index out of range")
+        return self._reader.record_at(self.get_offset(game))[0]
+
+    def games(self, start=0, stop=None, step=1):
+        """
+        Iterate over a range of games.
+
+        Parameters:
+            start (int): The position of the first game.
+            stop (int): The position after the last game, defaults to the end.
+            step (int): The distance between the games.
+
+        Yields:
+            (GameRecord): Each game in the range.
+        """
+        get_offset = self.get_offset
+        record_at = self._reader.record_at
+        for game in range(*slice(start, stop, step).indices(len(self))):
+            yield record_at(get_offset(game))[0]
+
+    def __iter__(self):
+        """Yields: (GameRecord): Each game of the archive, in the order written."""
+        return self.games()
+
+    def close(self):
+        """
+        Unmap the archive. Records fetched from it must no longer be used.
+        """
+        if self._map.closed:
+            return
+        # views of the map must be released before it can be closed
+        self._reader = None
+        for offsets in self._offsets:
+            if isinstance(offsets, memoryview):
+                offsets.release()
+        self._data.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # records still refer to the map, it is closed once they and the
+            # archive are freed
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record simulated games of Sleeping Coders to an archive")
+    parser.add_argument("path", help="The archive file, appended to if it exists")
+    parser.add_argument("-n", "--games", type=int, default=10000,
+                        help="The amount of games to simulate")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="The seed of the batch")
+    parser.add_argument("-p", "--policies", nargs="+", default=["random", "random"],
+                        choices=sorted(POLICIES), help="The policy of each seat")
+    args = parser.parse_args()
+
+    with ArchiveWriter(args.path) as writer:
+        Simulator([POLICIES[name]() for name in args.policies],
+                  recorder=writer).run(args.games, seed=args.seed)
+
+    start = timer()
+    with Archive(args.path) as archive:
+        opened = timer() - start
+        archive[-1].final()
+        fetched = timer() - start - opened
+        print(f"{len(archive)} games, {os.path.getsize(args.path)} bytes")
+        print(f"Opened in {opened * 1e3:.2f}ms, "
+              f"fetched and replayed the last game in {fetched * 1e3:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
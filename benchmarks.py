@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the hot paths of the Sleeping Coders classes
+
+Run a single benchmark by name, e.g. `python benchmarks.py remove`, or every
+benchmark with no arguments.
+"""
+
+import argparse
+import itertools
+import random
+import timeit
+
+from timeit import default_timer as timer
+
+from a2 import AllNighterCard, CoderCard, Deck, NumberCard, Player, SleepingCoders
+from a2_support import CodersGame
+from journal import Journal
+from simulator import RandomPolicy, Simulator, TrackedGame, restore_game, snapshot_game
+from zobrist import ZobristHash, hash_game
+
+HAND_SIZES = (5, 10, 50, 100, 500)
+DECK_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+
+def bench_remove(sizes=HAND_SIZES, number=20000):
+    """
+    Compare removing a known card from a hand with list.index followed by
+    Deck.remove_card, Deck.remove_instance and Deck.remove_instance while
+    tracking positions. The card is put back on the deck after each removal
+    so the hand keeps its size.
+
+    Parameters:
+        sizes (tuple<int>): The hand sizes to measure.
+        number (int): The amount of removals per measurement.
+
+    Returns:
+        (list<tuple<int, float, float, float>>): The hand size and the
+            nanoseconds per removal of each approach.
+    """
+    rows = []
+    for size in sizes:
+        cards = [NumberCard(i) for i in range(size)]
+        rng = random.Random(size)
+        picks = [rng.choice(cards) for _ in range(number)]
+
+        def run(deck, remove):
+            it = itertools.cycle(picks)
+            return lambda: remove(deck, next(it))
+
+        def index_pop(deck, card):
+            deck.remove_card(deck.get_cards().index(card))
+            deck.add_card(card)
+
+        def remove_instance(deck, card):
+            deck.remove_instance(card)
+            deck.add_card(card)
+
+        tracked = Deck(cards[:])
+        tracked.track_positions()
+
+        timings = []
+        for deck, remove in ((Deck(cards[:]), index_pop),
+                             (Deck(cards[:]), remove_instance),
+                             (tracked, remove_instance)):
+            timings.append(min(timeit.repeat(run(deck, remove), repeat=5, number=number))
+                           / number * 1e9)
+        rows.append((size, *timings))
+    return rows
+
+
+def _best_time(operation, cards, repeat=5):
+    """
+    (float): Returns the best time in microseconds of an operation on a fresh
+             deck holding a copy of cards, excluding the time to build the deck.
+    """
+    best = None
+    for _ in range(repeat):
+        deck = Deck(cards[:])
+        start = timer()
+        operation(deck)
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def _pick_per_card(deck, amount):
+    """The original Deck.pick, popping one card at a time."""
+    cards = []
+    for _ in range(amount):
+        cards.append(deck.get_cards().pop())
+    return cards
+
+
+def bench_pick(sizes=DECK_SIZES, players=4, hand=5):
+    """
+    Compare picking card by card with Deck.pick and Deck.deal for dealing a
+    hand to each player, and picking half of the deck at once.
+
+    Parameters:
+        sizes (tuple<int>): The deck sizes to measure.
+        players (int): The amount of players dealt a hand.
+        hand (int): The amount of cards dealt to each player.
+
+    Returns:
+        (list<tuple<int, float, float, float, float, float>>): The deck size
+            and the microseconds taken to deal hands by popping, by Deck.pick
+            per player, by Deck.deal, then to pick half by popping and by
+            Deck.pick.
+    """
+    rows = []
+    for size in sizes:
+        cards = [NumberCard(i % 10) for i in range(size)]
+        seats = [Player(f"Player {seat}") for seat in range(players)]
+
+        def deal_per_card(deck):
+            for player in seats:
+                player.get_hand().add_cards(_pick_per_card(deck, hand))
+
+        def deal_pick(deck):
+            for player in seats:
+                player.get_hand().add_cards(deck.pick(hand))
+
+        rows.append((size,
+                     _best_time(deal_per_card, cards),
+                     _best_time(deal_pick, cards),
+                     _best_time(lambda deck: deck.deal(seats, hand), cards),
+                     _best_time(lambda deck: _pick_per_card(deck, size // 2), cards),
+                     _best_time(lambda deck: deck.pick(size // 2), cards)))
+        for player in seats:
+            player.get_hand().get_cards().clear()
+    return rows
+
+
+def bench_snapshot(copies=(0, 5, 10, 15), number=2000):
+    """
+    Compare snapshotting a game by slicing every deck, as the test suite's
+    get_game_state does, with snapshot_game which shares every deck.
+
+    Parameters:
+        copies (tuple<int>): The amount of times the full deck is doubled.
+        number (int): The amount of snapshots per measurement.
+
+    Returns:
+        (list<tuple<int, float, float>>): The pickup pile size and the
+            microseconds per snapshot by slicing and by snapshot_game.
+    """
+    rows = []
+    for deck_copies in copies:
+        simulator = Simulator([RandomPolicy(), RandomPolicy()], deck_copies=deck_copies)
+        game = simulator.new_game(random.Random(0))
+
+        def slice_decks():
+            decks = [game.get_pickup_pile(), game.putdown_pile]
+            for player in game.players:
+                decks.extend((player.get_hand(), player.get_coders()))
+            return [deck.get_cards()[:] for deck in decks], game.get_sleeping_coders()[:]
+
+        timings = [min(timeit.repeat(snapshot, repeat=5, number=number)) / number * 1e6
+                   for snapshot in (slice_decks, lambda: snapshot_game(game))]
+        rows.append((game.get_pickup_pile().get_amount(), *timings))
+    return rows
+
+
+def bench_undo(copies=(0, 5, 10, 15), number=2000):
+    """
+    Compare taking back a single move by restoring a snapshot_game taken
+    before it with undoing it with a Journal.
+
+    Parameters:
+        copies (tuple<int>): The amount of times the full deck is doubled.
+        number (int): The amount of moves taken back per measurement.
+
+    Returns:
+        (list<tuple<int, float, float>>): The pickup pile size and the
+            microseconds per move played and taken back by each approach.
+    """
+    rows = []
+    for deck_copies in copies:
+        simulator = Simulator([RandomPolicy(), RandomPolicy()], deck_copies=deck_copies)
+        rng = random.Random(0)
+        policy = RandomPolicy()
+
+        game = simulator.new_game(rng)
+
+        def restore():
+            snapshot = snapshot_game(game)
+            simulator.play_turn(game, policy, rng)
+            restore_game(game, snapshot)
+
+        timings = [min(timeit.repeat(restore, repeat=5, number=number)) / number * 1e6]
+
+        game = simulator.new_game(rng)
+        journal = Journal(game)
+
+        def undo():
+            journal.begin()
+            simulator.play_turn(game, policy, rng)
+            journal.commit()
+            journal.undo()
+
+        timings.append(min(timeit.repeat(undo, repeat=5, number=number)) / number * 1e6)
+        rows.append((game.get_pickup_pile().get_amount(), *timings))
+    return rows
+
+
+def bench_hash(copies=(0, 5, 10, 15), number=2000):
+    """
+    Compare hashing a game from scratch with hash_game against playing a move
+    with a ZobristHash kept up to date and reading it.
+
+    Parameters:
+        copies (tuple<int>): The amount of times the full deck is doubled.
+        number (int): The amount of hashes per measurement.
+
+    Returns:
+        (list<tuple<int, float, float, float>>): The pickup pile size and the
+            microseconds per hash_game, per move played and undone without a
+            hash and per move played, hashed and undone.
+    """
+    rows = []
+    for deck_copies in copies:
+        simulator = Simulator([RandomPolicy(), RandomPolicy()], deck_copies=deck_copies)
+        rng = random.Random(0)
+        policy = RandomPolicy()
+        game = simulator.new_game(rng)
+        journal = Journal(game)
+
+        def move():
+            journal.begin()
+            simulator.play_turn(game, policy, rng)
+            journal.commit()
+            journal.undo()
+
+        timings = [min(timeit.repeat(lambda: hash_game(game), repeat=3, number=max(1, number // 100)))
+                   / max(1, number // 100) * 1e6,
+                   min(timeit.repeat(move, repeat=5, number=number)) / number * 1e6]
+
+        hashed = ZobristHash(game)
+
+        def hashed_move():
+            move()
+            hashed.value()
+
+        timings.append(min(timeit.repeat(hashed_move, repeat=5, number=number)) / number * 1e6)
+        rows.append((game.get_pickup_pile().get_amount(), *timings))
+    return rows
+
+
+def bench_sleep(sizes=(16, 64, 256, 1024), number=20000):
+    """
+    Compare AllNighterCard putting a coder back to sleep when the sleeping
+    coders are a list, scanned for the first empty slot, and a
+    SleepingCoders, which keeps a heap of the empty slots. Only the last slot
+    is empty, the worst case for the scan.
+
+    Parameters:
+        sizes (tuple<int>): The amounts of sleeping coder slots to measure.
+        number (int): The amount of coders put to sleep per measurement.
+
+    Returns:
+        (list<tuple<int, float, float>>): The amount of slots and the
+            nanoseconds per coder put to sleep with each container.
+    """
+    rows = []
+    card = AllNighterCard()
+    for size in sizes:
+        coders = [CoderCard(f"coder {slot}") for slot in range(size)]
+        player = Player("Player")
+
+        timings = []
+        for make in (list, SleepingCoders):
+            game = CodersGame(Deck(), make(coders[:-1] + [None]), [player])
+
+            def sleep():
+                card._perform_action(game, player, coders[-1])
+                game.set_sleeping_coder(size - 1, None)
+
+            timings.append(min(timeit.repeat(sleep, repeat=5, number=number)) / number * 1e9)
+        rows.append((size, *timings))
+    return rows
+
+
+def bench_wins(sizes=(2, 10, 100, 1000), number=20000):
+    """
+    Compare CodersGame.is_over, which checks every player, with
+    TrackedGame.is_over, which is told when a player's coders change, in a
+    game nobody has won yet.
+
+    Parameters:
+        sizes (tuple<int>): The amounts of players to measure.
+        number (int): The amount of calls per measurement.
+
+    Returns:
+        (list<tuple<int, float, float>>): The amount of players and the
+            nanoseconds per is_over call of each game.
+    """
+    rows = []
+    for size in sizes:
+        timings = []
+        for game_class in (CodersGame, TrackedGame):
+            players = [Player(f"Player {seat}") for seat in range(size)]
+            game = game_class(Deck([NumberCard(0)]), SleepingCoders(), players)
+            timings.append(min(timeit.repeat(game.is_over, repeat=5, number=number)) / number * 1e9)
+        rows.append((size, *timings))
+    return rows
+
+
+BENCHMARKS = {
+    'remove': (bench_remove, ('hand', 'index+pop ns', 'remove_instance ns', 'tracked ns')),
+    'pick': (bench_pick, ('deck', 'deal popping us', 'deal pick us', 'deal us',
+                          'half popping us', 'half pick us')),
+    'snapshot': (bench_snapshot, ('pickup pile', 'slicing us', 'snapshot_game us')),
+    'undo': (bench_undo, ('pickup pile', 'restore_game us', 'journal us')),
+    'sleep': (bench_sleep, ('slots', 'list ns', 'SleepingCoders ns')),
+    'wins': (bench_wins, ('players', 'CodersGame ns', 'TrackedGame ns')),
+    'hash': (bench_hash, ('pickup pile', 'hash_game us', 'move us', 'hashed move us')),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Sleeping Coders hot paths")
+    parser.add_argument("names", nargs="*",
+                        help=f"The benchmarks to run from {sorted(BENCHMARKS)}, all if none are given")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+
+    for name in args.names or sorted(BENCHMARKS):
+        bench, headings = BENCHMARKS[name]
+        print(name)
+        print(''.join(f"{heading:>20}" for heading in headings))
+        for row in bench():
+            print(''.join(f"{value:>20.1f}" if isinstance(value, float) else f"{value:>20}"
+                          for value in row))
+        print()
+
+
+if __name__ == "__main__":
+    main()
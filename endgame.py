@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Determinized alpha-beta search for the endgame of Sleeping Coders
+
+Once the pickup pile is small the rest of the game can be searched outright.
+The cards hidden from the player are dealt into several determinizations, each
+is searched by paranoid alpha-beta (the player maximises its score, every
+opponent minimises it) and the value of each move is the expectation over the
+determinizations.
+
+Moves are made on a CodersGame and taken back with a Journal, while a
+ZobristHash of the game keys an LRU-bounded transposition table.
+"""
+
+import argparse
+
+from collections import OrderedDict, namedtuple
+from timeit import default_timer as timer
+
+from a2 import Deck, Player, SleepingCoders
+from a2_support import CodersGame
+from gamestate import GameState, find_winner, get_turn_state, set_turn_state
+from journal import Journal
+from mcts import ACT, PLAY, SKIP, determinize
+from moves import NO_ACTION, PRIORITY, MoveGenerator, card_action, find_targets
+from simulator import POLICIES, GreedyPolicy, Policy, Simulator
+from zobrist import ZobristHash
+
+# Bounds of a stored value
+EXACT = "EXACT"
+LOWER = "LOWER"
+UPPER = "UPPER"
+
+TableEntry = namedtuple('TableEntry', ['depth', 'value', 'bound', 'move'])
+
+
+class SearchStats(namedtuple('SearchStats', ['nodes', 'elapsed', 'hits', 'probes'])):
+    """
+    The nodes visited by a search, the wall time it took and how often the
+    transposition table held the node looked up.
+    """
+
+    __slots__ = ()
+
+    def nodes_per_sec(self):
+        """(float): Returns the amount of nodes visited per second."""
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def hit_rate(self):
+        """(float): Returns the fraction of table lookups which were hits."""
+        return self.hits / self.probes if self.probes else 0.0
+
+    def __add__(self, other):
+        return SearchStats(*(mine + theirs for mine, theirs in zip(self, other)))
+
+    def __str__(self):
+        return (f"{self.nodes} nodes in {self.elapsed:.3f} seconds "
+                f"({self.nodes_per_sec():.0f} nodes/sec, {self.hit_rate():.1%} table hits)")
+
+
+class TranspositionTable:
+    """
+    A map from state hashes to search results, forgetting the least recently
+    used entry once full.
+    """
+
+    def __init__(self, capacity=2 ** 16):
+        """
+        Construct an empty table.
+
+        Parameters:
+            capacity (int): The most entries held at once.
+        """
+        self._capacity = capacity
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._probes = 0
+
+    def get(self, key):
+        """
+        Look up the entry for a state.
+
+        Parameters:
+            key (int): The hash of the state.
+
+        Returns:
+            (TableEntry): The stored entry, None if there is none.
+        """
+        self._probes += 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        """
+        Store the entry for a state, replacing any older entry.
+
+        Parameters:
+            key (int): The hash of the state.
+            entry (TableEntry): The search result for the state.
+        """
+        entries = self._entries
+        entries[key] = entry
+        entries.move_to_end(key)
+        if len(entries) > self._capacity:
+            entries.popitem(last=False)
+
+    def get_hits(self):
+        """(int): Returns the amount of lookups which found an entry."""
+        return self._hits
+
+    def get_probes(self):
+        """(int): Returns the amount of lookups."""
+        return self._probes
+
+    def clear(self):
+        """Forget every entry."""
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def build_game(state):
+    """
+    Construct a CodersGame in a given state.
+
+    Parameters:
+        state (GameState): The state of the game.
+
+    Returns:
+        (CodersGame): A new game in the state.
+    """
+    players = []
+    for player_state in state.players:
+        player = Player(player_state.name)
+        player.get_hand().add_cards(player_state.hand.get_cards())
+        player.get_coders().add_cards(player_state.coders.get_cards())
+        players.append(player)
+
+    game = CodersGame(Deck(state.pickup_pile.get_cards()), SleepingCoders(state.sleeping_coders), players)
+    game.putdown_pile.add_cards(state.putdown_pile.get_cards())
+    set_turn_state(game, state.turn)
+    game.set_action(state.action)
+    return game
+
+
+def _seat(game):
+    """(int): Returns the seat of the player to move."""
+    return get_turn_state(game)[0]
+
+
+def _winner(game):
+    """(int): Returns the seat of the winner of a CodersGame, see find_winner."""
+    return find_winner(game.get_pickup_pile(), game.players)
+
+
+def is_terminal(game):
+    """(bool): True iff the game is over at a turn boundary."""
+    if game.get_action() not in (None, NO_ACTION):
+        return False
+    return game.get_pickup_pile().get_amount() == 0 or _winner(game) is not None
+
+
+def evaluate(game, seat):
+    """
+    Score a game for a seat, as mcts.score.
+
+    Parameters:
+        game (CodersGame): The game to score.
+        seat (int): The seat to score for.
+
+    Returns:
+        (float): 1 if the seat has won, 0 if another has, otherwise the seat's
+                 share of the collected coders.
+    """
+    winner = _winner(game)
+    if winner is not None:
+        return float(winner == seat)
+
+    total = sum(player.get_coders().get_amount() for player in game.players)
+    if not total:
+        return 1 / len(game.players)
+    return game.players[seat].get_coders().get_amount() / total
+
+
+def ordered_moves(game, first=None, generator=None):
+    """
+    Find the moves available to the player to move, most promising first.
+
+    Parameters:
+        game (CodersGame): The game to move in.
+        first (tuple): A move to search before any other if it is legal,
+                       e.g. the best move found by an earlier search.
+        generator (MoveGenerator): Lists the targets of actions if given,
+                                   otherwise they are found by find_targets.
+
+    Returns:
+        (list<tuple>): The moves, in the same form as mcts.legal_moves.
+    """
+    player = game.current_player()
+    action = game.get_action()
+    if action not in (None, NO_ACTION):
+        if generator is not None:
+            targets = generator.targets(player, action)
+        else:
+            targets = find_targets(game, player, action)
+        if not targets:
+            return [(SKIP,)]
+        # take from whoever is closest to winning first
+        targets.sort(key=lambda target: -target[0].get_coders().get_amount())
+        moves = [(ACT, game.players.index(owner), slot) for owner, slot in targets]
+    else:
+        cards = {}
+        for card in player.get_hand().get_cards():
+            cards.setdefault(card.get_key(), card)
+        keys = sorted(cards, key=lambda key: -PRIORITY.get(card_action(cards[key]), 0))
+        moves = [(PLAY, key) for key in keys]
+
+    if first is not None and first in moves:
+        moves.remove(first)
+        moves.insert(0, first)
+    return moves
+
+
+def make_move(game, move):
+    """
+    Make a move from ordered_moves in a game.
+
+    Parameters:
+        game (CodersGame): The game to move in.
+        move (tuple): The move to make.
+    """
+    kind = move[0]
+    if kind == PLAY:
+        player = game.current_player()
+        for card in player.get_hand().get_cards():
+            if card.get_key() == move[1]:
+                game.select_card(player, card)
+                return
+        raise ValueError(f"no card in hand matches {move[1]}")
+    if kind == ACT:
+        game.get_last_card().action(game.players[move[1]], game, move[2])
+    else:
+        game.set_action(NO_ACTION)
+        game.next_player()
+
+
+class EndgameSearch:
+    """
+    Searches the rest of a game by determinized alpha-beta.
+    """
+
+    def __init__(self, depth=6, determinizations=4, table_size=2 ** 16):
+        """
+        Construct a search engine.
+
+        Parameters:
+            depth (int): The most moves searched ahead, deepened one at a time.
+            determinizations (int): The amount of deals of the hidden cards
+                                    each decision is averaged over.
+            table_size (int): The most entries in the transposition table.
+        """
+        self._depth = depth
+        self._determinizations = determinizations
+        self._table = TranspositionTable(table_size)
+        self._stats = SearchStats(0, 0.0, 0, 0)
+        self._total = SearchStats(0, 0.0, 0, 0)
+        self._nodes = 0
+
+    def get_stats(self):
+        """(SearchStats): Returns the statistics of the last decision."""
+        return self._stats
+
+    def get_total_stats(self):
+        """(SearchStats): Returns the statistics of every decision."""
+        return self._total
+
+    def choose_move(self, state, rng):
+        """
+        Find the move with the best expected value for the player to move.
+
+        Parameters:
+            state (GameState): The state to move from, as seen by the player.
+            rng (random.Random): Deals the determinizations.
+
+        Returns:
+            (tuple): The best move, in the same form as mcts.legal_moves.
+        """
+        start = timer()
+        table = self._table
+        hits, probes = table.get_hits(), table.get_probes()
+        self._nodes = 0
+
+        seat = state.turn
+        moves = ordered_moves(build_game(state))
+        values = dict.fromkeys(moves, 0.0)
+        if len(moves) > 1:
+            for _ in range(self._determinizations):
+                for move, value in self._search_root(determinize(state, seat, rng), seat).items():
+                    values[move] += value
+
+        self._stats = SearchStats(self._nodes, timer() - start,
+                                  table.get_hits() - hits, table.get_probes() - probes)
+        self._total += self._stats
+        # ties go to the move ordered first
+        return max(moves, key=values.__getitem__)
+
+    def _search_root(self, state, seat):
+        """
+        (dict<tuple, float>): Returns the value of each move for seat in a
+                              determinized state, deepening one move at a time.
+        """
+        game = build_game(state)
+        journal = Journal(game)
+        hashed = ZobristHash(game)
+        generator = MoveGenerator(game)
+
+        values = {}
+        for depth in range(1, self._depth + 1):
+            values = {}
+            for move in ordered_moves(game, generator=generator):
+                journal.begin()
+                make_move(game, move)
+                journal.commit()
+                values[move] = self._alphabeta(game, journal, hashed, generator, seat,
+                                               depth - 1, 0.0, 1.0)
+                journal.undo()
+        return values
+
+    def _alphabeta(self, game, journal, hashed, generator, seat, depth, alpha, beta):
+        """
+        (float): Returns the paranoid value of a game for seat, exact if it
+                 lies between alpha and beta, otherwise a bound beyond them.
+        """
+        self._nodes += 1
+        if depth == 0 or is_terminal(game):
+            return evaluate(game, seat)
+
+        key = (hashed.value(), seat)
+        entry = self._table.get(key)
+        first = None
+        if entry is not None:
+            first = entry.move
+            if entry.depth >= depth:
+                if entry.bound == EXACT:
+                    return entry.value
+                if entry.bound == LOWER:
+                    alpha = max(alpha, entry.value)
+                else:
+                    beta = min(beta, entry.value)
+                if alpha >= beta:
+                    return entry.value
+
+        low, high = alpha, beta
+        maximising = _seat(game) == seat
+        best, best_move = (-1.0 if maximising else 2.0), None
+        for move in ordered_moves(game, first, generator):
+            journal.begin()
+            make_move(game, move)
+            journal.commit()
+            value = self._alphabeta(game, journal, hashed, generator, seat, depth - 1, alpha, beta)
+            journal.undo()
+
+            if maximising:
+                if value > best:
+                    best, best_move = value, move
+                alpha = max(alpha, value)
+            else:
+                if value < best:
+                    best, best_move = value, move
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if best <= low:
+            bound = UPPER
+        elif best >= high:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self._table.put(key, TableEntry(depth, best, bound, best_move))
+        return best
+
+
+class EndgamePolicy(Policy):
+    """
+    Searches outright once the pickup pile is small, leaving earlier moves to
+    another policy.
+    """
+
+    def __init__(self, threshold=6, fallback=None, **options):
+        """
+        Construct a policy searching the endgame.
+
+        Parameters:
+            threshold (int): The largest pickup pile that is searched.
+            fallback (Policy): Chooses moves while the pickup pile is larger,
+                               GreedyPolicy if not given.
+            **options: The options of EndgameSearch.
+        """
+        self._threshold = threshold
+        self._fallback = GreedyPolicy() if fallback is None else fallback
+        self._search = EndgameSearch(**options)
+
+    def get_search(self):
+        """(EndgameSearch): Returns the engine searching the endgame."""
+        return self._search
+
+    def choose_card(self, game, player, rng):
+        if game.get_pickup_pile().get_amount() > self._threshold:
+            return self._fallback.choose_card(game, player, rng)
+
+        _, key = self._search.choose_move(GameState.from_game(game), rng)
+        for slot, card in enumerate(player.get_hand().get_cards()):
+            if card.get_key() == key:
+                return slot
+
+    def choose_target(self, game, player, targets, rng):
+        if game.get_pickup_pile().get_amount() > self._threshold:
+            return self._fallback.choose_target(game, player, targets, rng)
+
+        _, seat, slot = self._search.choose_move(GameState.from_game(game), rng)
+        return game.players[seat], slot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games of Sleeping Coders with an endgame search")
+    parser.add_argument("-n", "--games", type=int, default=20,
+                        help="The amount of games to play")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="The seed of the first game")
+    parser.add_argument("-d", "--depth", type=int, default=6,
+                        help="The most moves searched ahead")
+    parser.add_argument("--threshold", type=int, default=6,
+                        help="The largest pickup pile that is searched")
+    parser.add_argument("--determinizations", type=int, default=4,
+                        help="The amount of deals of the hidden cards per decision")
+    parser.add_argument("--table-size", type=int, default=2 ** 16,
+                        help="The most entries in the transposition table")
+    parser.add_argument("-p", "--opponents", nargs="+", default=["greedy"],
+                        choices=sorted(POLICIES), help="The policy of each other seat")
+    args = parser.parse_args()
+
+    policy = EndgamePolicy(threshold=args.threshold, depth=args.depth,
+                           determinizations=args.determinizations, table_size=args.table_size)
+    simulator = Simulator([policy] + [POLICIES[name]() for name in args.opponents])
+    report = simulator.run(args.games, seed=args.seed)
+    print(report)
+    print(f"Wins by seat: {report.wins()}")
+    print(f"Search: {policy.get_search().get_total_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Persistent game state for Sleeping Coders
+
+A GameState is immutable. Playing a card or performing an action returns a
+new GameState which shares every deck the move did not touch with the old
+state, so branching a search tree costs the size of a move rather than the
+size of the game.
+
+Moves are resolved by the real Card.play and Card.action implementations
+from a2.py, run against a short-lived mutable view of the state.
+"""
+
+from collections import namedtuple
+
+from a2 import Deck
+from moves import NO_ACTION, WIN_CODERS, list_targets
+
+
+def get_turn_state(game):
+    """
+    Read the turn of a CodersGame, which its TurnManager has no public way to
+    give.
+
+    Parameters:
+        game (CodersGame): The game to read.
+
+    Returns:
+        (tuple<int, int>): The seat of the player to move and the direction
+                           of play.
+    """
+    turns = game.get_turns()
+    return turns._location, turns._direction
+
+
+def set_turn_state(game, seat, direction=None):
+    """
+    Jump a CodersGame to a turn, which its TurnManager has no public way to do.
+
+    Parameters:
+        game (CodersGame): The game to change.
+        seat (int): The seat of the player to move.
+        direction (int): The direction of play, unchanged if None.
+    """
+    turns = game.get_turns()
+    turns._location = seat
+    if direction is not None:
+        turns._direction = direction
+
+
+def find_winner(pickup_pile, players):
+    """
+    Find the winner of a game as CodersGame.is_over would, without changing
+    the game: the last winning player in turn order wins and there is no
+    winner once the pickup pile is empty.
+
+    Parameters:
+        pickup_pile (Deck | PersistentDeck): The pickup pile of the game.
+        players (list<Player | PlayerState>): The players of the game.
+
+    Returns:
+        (int): The seat of the winner, None if there is none.
+    """
+    if pickup_pile.get_amount() == 0:
+        return None
+
+    winner = None
+    for seat, player in enumerate(players):
+        if player.has_won():
+            winner = seat
+    return winner
+
+
+class PersistentDeck:
+    """
+    An immutable deck stored as a linked stack of (card, rest) pairs.
+
+    Adding to or taking from the top is constant time and shares the rest of
+    the deck. Slots count from the bottom of the deck, as in Deck.
+    """
+
+    __slots__ = ('_top', '_amount')
+
+    def __init__(self, top=None, amount=0):
+        """
+        Construct a deck from its top node.
+
+        Parameters:
+            top (tuple<Card, tuple>): The top (card, rest) pair, None if empty.
+            amount (int): The amount of cards in the deck.
+        """
+        self._top = top
+        self._amount = amount
+
+    @classmethod
+    def from_cards(cls, cards):
+        """
+        Construct a deck holding cards, the last card being the top.
+
+        Parameters:
+            cards (list<Card>): The cards in the deck.
+
+        Returns:
+            (PersistentDeck): The new deck.
+        """
+        return cls().add_cards(cards)
+
+    def get_cards(self):
+        """(list<Card>): Returns a new list of the cards, bottom first."""
+        cards = []
+        node = self._top
+        while node is not None:
+            cards.append(node[0])
+            node = node[1]
+        cards.reverse()
+        return cards
+
+    def get_card(self, slot):
+        """(Card): Return the card at the specified slot in the deck."""
+        if slot < 0:
+            slot += self._amount
+        if not 0 <= slot < self._amount:
+            raise IndexError("deck slot out of range")
+
+        node = self._top
+        for _ in range(self._amount - 1 - slot):
+            node = node[1]
+        return node[0]
+
+    def top(self):
+        """(Card): Return the card on the top of the deck."""
+        if self._top is None:
+            raise IndexError("top of an empty deck")
+        return self._top[0]
+
+    def get_amount(self):
+        """(int): Returns the amount of cards in the deck."""
+        return self._amount
+
+    def add_card(self, card):
+        """
+        Place a single card on the top of the deck.
+
+        Parameters:
+            card (Card): The card to place on the deck.
+
+        Returns:
+            (PersistentDeck): The deck with the card added.
+        """
+        return PersistentDeck((card, self._top), self._amount + 1)
+
+    def add_cards(self, cards):
+        """
+        Place a list of cards on the top of the deck.
+
+        Parameters:
+            cards (list<Card>): The cards to place on the deck.
+
+        Returns:
+            (PersistentDeck): The deck with the cards added.
+        """
+        node, amount = self._top, self._amount
+        for card in cards:
+            node = (card, node)
+            amount += 1
+        return PersistentDeck(node, amount)
+
+    def pick(self, amount=1):
+        """
+        Take a card or multiple cards from the top of the deck.
+
+        Parameters:
+            amount (int): The amount of cards to take from the deck.
+
+        Returns:
+            (tuple<list<Card>, PersistentDeck>): The cards taken, in the order
+                taken, and the remaining deck.
+        """
+        if amount > self._amount:
+            raise IndexError("pick from a deck with too few cards")
+
+        cards = []
+        node = self._top
+        for _ in range(amount):
+            cards.append(node[0])
+            node = node[1]
+        return cards, PersistentDeck(node, self._amount - max(amount, 0))
+
+    def remove_card(self, slot):
+        """
+        Remove the card at a slot, sharing every card below it.
+
+        Parameters:
+            slot (int): The slot of the card to remove.
+
+        Returns:
+            (PersistentDeck): The deck without the card.
+        """
+        above, rest = self.pick(self._amount - 1 - slot)
+        _, rest = rest.pick()
+        above.reverse()
+        return rest.add_cards(above)
+
+    def __reduce__(self):
+        # rebuild from a flat list, pickling the nested pairs would recurse
+        return self.__class__.from_cards, (self.get_cards(),)
+
+    def __str__(self):
+        card_strings = ', '.join(map(str, self.get_cards()))
+        return f"Deck({card_strings})"
+
+    def __repr__(self):
+        return str(self)
+
+
+EMPTY_DECK = PersistentDeck()
+
+
+class PlayerState(namedtuple('PlayerState', ['name', 'hand', 'coders'])):
+    """
+    The immutable state of a player: their name, hand and collected coders.
+    """
+
+    __slots__ = ()
+
+    def get_name(self):
+        """(str): The name of the player."""
+        return self.name
+
+    def get_hand(self):
+        """(PersistentDeck): The player's deck of playable cards."""
+        return self.hand
+
+    def get_coders(self):
+        """(PersistentDeck): The player's deck of collected coder cards."""
+        return self.coders
+
+    def has_won(self):
+        """(bool): True iff the player has exactly or more than 4 coders."""
+        return self.coders.get_amount() >= WIN_CODERS
+
+
+class _PlayerView:
+    """
+    Mutable stand-in for a PlayerState while a move is resolved. A player's
+    decks are only copied into a Deck once a card asks for them.
+    """
+
+    def __init__(self, state):
+        self._state = state
+        self._hand = None
+        self._coders = None
+
+    def get_name(self):
+        return self._state.name
+
+    def get_hand(self):
+        if self._hand is None:
+            self._hand = Deck(self._state.hand.get_cards())
+        return self._hand
+
+    def get_coders(self):
+        if self._coders is None:
+            self._coders = Deck(self._state.coders.get_cards())
+        return self._coders
+
+    def has_won(self):
+        return self.get_coders().get_amount() >= WIN_CODERS
+
+    def freeze(self):
+        """(PlayerState): Returns the state of the player after the move."""
+        state = self._state
+        if self._hand is not None:
+            state = state._replace(hand=PersistentDeck.from_cards(self._hand.get_cards()))
+        if self._coders is not None:
+            state = state._replace(coders=PersistentDeck.from_cards(self._coders.get_cards()))
+        return state
+
+
+class _PileView:
+    """Mutable stand-in for the pickup pile, supporting only what cards use."""
+
+    def __init__(self, deck):
+        self.deck = deck
+
+    def pick(self, amount=1):
+        cards, self.deck = self.deck.pick(amount)
+        return cards
+
+    def get_amount(self):
+        return self.deck.get_amount()
+
+
+class _GameView:
+    """
+    Mutable stand-in for a CodersGame while a move is resolved, offering the
+    methods used by Card.play and Card.action.
+    """
+
+    def __init__(self, state):
+        self._state = state
+        self.players = [_PlayerView(player) for player in state.players]
+        self._pile = _PileView(state.pickup_pile)
+        self._coders = None
+        self._turn = state.turn
+        self._action = state.action
+
+    def get_pickup_pile(self):
+        return self._pile
+
+    def get_sleeping_coders(self):
+        if self._coders is None:
+            self._coders = list(self._state.sleeping_coders)
+        return self._coders
+
+    def get_sleeping_coder(self, slot):
+        return self.get_sleeping_coders()[slot]
+
+    def set_sleeping_coder(self, slot, card):
+        self.get_sleeping_coders()[slot] = card
+
+    def current_player(self):
+        return self.players[self._turn]
+
+    def next_player(self):
+        self._turn = (self._turn + 1) % len(self.players)
+        return self.players[self._turn]
+
+    def get_action(self):
+        return self._action
+
+    def set_action(self, action):
+        self._action = action
+
+    def freeze(self, putdown_pile):
+        """(GameState): Returns the state of the game after the move."""
+        state = self._state
+        sleeping_coders = state.sleeping_coders
+        if self._coders is not None:
+            sleeping_coders = tuple(self._coders)
+        return GameState(
+            pickup_pile=self._pile.deck,
+            putdown_pile=putdown_pile,
+            players=tuple(player.freeze() for player in self.players),
+            sleeping_coders=sleeping_coders,
+            turn=self._turn,
+            action=self._action
+        )
+
+
+_GameStateBase = namedtuple('GameState', [
+    'pickup_pile',
+    'putdown_pile',
+    'players',
+    'sleeping_coders',
+    'turn',
+    'action'
+])
+
+
+class GameState(_GameStateBase):
+    """
+    An immutable game of Sleeping Coders.
+
+    The pending action, if any, belongs to the card on top of the putdown pile.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_game(cls, game):
+        """
+        Capture a CodersGame as a GameState.
+
+        Parameters:
+            game (CodersGame): The game to capture.
+
+        Returns:
+            (GameState): The state of the game.
+        """
+        players = tuple(PlayerState(player.get_name(),
+                                    PersistentDeck.from_cards(player.get_hand().get_cards()),
+                                    PersistentDeck.from_cards(player.get_coders().get_cards()))
+                        for player in game.players)
+        action = game.get_action()
+        return cls(
+            pickup_pile=PersistentDeck.from_cards(game.get_pickup_pile().get_cards()),
+            putdown_pile=PersistentDeck.from_cards(game.putdown_pile.get_cards()),
+            players=players,
+            sleeping_coders=tuple(game.get_sleeping_coders()),
+            turn=game.players.index(game.current_player()),
+            action=NO_ACTION if action is None else action
+        )
+
+    def current_player(self):
+        """(PlayerState): Returns the player whose turn it is."""
+        return self.players[self.turn]
+
+    def get_last_card(self):
+        """(Card): Returns the last card that was played."""
+        return self.putdown_pile.top()
+
+    def is_over(self):
+        """(bool): True iff the pickup pile is empty or a player has won."""
+        return self.pickup_pile.get_amount() == 0 or self.winner() is not None
+
+    def winner(self):
+        """
+        (int): Returns the seat of the winning player, None if there is none.
+               As CodersGame.is_over, the last winning player in turn order wins
+               and there is no winner once the pickup pile is empty.
+        """
+        return find_winner(self.pickup_pile, self.players)
+
+    def targets(self):
+        """
+        (list<tuple<int, int>>): Returns the seat and slot of every target
+                                 for the pending action.
+        """
+        return list_targets(self.action, self.turn, self.sleeping_coders,
+                            [player.coders.get_amount() for player in self.players])
+
+    def play(self, slot):
+        """
+        Play a card from the current player's hand, as CodersGame.select_card.
+
+        Parameters:
+            slot (int): The slot of the card in the current player's hand.
+
+        Returns:
+            (GameState): The state after the card is played.
+        """
+        card = self.current_player().hand.get_card(slot)
+        view = _GameView(self)
+        card.play(view.current_player(), view)
+        return view.freeze(self.putdown_pile.add_card(card))
+
+    def act(self, seat, slot):
+        """
+        Perform the action of the last played card.
+
+        Parameters:
+            seat (int): The seat of the player relevant for the action.
+            slot (int): The slot selected for the action.
+
+        Returns:
+            (GameState): The state after the action.
+        """
+        view = _GameView(self)
+        self.get_last_card().action(view.players[seat], view, slot)
+        return view.freeze(self.putdown_pile)
+
+    def skip_action(self):
+        """
+        (GameState): Returns the state after abandoning a pending action with
+                     no targets, passing the turn to the next player.
+        """
+        return self._replace(action=NO_ACTION, turn=(self.turn + 1) % len(self.players))
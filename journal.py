@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Undo and redo for games of Sleeping Coders
+
+A Journal listens to every deck and the sleeping coder slots of a game and
+records each change made while a move is played. Undoing a move applies the
+inverse of its changes in reverse order, so it costs time proportional to the
+size of the move rather than the size of the game.
+"""
+
+from collections import namedtuple
+
+from a2 import SleepingCoders
+from gamestate import get_turn_state, set_turn_state
+
+# The kinds of change recorded
+CARD_ADDED = "CARD_ADDED"
+CARD_REMOVED = "CARD_REMOVED"
+SLOT_CHANGED = "SLOT_CHANGED"
+
+Move = namedtuple('Move', ['changes', 'before', 'after'])
+
+
+class Journal:
+    """
+    Records the changes made by each move of a CodersGame so that moves can be
+    undone and redone.
+
+    A move is recorded between begin and commit. Any change to the game made
+    outside of a move cannot be undone, so it clears the journal's history.
+    """
+
+    def __init__(self, game):
+        """
+        Start journaling a game.
+
+        The game's sleeping coders must be a SleepingCoders and none of its
+        decks may be tracking positions, as undoing a removal must put the card
+        back in its original slot.
+
+        Parameters:
+            game (CodersGame): The game to journal.
+        """
+        coders = game.get_sleeping_coders()
+        if not isinstance(coders, SleepingCoders):
+            raise TypeError("the sleeping coders of a journaled game must be a SleepingCoders")
+
+        decks = [game.get_pickup_pile(), game.putdown_pile]
+        for player in game.players:
+            decks.extend((player.get_hand(), player.get_coders()))
+        for deck in decks:
+            if deck.tracks_positions():
+                raise ValueError("cannot journal a deck tracking positions")
+
+        self._game = game
+        self._decks = decks
+        self._coders = coders
+        for deck in decks:
+            deck.add_listener(self)
+        coders.add_listener(self)
+
+        # changes of the move being recorded, None outside of a move
+        self._changes = None
+        self._before = None
+        self._replaying = False
+        self._undo = []
+        self._redo = []
+
+    def detach(self):
+        """Stop journaling the game, forgetting every recorded move."""
+        for deck in self._decks:
+            deck.remove_listener(self)
+        self._coders.remove_listener(self)
+        self.clear()
+
+    def clear(self):
+        """Forget every recorded move."""
+        self._undo.clear()
+        self._redo.clear()
+
+    def _get_state(self):
+        """
+        (tuple): Returns the parts of the game not held in decks or slots,
+                 the turn, direction, action and outcome.
+        """
+        game = self._game
+        return (*get_turn_state(game), game.get_action(), game.winner, game._is_over)
+
+    def _set_state(self, state):
+        """
+        Return the parts of the game not held in decks or slots to a state
+        from _get_state.
+        """
+        game = self._game
+        seat, direction, action, game.winner, game._is_over = state
+        set_turn_state(game, seat, direction)
+        game.set_action(action)
+
+    def begin(self):
+        """Start recording a move."""
+        if self._changes is not None:
+            raise ValueError("a move is already being recorded")
+        self._changes = []
+        self._before = self._get_state()
+
+    def commit(self):
+        """
+        Finish recording a move, making it the move undone next. Any undone
+        moves can no longer be redone.
+        """
+        if self._changes is None:
+            raise ValueError("no move is being recorded")
+        self._undo.append(Move(self._changes, self._before, self._get_state()))
+        self._redo.clear()
+        self._changes = None
+        self._before = None
+
+    def rollback(self):
+        """Abandon the move being recorded, undoing its changes."""
+        if self._changes is None:
+            raise ValueError("no move is being recorded")
+        move = Move(self._changes, self._before, None)
+        self._changes = None
+        self._before = None
+        self._revert(move)
+
+    def is_recording(self):
+        """(bool): True iff a move is being recorded."""
+        return self._changes is not None
+
+    def can_undo(self):
+        """(bool): True iff there is a move to undo."""
+        return bool(self._undo)
+
+    def can_redo(self):
+        """(bool): True iff there is an undone move to redo."""
+        return bool(self._redo)
+
+    def undo(self):
+        """Return the game to the state before the last recorded move."""
+        if self._changes is not None:
+            raise ValueError("cannot undo while a move is being recorded")
+        if not self._undo:
+            raise IndexError("no move to undo")
+        move = self._undo.pop()
+        self._revert(move)
+        self._redo.append(move)
+
+    def redo(self):
+        """Play the last undone move again."""
+        if self._changes is not None:
+            raise ValueError("cannot redo while a move is being recorded")
+        if not self._redo:
+            raise IndexError("no move to redo")
+        move = self._redo.pop()
+
+        self._replaying = True
+        try:
+            for kind, target, slot, old, new in move.changes:
+                if kind == CARD_ADDED:
+                    target.insert_card(slot, new)
+                elif kind == CARD_REMOVED:
+                    target.remove_card(slot)
+                else:
+                    target[slot] = new
+        finally:
+            self._replaying = False
+        self._set_state(move.after)
+        self._undo.append(move)
+
+    def _revert(self, move):
+        """Apply the inverse of every change of a move, last change first."""
+        self._replaying = True
+        try:
+            for kind, target, slot, old, new in reversed(move.changes):
+                if kind == CARD_ADDED:
+                    target.remove_card(slot)
+                elif kind == CARD_REMOVED:
+                    target.insert_card(slot, old)
+                else:
+                    target[slot] = old
+        finally:
+            self._replaying = False
+        self._set_state(move.before)
+
+    def _record(self, change):
+        """Record a change to the game, forgetting history if outside a move."""
+        if self._replaying:
+            return
+        if self._changes is None:
+            self.clear()
+            return
+        self._changes.append(change)
+
+    def card_added(self, deck, slot, card):
+        """Record a card placed at a slot in a deck."""
+        self._record((CARD_ADDED, deck, slot, None, card))
+
+    def card_removed(self, deck, slot, card):
+        """Record a card taken from a slot in a deck."""
+        self._record((CARD_REMOVED, deck, slot, card, None))
+
+    def slot_changed(self, coders, slot, old_card, new_card):
+        """Record a sleeping coder slot being set."""
+        self._record((SLOT_CHANGED, coders, slot, old_card, new_card))
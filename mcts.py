@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo Tree Search player for Sleeping Coders
+
+The search runs on GameState, so expanding a node or playing out a rollout
+shares every deck a move does not touch. Opponents' hands are hidden, so each
+iteration of the search samples a determinization: the cards the player cannot
+see are shuffled and dealt back into the opponents' hands and the pickup pile.
+A single tree is shared by every determinization, a move only being considered
+when it is legal in the sampled one.
+
+With more than one worker the search is root parallel. Each worker process
+grows its own tree until the deadline of the decision and the visits of the
+moves at the root are summed.
+"""
+
+import argparse
+import math
+import random
+import time
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from a2 import Player
+from gamestate import GameState, PersistentDeck
+from moves import NO_ACTION
+from simulator import POLICIES, Policy, Simulator
+
+# The kinds of move
+PLAY = "PLAY"
+ACT = "ACT"
+SKIP = "SKIP"
+
+# Seconds of the time limit kept back to merge the workers' results, at most
+# half of the limit
+MERGE_TIME = 0.01
+# Moves played before a rollout is scored by the coders collected
+MAX_DEPTH = 200
+
+
+class SearchStats(namedtuple('SearchStats', ['rollouts', 'elapsed'])):
+    """
+    The amount of rollouts played by a search and the wall time it took.
+    """
+
+    __slots__ = ()
+
+    def rollouts_per_sec(self):
+        """(float): Returns the amount of rollouts played per second."""
+        return self.rollouts / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.rollouts} rollouts in {self.elapsed:.3f} seconds "
+                f"({self.rollouts_per_sec():.0f} rollouts/sec)")
+
+
+def legal_moves(state):
+    """
+    Find the moves available to the player to move.
+
+    Cards with equal keys make the same move, so each is offered once.
+
+    Parameters:
+        state (GameState): The state to move from.
+
+    Returns:
+        (list<tuple>): (PLAY, card key) to play a card from hand, (ACT, seat,
+                       slot) to target the pending action or (SKIP,) to pass
+                       a pending action with no target.
+    """
+    if state.action != NO_ACTION:
+        return [(ACT, seat, slot) for seat, slot in state.targets()] or [(SKIP,)]
+
+    moves = []
+    seen = set()
+    for card in state.current_player().hand.get_cards():
+        key = card.get_key()
+        if key not in seen:
+            seen.add(key)
+            moves.append((PLAY, key))
+    return moves
+
+
+def apply_move(state, move):
+    """
+    Make a move from legal_moves.
+
+    Parameters:
+        state (GameState): The state to move from.
+        move (tuple): The move to make.
+
+    Returns:
+        (GameState): The state after the move.
+    """
+    kind = move[0]
+    if kind == PLAY:
+        for slot, card in enumerate(state.current_player().hand.get_cards()):
+            if card.get_key() == move[1]:
+                return state.play(slot)
+        raise ValueError(f"no card in hand matches {move[1]}")
+    if kind == ACT:
+        return state.act(move[1], move[2])
+    return state.skip_action()
+
+
+def is_terminal(state):
+    """(bool): True iff the game is over at a turn boundary."""
+    return state.action == NO_ACTION and state.is_over()
+
+
+def score(state):
+    """
+    Score a state for every seat.
+
+    Parameters:
+        state (GameState): The state to score.
+
+    Returns:
+        (list<float>): 1 for the winner and 0 for the others if there is a
+                       winner, otherwise each seat's share of the collected
+                       coders.
+    """
+    players = state.players
+    winner = state.winner()
+    if winner is not None:
+        return [float(seat == winner) for seat in range(len(players))]
+
+    coders = [player.coders.get_amount() for player in players]
+    total = sum(coders)
+    if not total:
+        return [1 / len(players)] * len(players)
+    return [amount / total for amount in coders]
+
+
+def determinize(state, seat, rng):
+    """
+    Sample a state consistent with what a player can see.
+
+    Parameters:
+        state (GameState): The true state.
+        seat (int): The seat of the observing player.
+        rng (random.Random): Shuffles the hidden cards.
+
+    Returns:
+        (GameState): The state with the pickup pile and every opponent's hand
+                     replaced by a random deal of the hidden cards.
+    """
+    hidden = state.pickup_pile.get_cards()
+    for other, player in enumerate(state.players):
+        if other != seat:
+            hidden.extend(player.hand.get_cards())
+    rng.shuffle(hidden)
+
+    players = list(state.players)
+    start = state.pickup_pile.get_amount()
+    for other, player in enumerate(players):
+        if other != seat:
+            amount = player.hand.get_amount()
+            players[other] = player._replace(hand=PersistentDeck.from_cards(hidden[start:start + amount]))
+            start += amount
+    pickup_pile = PersistentDeck.from_cards(hidden[:state.pickup_pile.get_amount()])
+    return state._replace(pickup_pile=pickup_pile, players=tuple(players))
+
+
+class _Node:
+    """A node of the search tree, the statistics of the move leading to it."""
+
+    __slots__ = ('children', 'visits', 'value')
+
+    def __init__(self):
+        self.children = {}
+        self.visits = 0
+        self.value = 0.0
+
+
+def _rollout(state, rng, max_depth):
+    """(list<float>): Returns the score after random play from state."""
+    for _ in range(max_depth):
+        if is_terminal(state):
+            break
+        moves = legal_moves(state)
+        state = apply_move(state, moves[int(rng.random() * len(moves))])
+    return score(state)
+
+
+def _iterate(root, state, rng, exploration, max_depth):
+    """
+    Grow the tree by one iteration from a determinized root state.
+
+    Selection follows UCB1 among the children legal in the determinization,
+    expanding a random untried legal move, then a random rollout scores the
+    new leaf and the score is backed up from each mover's point of view.
+    """
+    path = [root]
+    node = root
+    while not is_terminal(state):
+        moves = legal_moves(state)
+        mover = state.turn
+        untried = [move for move in moves if move not in node.children]
+        if untried:
+            move = untried[int(rng.random() * len(untried))]
+            child = node.children[move] = _Node()
+            state = apply_move(state, move)
+            path.append((child, mover))
+            break
+
+        log_visits = math.log(sum(node.children[move].visits for move in moves))
+        best, best_value = None, -1.0
+        for move in moves:
+            child = node.children[move]
+            value = child.value / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best, best_value = move, value
+        node = node.children[best]
+        state = apply_move(state, best)
+        path.append((node, mover))
+
+    scores = _rollout(state, rng, max_depth)
+    root.visits += 1
+    for node, mover in path[1:]:
+        node.visits += 1
+        node.value += scores[mover]
+
+
+def search(state, deadline, iterations=None, exploration=1.4, max_depth=MAX_DEPTH, seed=None):
+    """
+    Search for the best move for the player to move, playing at least one
+    rollout.
+
+    Parameters:
+        state (GameState): The state to move from, as seen by the player.
+        deadline (float): The time.perf_counter() value to stop searching at,
+                          the same in every process.
+        iterations (int): If given, stop after this many rollouts even if time
+                          remains.
+        exploration (float): The UCB1 exploration constant.
+        max_depth (int): The moves played in a rollout before it is scored.
+        seed (int): Seeds the random number generator of the search.
+
+    Returns:
+        (tuple<dict<tuple, int>, int>): The visits of each move at the root and
+                                        the amount of rollouts played.
+    """
+    rng = random.Random(seed)
+    seat = state.turn
+    root = _Node()
+
+    rollouts = 0
+    while iterations is None or rollouts < iterations:
+        _iterate(root, determinize(state, seat, rng), rng, exploration, max_depth)
+        rollouts += 1
+        if time.perf_counter() >= deadline:
+            break
+
+    return {move: child.visits for move, child in root.children.items()}, rollouts
+
+
+class MCTSPolicy(Policy):
+    """
+    Chooses moves by Monte Carlo Tree Search within a time limit per decision.
+    """
+
+    def __init__(self, time_limit=0.5, workers=1, iterations=None, exploration=1.4,
+                 max_depth=MAX_DEPTH):
+        """
+        Construct a policy searching for each decision.
+
+        Parameters:
+            time_limit (float): The seconds allowed per decision.
+            workers (int): The amount of processes searching in parallel.
+            iterations (int): If given, the most rollouts played per worker
+                              per decision.
+            exploration (float): The UCB1 exploration constant.
+            max_depth (int): The moves played in a rollout before it is scored.
+        """
+        self._time_limit = time_limit
+        self._workers = workers
+        self._iterations = iterations
+        self._exploration = exploration
+        self._max_depth = max_depth
+        self._executor = None
+        self._stats = SearchStats(0, 0.0)
+        self._total = SearchStats(0, 0.0)
+
+    def get_stats(self):
+        """(SearchStats): Returns the rollouts played by the last decision."""
+        return self._stats
+
+    def get_total_stats(self):
+        """(SearchStats): Returns the rollouts played by every decision."""
+        return self._total
+
+    def start(self):
+        """
+        Start the worker processes ahead of the first decision, so that it
+        does not pay for starting them.
+        """
+        if self._workers > 1 and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._workers)
+            for future in [self._executor.submit(int) for _ in range(self._workers)]:
+                future.result()
+
+    def close(self):
+        """Shut down the worker processes, if any were started."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __getstate__(self):
+        # worker processes cannot be sent to another process
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        return state
+
+    def choose_move(self, state, rng):
+        """
+        Search for the best move for the player to move.
+
+        Parameters:
+            state (GameState): The state to move from.
+            rng (random.Random): Seeds the search.
+
+        Returns:
+            (tuple): The move from legal_moves visited most by the search.
+        """
+        start = time.perf_counter()
+        moves = legal_moves(state)
+        if len(moves) == 1:
+            self._record(0, start)
+            return moves[0]
+
+        # one deadline for every worker, counted from the start of the decision
+        deadline = start + self._time_limit - min(MERGE_TIME, self._time_limit / 2)
+        seeds = [rng.getrandbits(64) for _ in range(self._workers)]
+        args = (self._iterations, self._exploration, self._max_depth)
+        if self._workers <= 1:
+            results = [search(state, deadline, *args, seed=seeds[0])]
+        else:
+            self.start()
+            futures = [self._executor.submit(search, state, deadline, *args, seed=seed)
+                       for seed in seeds]
+            results = [future.result() for future in futures]
+
+        visits = dict.fromkeys(moves, 0)
+        rollouts = 0
+        for worker_visits, worker_rollouts in results:
+            for move, amount in worker_visits.items():
+                visits[move] += amount
+            rollouts += worker_rollouts
+        self._record(rollouts, start)
+        # ties go to the first legal move, keeping the choice reproducible
+        return max(moves, key=visits.__getitem__)
+
+    def _record(self, rollouts, start):
+        """Record the rollouts played by a decision which began at start."""
+        self._stats = SearchStats(rollouts, time.perf_counter() - start)
+        self._total = SearchStats(self._total.rollouts + rollouts,
+                                  self._total.elapsed + self._stats.elapsed)
+
+    def choose_card(self, game, player, rng):
+        _, key = self.choose_move(GameState.from_game(game), rng)
+        for slot, card in enumerate(player.get_hand().get_cards()):
+            if card.get_key() == key:
+                return slot
+
+    def choose_target(self, game, player, targets, rng):
+        _, seat, slot = self.choose_move(GameState.from_game(game), rng)
+        return game.players[seat], slot
+
+
+class MCTSPlayer(Player):
+    """
+    A player choosing its moves by Monte Carlo Tree Search.
+    """
+
+    def __init__(self, name, time_limit=0.5, workers=1, seed=None, **options):
+        """
+        Construct a player searching for each decision.
+
+        Parameters:
+            name (str): The name of the player.
+            time_limit (float): The seconds allowed per decision.
+            workers (int): The amount of processes searching in parallel.
+            seed (int): Seeds the searches.
+            **options: Further options of MCTSPolicy.
+        """
+        super().__init__(name)
+        self._policy = MCTSPolicy(time_limit=time_limit, workers=workers, **options)
+        self._rng = random.Random(seed)
+
+    def get_policy(self):
+        """(MCTSPolicy): Returns the policy searching for this player."""
+        return self._policy
+
+    def choose_card(self, game):
+        """
+        Choose a card from this player's hand to play.
+
+        Parameters:
+            game (CodersGame): The current game of Sleeping Coders.
+
+        Returns:
+            (Card): The card to play.
+        """
+        return self.get_hand().get_card(self._policy.choose_card(game, self, self._rng))
+
+    def choose_target(self, game, targets):
+        """
+        Choose the target of the action of the card this player just played.
+
+        Parameters:
+            game (CodersGame): The current game of Sleeping Coders.
+            targets (list<tuple<Player, int>>): The possible targets.
+
+        Returns:
+            (tuple<Player, int>): The player and slot to pass to Card.action.
+        """
+        return self._policy.choose_target(game, self, targets, self._rng)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games of Sleeping Coders against an MCTS player")
+    parser.add_argument("-n", "--games", type=int, default=10,
+                        help="The amount of games to play")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="The seed of the first game")
+    parser.add_argument("-t", "--time-limit", type=float, default=0.1,
+                        help="The seconds allowed per decision")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="The amount of worker processes searching in parallel")
+    parser.add_argument("-p", "--opponents", nargs="+", default=["random"],
+                        choices=sorted(POLICIES), help="The policy of each other seat")
+    args = parser.parse_args()
+
+    policy = MCTSPolicy(time_limit=args.time_limit, workers=args.jobs)
+    policy.start()
+    simulator = Simulator([policy] + [POLICIES[name]() for name in args.opponents])
+    try:
+        report = simulator.run(args.games, seed=args.seed)
+    finally:
+        policy.close()
+    print(report)
+    print(f"Wins by seat: {report.wins()}")
+    print(f"Search: {policy.get_total_stats()}")
+
+
+if __name__ == "__main__":
+    main()
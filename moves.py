@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Legal move generation for Sleeping Coders
+
+What each card class does is looked up in tables built once, and a
+MoveGenerator listens to a game's sleeping coder slots and coder collections
+to keep an index of the occupied and empty slots and each player's coder
+count. Listing the legal moves then costs the amount of moves, not the size
+of the game.
+
+Every listing of targets follows list_targets: the simulator and endgame
+search use a MoveGenerator where one is kept, and find_targets otherwise.
+GameState, and so MCTS, calls list_targets directly; its states are
+immutable and branch, so there is no single game for an index to follow.
+"""
+
+from bisect import bisect_left, insort
+
+from a2 import (AllNighterCard, Card, CoderCard, KeyboardKidnapperCard, NumberCard,
+                SleepingCoders, TutorCard)
+
+NO_ACTION = Card.PLAY_ACTION
+PICKUP_CODER = TutorCard.PLAY_ACTION
+STEAL_CODER = KeyboardKidnapperCard.PLAY_ACTION
+SLEEP_CODER = AllNighterCard.PLAY_ACTION
+
+# Coders a player must collect to win, as Player.has_won
+WIN_CODERS = 4
+
+# How much an action swings the coder count, for policies and searches
+# trying the strongest cards first
+PRIORITY = {STEAL_CODER: 3, PICKUP_CODER: 2, SLEEP_CODER: 1}
+
+# What the target of an action is chosen from
+SLEEPING_SLOTS = "SLEEPING_SLOTS"
+OPPONENT_CODERS = "OPPONENT_CODERS"
+
+# card class -> the action playing it sets
+ACTIONS = {card_class: card_class.PLAY_ACTION
+           for card_class in (Card, NumberCard, CoderCard, TutorCard,
+                              KeyboardKidnapperCard, AllNighterCard)}
+
+# action -> what its target is chosen from, None if it has no target
+TARGET_KINDS = {
+    NO_ACTION: None,
+    PICKUP_CODER: SLEEPING_SLOTS,
+    STEAL_CODER: OPPONENT_CODERS,
+    SLEEP_CODER: OPPONENT_CODERS,
+}
+
+
+def card_action(card):
+    """
+    (str): Returns the action set by playing a card, adding the card's class
+           to ACTIONS if it is not yet there.
+    """
+    card_class = card.__class__
+    action = ACTIONS.get(card_class)
+    if action is None:
+        action = ACTIONS[card_class] = card_class.PLAY_ACTION
+    return action
+
+
+def list_targets(action, seat, sleeping_coders, coder_counts):
+    """
+    List the targets of an action from the state of a game.
+
+    Parameters:
+        action (str): The action set by the card played.
+        seat (int): The seat of the player performing the action.
+        sleeping_coders (sequence<Card>): The sleeping coder in each slot,
+                                          None for an empty slot.
+        coder_counts (list<int>): The amount of coders collected at each seat.
+
+    Returns:
+        (list<tuple<int, int>>): The seat of the player to pass to Card.action
+                                 and the selected slot of each target.
+    """
+    kind = TARGET_KINDS.get(action)
+    if kind == SLEEPING_SLOTS:
+        return [(seat, slot) for slot, coder in enumerate(sleeping_coders) if coder is not None]
+    if kind == OPPONENT_CODERS:
+        return [(other, slot) for other, count in enumerate(coder_counts) if other != seat
+                for slot in range(count)]
+    return []
+
+
+def find_targets(game, player, action):
+    """
+    Find every target available for an action, without an index.
+
+    Parameters:
+        game (CodersGame): The current game of Sleeping Coders.
+        player (Player): The player whose turn it is.
+        action (str): The pending action of the game.
+
+    Returns:
+        (list<tuple<Player, int>>): The player to pass to Card.action paired
+                                    with the selected slot.
+    """
+    players = game.players
+    counts = [other.get_coders().get_amount() for other in players]
+    return [(players[seat], slot) for seat, slot in
+            list_targets(action, players.index(player), game.get_sleeping_coders(), counts)]
+
+
+class MoveGenerator:
+    """
+    Lists the legal moves in a CodersGame from indexes kept up to date as the
+    game is played.
+    """
+
+    def __init__(self, game):
+        """
+        Start indexing a game.
+
+        Parameters:
+            game (CodersGame): The game to list moves for. Its sleeping coders
+                               must be a SleepingCoders.
+        """
+        coders = game.get_sleeping_coders()
+        if not isinstance(coders, SleepingCoders):
+            raise TypeError("the sleeping coders of an indexed game must be a SleepingCoders")
+
+        self._game = game
+        self._coders = coders
+        self._occupied = [slot for slot, card in enumerate(coders) if card is not None]
+        self._empty = [slot for slot, card in enumerate(coders) if card is None]
+        coders.add_listener(self)
+
+        self._seats = {}
+        self._counts = []
+        for seat, player in enumerate(game.players):
+            deck = player.get_coders()
+            self._seats[player] = seat
+            self._seats[deck] = seat
+            self._counts.append(deck.get_amount())
+            deck.add_listener(self)
+        self._total = sum(self._counts)
+        # the seats holding at least one coder, in order
+        self._holders = [seat for seat, count in enumerate(self._counts) if count]
+
+    def detach(self):
+        """Stop indexing the game."""
+        self._coders.remove_listener(self)
+        for player in self._game.players:
+            player.get_coders().remove_listener(self)
+
+    def get_occupied_slots(self):
+        """(list<int>): Returns the slots holding a sleeping coder, in order."""
+        return self._occupied
+
+    def get_empty_slots(self):
+        """(list<int>): Returns the slots without a sleeping coder, in order."""
+        return self._empty
+
+    def get_coder_count(self, player):
+        """(int): Returns the amount of coders a player has collected."""
+        return self._counts[self._seats[player]]
+
+    def card_moves(self, player):
+        """
+        List the cards a player can play.
+
+        Parameters:
+            player (Player): The player to move.
+
+        Returns:
+            (list<tuple<int, Card, str>>): The slot in hand, card and action of
+                                           each card in the player's hand.
+        """
+        return [(slot, card, card_action(card))
+                for slot, card in enumerate(player.get_hand().get_cards())]
+
+    def has_targets(self, player, action):
+        """
+        (bool): True iff the action has a target when performed by player, or
+                needs none.
+        """
+        kind = TARGET_KINDS.get(action)
+        if kind == SLEEPING_SLOTS:
+            return bool(self._occupied)
+        if kind == OPPONENT_CODERS:
+            return self._total > self._counts[self._seats[player]]
+        return True
+
+    def targets(self, player, action):
+        """
+        List the targets of an action, as find_targets.
+
+        Parameters:
+            player (Player): The player performing the action.
+            action (str): The action set by the card played.
+
+        Returns:
+            (list<tuple<Player, int>>): The player to pass to Card.action and
+                                        the selected slot of each target.
+        """
+        kind = TARGET_KINDS.get(action)
+        if kind == SLEEPING_SLOTS:
+            return [(player, slot) for slot in self._occupied]
+        if kind == OPPONENT_CODERS:
+            counts = self._counts
+            players = self._game.players
+            return [(other, slot) for other in map(players.__getitem__, self._holders)
+                    if other is not player for slot in range(counts[self._seats[other]])]
+        return []
+
+    def card_added(self, deck, slot, card):
+        """Count a coder collected."""
+        seat = self._seats[deck]
+        self._counts[seat] += 1
+        self._total += 1
+        if self._counts[seat] == 1:
+            insort(self._holders, seat)
+
+    def card_removed(self, deck, slot, card):
+        """Count a coder lost."""
+        seat = self._seats[deck]
+        self._counts[seat] -= 1
+        self._total -= 1
+        if not self._counts[seat]:
+            holders = self._holders
+            del holders[bisect_left(holders, seat)]
+
+    def slot_changed(self, coders, slot, old_card, new_card):
+        """Move a sleeping coder slot between the occupied and empty indexes."""
+        if (old_card is None) == (new_card is None):
+            return
+        if new_card is None:
+            source, target = self._occupied, self._empty
+        else:
+            source, target = self._empty, self._occupied
+        del source[bisect_left(source, slot)]
+        insort(target, slot)
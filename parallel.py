@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo runner spreading Sleeping Coders simulations over a process pool
+
+A batch of games is cut into contiguous chunks, each chunk is played by a
+worker process and the per-worker results are merged back into a single
+SimulationReport in game order.
+"""
+
+import argparse
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+from simulator import POLICIES, SimulationReport, Simulator, split_seed
+
+# Chunks handed out per worker, more chunks balance load better
+# at the cost of more inter-process traffic.
+CHUNKS_PER_WORKER = 4
+
+
+def _play_chunk(simulator, seed, start, games):
+    """
+    Play a contiguous chunk of a batch inside a worker process.
+
+    Each game draws from its own random.Random stream, seeded by split_seed
+    from the batch seed and its position in the batch, which also shuffles
+    its pickup pile. Nothing depends on the worker's global random state, so
+    a game plays out the same whichever worker picks up its chunk.
+
+    Parameters:
+        simulator (Simulator): The simulator to play the games with.
+        seed (int): The seed of the batch.
+        start (int): The position in the batch of the first game in the chunk.
+        games (int): The amount of games in the chunk.
+
+    Returns:
+        (list<GameResult>): The result of each game in the chunk.
+    """
+    return [simulator.play_game(split_seed(seed, start + k)) for k in range(games)]
+
+
+def split_batch(games, start, chunks):
+    """
+    Split a batch of games into near equal contiguous chunks.
+
+    Parameters:
+        games (int): The amount of games in the batch.
+        start (int): The position of the first game in the batch.
+        chunks (int): The maximum amount of chunks to split into.
+
+    Returns:
+        (list<tuple<int, int>>): The position of the first game and the
+                                 amount of games of each non-empty chunk.
+    """
+    chunks = max(1, min(chunks, games))
+    size, extra = divmod(games, chunks)
+
+    result = []
+    for chunk in range(chunks):
+        count = size + (chunk < extra)
+        if count:
+            result.append((start, count))
+        start += count
+    return result
+
+
+def run_parallel(simulator, games, seed=0, workers=None):
+    """
+    Play a batch of games across a pool of worker processes.
+
+    Game k of the batch is always seeded with split_seed(seed, k) so the
+    merged results are identical to Simulator.run(games, seed) for any amount
+    of workers.
+
+    Parameters:
+        simulator (Simulator): The simulator to play the games with.
+        games (int): The amount of games to play.
+        seed (int): The seed of the batch.
+        workers (int): The amount of worker processes, defaults to the
+                       amount of CPUs available.
+
+    Returns:
+        (SimulationReport): The merged results of every game.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    start = timer()
+    if workers <= 1:
+        results = _play_chunk(simulator, seed, 0, games)
+        return SimulationReport(results, timer() - start)
+
+    chunks = split_batch(games, 0, workers * CHUNKS_PER_WORKER)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_play_chunk, simulator, seed, start, count)
+                   for start, count in chunks]
+        # merge in submission order to keep the results in game order
+        for future in futures:
+            results.extend(future.result())
+
+    return SimulationReport(results, timer() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate games of Sleeping Coders in parallel")
+    parser.add_argument("-n", "--games", type=int, default=100000,
+                        help="The amount of games to simulate")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="The seed of the batch")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="The amount of worker processes, defaults to the CPU count")
+    parser.add_argument("-p", "--policies", nargs="+", default=["random", "random"],
+                        choices=sorted(POLICIES), help="The policy of each seat")
+    parser.add_argument("--deck-copies", type=int, default=0,
+                        help="The amount of times the full deck is doubled")
+    parser.add_argument("--interned", action="store_true",
+                        help="Share a single instance between identical cards")
+    args = parser.parse_args()
+
+    simulator = Simulator([POLICIES[name]() for name in args.policies],
+                          deck_copies=args.deck_copies, interned=args.interned)
+    report = run_parallel(simulator, args.games, seed=args.seed, workers=args.jobs)
+    print(report)
+    print(f"Wins by seat: {report.wins()}")
+
+
+if __name__ == "__main__":
+    main()
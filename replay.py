@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+Compact binary replay logs of games of Sleeping Coders
+
+A log starts with a header naming every card that may appear in it, so cards
+are written as their varint id in that dictionary, and the sleeping coders
+every game starts with. Each game is then one length-prefixed record holding:
+
+    the amount of players, the hand size and how cards with equal ids are
+    shared: all distinct, all one instance or as listed after the ids
+    the amount of cards in the pickup pile and the id of each, in the order
+    they were in after shuffling and before dealing
+    if listed, which instance of its id each card is, numbering the instances
+    of an id in the order they first appear
+    for every turn, the slot in hand of the card played, followed by the
+    index of the chosen target in the list of targets if the card's action
+    had any
+
+Whether a target follows a play is not written, the reader replays the game
+to know. Records are only decoded when a game is replayed, so skipping games
+costs nothing more than reading their length.
+"""
+
+import argparse
+import io
+
+from timeit import default_timer as timer
+
+import a2
+
+from a2 import Deck, Player, SleepingCoders
+from a2_support import CODERS, FULL_DECK, build_deck
+from simulator import POLICIES, Policy, Simulator, TrackedGame
+
+MAGIC = b"SCRL"
+VERSION = 2
+
+# How the argument of a card in the dictionary is written
+NO_ARGUMENT = 0
+INT_ARGUMENT = 1
+STR_ARGUMENT = 2
+
+# How cards with equal ids in a pickup pile are shared
+DISTINCT = 0
+SHARED = 1
+INSTANCES = 2
+
+# Cards remembered by a ReplayWriter before it decides they are not reused
+KNOWN_CARDS = 4096
+
+# Runs timed by main, with and without recording
+REPEATS = 3
+
+
+def write_varint(buffer, value):
+    """
+    Append a non-negative integer to a buffer, 7 bits per byte with the high
+    bit set on every byte but the last.
+
+    Parameters:
+        buffer (bytearray): The buffer to append to.
+        value (int): The integer to write.
+    """
+    while value >= 0x80:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, position):
+    """
+    Read a non-negative integer written by write_varint.
+
+    Parameters:
+        data (bytes): The data to read from.
+        position (int): The position of the first byte of the integer.
+
+    Returns:
+        (tuple<int, int>): The integer and the position after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _write_text(buffer, text):
+    """Append a length-prefixed UTF-8 string to a buffer."""
+    encoded = text.encode()
+    write_varint(buffer, len(encoded))
+    buffer += encoded
+
+
+def _read_text(data, position):
+    """(tuple<str, int>): Returns a string written by _write_text and the position after it."""
+    length, position = read_varint(data, position)
+    end = position + length
+    return bytes(data[position:end]).decode(), end
+
+
+def default_cards():
+    """(list<tuple>): Returns the keys of every card of the full deck and the coders."""
+    keys = []
+    for card in build_deck(FULL_DECK) + CODERS:
+        key = card.get_key()
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def _make_card(key):
+    """(Card): Returns a new card with the given key."""
+    card_class, *arguments = key
+    return card_class(*arguments)
+
+
+class ReplayWriter:
+    """
+    Streams games to a binary replay log as they are played.
+
+    Give it to a Simulator as its recorder, which calls begin_game and
+    end_game around each game and appends its moves to get_moves.
+    """
+
+    def __init__(self, stream, cards=None, coders=None, header=True):
+        """
+        Start a log by writing its header.
+
+        Parameters:
+            stream (io.RawIOBase): The binary stream the log is written to.
+            cards (list<tuple>): The keys of every card that may be logged,
+                                 defaults to the cards of the full deck.
+            coders (list<Card>): The sleeping coders every game starts with,
+                                 defaults to CODERS.
+            header (bool): Whether to write the header, False when appending
+                           to a log which already has one.
+        """
+        if cards is None:
+            cards = default_cards()
+        if coders is None:
+            coders = CODERS
+
+        self._stream = stream
+        self._ids = {key: card_id for card_id, key in enumerate(cards)}
+        # card -> id, for cards seen in earlier games such as flyweights
+        self._known = {}
+        # template -> (id of the card at each position, amount of distinct ids)
+        self._templates = {}
+        # (card -> id, amount of distinct ids) of the next game given to stamp_game
+        self._stamped = None
+        # the numbers of the record of the game being recorded
+        self._values = None
+        self._games = 0
+        if header:
+            stream.write(self._header(cards, coders))
+
+    def _header(self, cards, coders):
+        """(bytearray): Returns the header of a log with the given cards and coders."""
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        write_varint(header, len(cards))
+        for card_class, *arguments in cards:
+            _write_text(header, card_class.__name__)
+            if not arguments:
+                header.append(NO_ARGUMENT)
+            elif isinstance(arguments[0], int):
+                header.append(INT_ARGUMENT)
+                write_varint(header, arguments[0])
+            else:
+                header.append(STR_ARGUMENT)
+                _write_text(header, arguments[0])
+        write_varint(header, len(coders))
+        for card in coders:
+            # 0 for an empty slot
+            write_varint(header, 0 if card is None else self._card_id(card) + 1)
+        return header
+
+    def _card_id(self, card):
+        """(int): Returns the id of a card in the dictionary of the log."""
+        try:
+            return self._ids[card.get_key()]
+        except KeyError:
+            raise ValueError(f"{card} is not in the card dictionary of the log") from None
+
+    def get_game_count(self):
+        """(int): Returns the amount of games written."""
+        return self._games
+
+    def _card_ids(self, cards):
+        """(list<int>): Returns the ids of cards in the dictionary of the log."""
+        known = self._known
+        if known is not None:
+            try:
+                return list(map(known.__getitem__, cards))
+            except KeyError:
+                if len(known) > KNOWN_CARDS:
+                    # cards are not being reused, stop remembering them
+                    self._known = known = None
+
+        ids = self._ids
+        try:
+            card_ids = [ids[card.get_key()] for card in cards]
+        except KeyError:
+            card_ids = [self._card_id(card) for card in cards]
+        if known is not None:
+            known.update(zip(cards, card_ids))
+        return card_ids
+
+    def stamp_game(self, cards, template):
+        """
+        Remember the ids of the cards of the next game from the template they
+        were stamped out of, so begin_game reads no card's key.
+
+        Parameters:
+            cards (list<Card>): The cards stamped out by the template, in order
+                                and not yet shuffled.
+            template (DeckTemplate): The template the cards came from.
+        """
+        stamped = self._templates.get(template)
+        if stamped is None:
+            # the prototypes of a template have distinct ids
+            prototype_ids = [self._card_id(card) for card in template.get_prototypes()]
+            stamped = [prototype_ids[card_id] for card_id in template.get_ids()], len(prototype_ids)
+            self._templates[template] = stamped
+        card_ids, distinct_ids = stamped
+        self._stamped = dict(zip(cards, card_ids)), distinct_ids
+
+    def begin_game(self, cards, players, hand_size):
+        """
+        Start recording a game.
+
+        Parameters:
+            cards (list<Card>): The pickup pile, shuffled and not yet dealt.
+            players (int): The amount of players.
+            hand_size (int): The amount of cards dealt to each player.
+        """
+        stamped = self._stamped
+        self._stamped = None
+        if stamped is not None:
+            known, distinct_ids = stamped
+            card_ids = list(map(known.__getitem__, cards))
+            instances = len(known)
+        else:
+            card_ids = self._card_ids(cards)
+            instances = len(set(cards))
+            distinct_ids = len(set(card_ids))
+        # how equal cards are shared changes which of them is removed from a hand
+        if instances == len(cards):
+            sharing = DISTINCT
+        elif instances == distinct_ids:
+            sharing = SHARED
+        else:
+            # some cards repeat an instance and others with the same id don't,
+            # as when Simulator copies a deck of fresh cards
+            sharing = INSTANCES
+        values = self._values = [players, hand_size, sharing, len(cards)]
+        values += card_ids
+        if sharing == INSTANCES:
+            numbers = {}
+            for card, card_id in zip(cards, card_ids):
+                instances = numbers.setdefault(card_id, {})
+                values.append(instances.setdefault(card, len(instances)))
+
+    def get_moves(self):
+        """
+        (list<int>): Returns the list the moves of the game being recorded are
+                     appended to, as in Simulator.play_turn.
+        """
+        return self._values
+
+    def end_game(self):
+        """Write the game recorded to the log."""
+        values = self._values
+        try:
+            record = bytes(values)
+        except ValueError:
+            record = None
+        if record is None or not record.isascii():
+            # not every value fits in a single byte
+            record = bytearray()
+            for value in values:
+                write_varint(record, value)
+        prefix = bytearray()
+        write_varint(prefix, len(record))
+        prefix += record
+        self._stream.write(prefix)
+        self._values = None
+        self._games += 1
+
+
+class ReplayPolicy(Policy):
+    """
+    Replays the moves of a recorded game.
+    """
+
+    def __init__(self, data, position, end):
+        """
+        Construct a policy reading moves from a record.
+
+        Parameters:
+            data (bytes): The data holding the record.
+            position (int): The position of the first move.
+            end (int): The position after the last move.
+        """
+        self._data = data
+        self._position = position
+        self._end = end
+        self._card = self._target = None
+
+    def has_moves(self):
+        """(bool): True iff moves remain to be replayed."""
+        return self._position < self._end
+
+    def _next(self):
+        """(int): Returns the next number of the record."""
+        value, self._position = read_varint(self._data, self._position)
+        return value
+
+    def get_last_move(self):
+        """
+        (tuple<Card, tuple<Player, int>>): Returns the card last played and
+            the target of its action, None if it had none.
+        """
+        return self._card, self._target
+
+    def choose_card(self, game, player, rng):
+        """(int): Returns the slot of the next card played."""
+        slot = self._next()
+        self._card = player.get_hand().get_card(slot)
+        self._target = None
+        return slot
+
+    def choose_target(self, game, player, targets, rng):
+        """(tuple<Player, int>): Returns the next target chosen."""
+        target = self._target = targets[self._next()]
+        return target
+
+
+class GameRecord:
+    """
+    One game of a replay log, decoded only when it is replayed.
+    """
+
+    def __init__(self, reader, data):
+        """
+        Parameters:
+            reader (ReplayReader): The log the game was read from.
+            data (bytes): The record of the game.
+        """
+        self._reader = reader
+        self._data = data
+
+    def get_size(self):
+        """(int): Returns the size of the record in bytes."""
+        return len(self._data)
+
+    def new_game(self):
+        """
+        Deal the game as it was at its start.
+
+        Returns:
+            (tuple<TrackedGame, ReplayPolicy>): The game and a policy replaying
+                                                its moves.
+        """
+        data = self._data
+        make_card = self._reader.make_card
+        players, position = read_varint(data, 0)
+        hand_size, position = read_varint(data, position)
+        sharing, position = read_varint(data, position)
+        amount, position = read_varint(data, position)
+        card_ids = []
+        for _ in range(amount):
+            card_id, position = read_varint(data, position)
+            card_ids.append(card_id)
+
+        if sharing == DISTINCT:
+            cards = [make_card(card_id) for card_id in card_ids]
+        else:
+            cards = []
+            instances = {}
+            for card_id in card_ids:
+                number = 0
+                if sharing == INSTANCES:
+                    number, position = read_varint(data, position)
+                made = instances.setdefault(card_id, [])
+                if number == len(made):
+                    made.append(make_card(card_id))
+                cards.append(made[number])
+
+        pickup_pile = Deck(cards)
+        players = [Player(f"Player {seat + 1}") for seat in range(players)]
+        pickup_pile.deal(players, hand_size)
+        game = TrackedGame(pickup_pile, SleepingCoders(self._reader.get_coders()), players)
+        return game, ReplayPolicy(data, position, len(data))
+
+    def replay(self):
+        """
+        Replay the game one turn at a time.
+
+        Yields:
+            (TrackedGame): The game at its start and after every turn, the same
+                           object each time.
+        """
+        game, policy = self.new_game()
+        yield game
+        while policy.has_moves():
+            Simulator.play_turn(game, policy, None)
+            yield game
+
+    def final(self):
+        """(TrackedGame): Returns the game as it was when it ended."""
+        game, policy = self.new_game()
+        while policy.has_moves():
+            Simulator.play_turn(game, policy, None)
+        game.is_over()
+        return game
+
+
+class ReplayReader:
+    """
+    Reads the games of a replay log.
+    """
+
+    def __init__(self, data):
+        """
+        Parse the header of a log.
+
+        Parameters:
+            data (bytes): The contents of the log, any object supporting the
+                          buffer protocol such as a memoryview.
+        """
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a replay log")
+        self._keys = []
+        self._coders = []
+        try:
+            self._start = self._read_header(data)
+        except IndexError:
+            raise ValueError("truncated replay log header") from None
+        self._data = data
+        self._view = memoryview(data)
+
+    def _read_header(self, data):
+        """(int): Reads the version, cards and coders of a log, returning the position after them."""
+        if data[len(MAGIC)] != VERSION:
+            raise ValueError(f"unsupported replay log version {data[len(MAGIC)]}")
+        position = len(MAGIC) + 1
+
+        amount, position = read_varint(data, position)
+        for _ in range(amount):
+            name, position = _read_text(data, position)
+            card_class = getattr(a2, name, None)
+            if not isinstance(card_class, type) or not issubclass(card_class, a2.Card):
+                raise ValueError(f"{name!r} is not a class of card")
+            kind = data[position]
+            position += 1
+            if kind == INT_ARGUMENT:
+                argument, position = read_varint(data, position)
+                self._keys.append((card_class, argument))
+            elif kind == STR_ARGUMENT:
+                argument, position = _read_text(data, position)
+                self._keys.append((card_class, argument))
+            else:
+                self._keys.append((card_class,))
+
+        amount, position = read_varint(data, position)
+        for _ in range(amount):
+            card_id, position = read_varint(data, position)
+            self._coders.append(None if card_id == 0 else self.make_card(card_id - 1))
+        return position
+
+    @classmethod
+    def open(cls, path):
+        """(ReplayReader): Returns a reader of the log at path."""
+        with open(path, 'rb') as file:
+            return cls(file.read())
+
+    def get_cards(self):
+        """(list<tuple>): Returns the key of each card id of the log."""
+        return self._keys
+
+    def get_coders(self):
+        """(list<Card>): Returns the sleeping coders every game starts with."""
+        return self._coders
+
+    def make_card(self, card_id):
+        """(Card): Returns a new card with the given id."""
+        return _make_card(self._keys[card_id])
+
+    def __iter__(self):
+        """
+        Yields:
+            (GameRecord): Each game of the log, in the order written.
+        """
+        data = self._data
+        position = self._start
+        while position < len(data):
+            record, position = self.record_at(position)
+            yield record
+
+    def record_at(self, position):
+        """
+        Read the game whose record starts at a position, without copying it.
+
+        Parameters:
+            position (int): The position of the length of the record.
+
+        Returns:
+            (tuple<GameRecord, int>): The game and the position after it.
+        """
+        length, position = read_varint(self._data, position)
+        end = position + length
+        return GameRecord(self, self._view[position:end]), end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record simulated games of Sleeping Coders")
+    parser.add_argument("path", nargs="?", help="The file to write the log to")
+    parser.add_argument("-n", "--games", type=int, default=10000,
+                        help="The amount of games to simulate")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="The seed of the batch")
+    parser.add_argument("-p", "--policies", nargs="+", default=["random", "random"],
+                        choices=sorted(POLICIES), help="The policy of each seat")
+    parser.add_argument("--interned", action="store_true",
+                        help="Share a single instance between identical cards")
+    args = parser.parse_args()
+
+    policies = [POLICIES[name]() for name in args.policies]
+    # best of a few runs, the overhead is within the noise of a single one
+    plain = recorded = float('inf')
+    for _ in range(REPEATS):
+        plain = min(plain, Simulator(policies, interned=args.interned).run(args.games, seed=args.seed).get_elapsed())
+        stream = io.BytesIO()
+        simulator = Simulator(policies, interned=args.interned,
+                              recorder=ReplayWriter(stream))
+        recorded = min(recorded, simulator.run(args.games, seed=args.seed).get_elapsed())
+    data = stream.getvalue()
+    if args.path is not None:
+        with open(args.path, 'wb') as file:
+            file.write(data)
+
+    start = timer()
+    for record in ReplayReader(data):
+        record.final()
+    replayed = timer() - start
+
+    print(f"{len(data)} bytes, {len(data) / args.games:.1f} bytes per game")
+    print(f"Recording overhead: {recorded / plain - 1:+.1%}")
+    print(f"Replayed in {replayed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Headless Sleeping Coders simulator
+
+Plays complete games of Sleeping Coders using the card, deck and player
+classes from a2.py without a graphical interface (tkinter is never imported).
+Moves are chosen by pluggable policies, one per seat.
+"""
+
+import argparse
+import random
+
+from collections import namedtuple
+from timeit import default_timer as timer
+
+from a2 import CardPool, Deck, DeckTemplate, Player, SleepingCoders
+from a2_support import CODERS, FULL_DECK, CodersGame, build_deck
+from gamestate import get_turn_state, set_turn_state
+from moves import (NO_ACTION, PICKUP_CODER, PRIORITY, SLEEP_CODER, STEAL_CODER, WIN_CODERS, MoveGenerator,
+                   find_targets)
+
+HAND_SIZE = 5
+
+# Constants of the splitmix64 generator
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+_MASK = (1 << 64) - 1
+
+GameResult = namedtuple('GameResult', ['seed', 'winner', 'turns', 'coders'])
+
+GameSnapshot = namedtuple('GameSnapshot', [
+    'pickup_pile',
+    'putdown_pile',
+    'hands',
+    'coders',
+    'sleeping_coders',
+    'location',
+    'direction',
+    'action',
+    'winner',
+    'is_over'
+])
+
+
+def split_seed(seed, index):
+    """
+    Derive the seed of one game of a batch from the seed of the batch.
+
+    The seed is the index-th output of a splitmix64 generator started from
+    the batch seed, so every game gets an unrelated stream which depends only
+    on its position in the batch, not on the order the games are played in.
+
+    Parameters:
+        seed (int): The seed of the batch.
+        index (int): The position of the game in the batch.
+
+    Returns:
+        (int): The 64-bit seed of the game.
+    """
+    z = (seed + (index + 1) * _GOLDEN_GAMMA) & _MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return z ^ (z >> 31)
+
+
+class Policy:
+    """
+    Abstract strategy for choosing moves on behalf of a player.
+    """
+
+    def choose_card(self, game, player, rng):
+        """
+        Choose a card from the player's hand to play.
+
+        Parameters:
+            game (CodersGame): The current game of Sleeping Coders.
+            player (Player): The player whose turn it is.
+            rng (random.Random): The random number generator for this game.
+
+        Returns:
+            (int): The slot of the chosen card in the player's hand.
+        """
+        raise NotImplementedError
+
+    def choose_target(self, game, player, targets, rng):
+        """
+        Choose the target of the action of the card which was just played.
+
+        Parameters:
+            game (CodersGame): The current game of Sleeping Coders.
+            player (Player): The player whose turn it is.
+            targets (list<tuple<Player, int>>): The possible targets as pairs
+                of the player to pass to Card.action and the selected slot.
+            rng (random.Random): The random number generator for this game.
+
+        Returns:
+            (tuple<Player, int>): One of the given targets.
+        """
+        raise NotImplementedError
+
+
+class FirstPolicy(Policy):
+    """
+    Always plays the first card in hand and picks the first target.
+    """
+
+    def choose_card(self, game, player, rng):
+        return 0
+
+    def choose_target(self, game, player, targets, rng):
+        return targets[0]
+
+
+class RandomPolicy(Policy):
+    """
+    Plays a uniformly random card and picks a uniformly random target.
+    """
+
+    def choose_card(self, game, player, rng):
+        return int(rng.random() * player.get_hand().get_amount())
+
+    def choose_target(self, game, player, targets, rng):
+        return targets[int(rng.random() * len(targets))]
+
+
+class GreedyPolicy(Policy):
+    """
+    Prefers cards whose action can currently be used, ranked by how much
+    they swing the coder count, falling back to a random card.
+    """
+
+    def choose_card(self, game, player, rng):
+        best_slot, best_priority = None, 0
+        for slot, card in enumerate(player.get_hand().get_cards()):
+            priority = PRIORITY.get(card.PLAY_ACTION, 0)
+            if priority > best_priority and find_targets(game, player, card.PLAY_ACTION):
+                best_slot, best_priority = slot, priority
+
+        if best_slot is None:
+            return int(rng.random() * player.get_hand().get_amount())
+        return best_slot
+
+    def choose_target(self, game, player, targets, rng):
+        if game.get_action() == PICKUP_CODER:
+            return targets[0]
+        # take from whoever is closest to winning
+        return max(targets, key=lambda target: target[0].get_coders().get_amount())
+
+
+POLICIES = {
+    'first': FirstPolicy,
+    'random': RandomPolicy,
+    'greedy': GreedyPolicy,
+}
+
+
+def snapshot_game(game):
+    """
+    Capture the state of a game so it can be restored later.
+
+    Every deck is captured with Deck.snapshot, so the cost is proportional to
+    the amount of decks and sleeping coder slots rather than cards.
+
+    Parameters:
+        game (CodersGame): The game to capture.
+
+    Returns:
+        (GameSnapshot): The captured state.
+    """
+    location, direction = get_turn_state(game)
+    return GameSnapshot(
+        pickup_pile=game.get_pickup_pile().snapshot(),
+        putdown_pile=game.putdown_pile.snapshot(),
+        hands=[player.get_hand().snapshot() for player in game.players],
+        coders=[player.get_coders().snapshot() for player in game.players],
+        sleeping_coders=game.get_sleeping_coders()[:],
+        location=location,
+        direction=direction,
+        action=game.get_action(),
+        winner=game.winner,
+        is_over=game._is_over
+    )
+
+
+def restore_game(game, snapshot):
+    """
+    Return a game to a captured state, keeping the same Deck and Player
+    instances so existing references to them remain valid.
+
+    Parameters:
+        game (CodersGame): The game to restore, the one which was captured.
+        snapshot (GameSnapshot): The state to restore.
+    """
+    game.get_pickup_pile().restore(snapshot.pickup_pile)
+    game.putdown_pile.restore(snapshot.putdown_pile)
+    for player, hand, coders in zip(game.players, snapshot.hands, snapshot.coders):
+        player.get_hand().restore(hand)
+        player.get_coders().restore(coders)
+    game.get_sleeping_coders()[:] = snapshot.sleeping_coders
+
+    set_turn_state(game, snapshot.location, snapshot.direction)
+    game.set_action(snapshot.action)
+    game.winner = snapshot.winner
+    game._is_over = snapshot.is_over
+
+
+class WinTracker:
+    """
+    Keeps track of which players have won by listening to their coder
+    collections, so no player needs to be checked after every turn.
+    """
+
+    def __init__(self, players, threshold=WIN_CODERS):
+        """
+        Start tracking the coders collected by players.
+
+        Parameters:
+            players (list<Player>): The players of a game, in seat order.
+            threshold (int): The amount of coders a player wins with.
+        """
+        self._players = players
+        self._threshold = threshold
+        self._seats = {}
+        self._counts = []
+        self._winning = set()
+        for seat, player in enumerate(players):
+            deck = player.get_coders()
+            self._seats[deck] = seat
+            self._counts.append(deck.get_amount())
+            if deck.get_amount() >= threshold:
+                self._winning.add(seat)
+            deck.add_listener(self)
+
+    def detach(self):
+        """Stop tracking the players."""
+        for player in self._players:
+            player.get_coders().remove_listener(self)
+
+    def has_winner(self):
+        """(bool): True iff any player has enough coders to win."""
+        return bool(self._winning)
+
+    def get_winner(self):
+        """
+        (Player): Returns the last player in seat order with enough coders to
+                  win, as CodersGame.is_over picks, None if there is none.
+        """
+        if not self._winning:
+            return None
+        return self._players[max(self._winning)]
+
+    def card_added(self, deck, slot, card):
+        """Count a coder collected."""
+        seat = self._seats[deck]
+        count = self._counts[seat] = self._counts[seat] + 1
+        if count == self._threshold:
+            self._winning.add(seat)
+
+    def card_removed(self, deck, slot, card):
+        """Count a coder lost."""
+        seat = self._seats[deck]
+        count = self._counts[seat] = self._counts[seat] - 1
+        if count == self._threshold - 1:
+            self._winning.discard(seat)
+
+
+class TrackedGame(CodersGame):
+    """
+    A CodersGame which tracks winning players as coders are collected, so
+    is_over does not check every player.
+    """
+
+    def __init__(self, deck, coders, players):
+        """
+        Construct a game of Sleeping Coders, as CodersGame.
+
+        Parameters:
+            deck (Deck): The pile of cards to pickup from.
+            coders (List<Card>): The list of sleeping coder cards.
+            players (list<Player>): The players in this game.
+        """
+        super().__init__(deck, coders, players)
+        self._wins = WinTracker(players)
+
+    def get_win_tracker(self):
+        """(WinTracker): Returns the tracker of the players' coders."""
+        return self._wins
+
+    def is_over(self):
+        """
+        (bool): True iff the game has been won. Assigns the winner variable.
+        """
+        if self.get_pickup_pile().get_amount() == 0:
+            return True
+
+        winner = self._wins.get_winner()
+        if winner is not None:
+            self.winner = winner
+            self._is_over = True
+        return self._is_over
+
+
+class SimulationReport:
+    """
+    The results of a batch of simulated games and the throughput achieved.
+    """
+
+    def __init__(self, results=None, elapsed=0.0):
+        """
+        Construct a report from the results of simulated games.
+
+        Parameters:
+            results (list<GameResult>): The result of each game played.
+            elapsed (float): The wall time in seconds taken to play the games.
+        """
+        if results is None:
+            results = []
+        self._results = results
+        self._elapsed = elapsed
+
+    def get_results(self):
+        """(list<GameResult>): Returns the result of each game played."""
+        return self._results
+
+    def get_elapsed(self):
+        """(float): Returns the wall time in seconds taken to play the games."""
+        return self._elapsed
+
+    def get_games(self):
+        """(int): Returns the amount of games played."""
+        return len(self._results)
+
+    def get_turns(self):
+        """(int): Returns the total amount of turns over all games."""
+        return sum(result.turns for result in self._results)
+
+    def games_per_sec(self):
+        """(float): Returns the amount of games simulated per second."""
+        return self.get_games() / self._elapsed if self._elapsed else 0.0
+
+    def turns_per_sec(self):
+        """(float): Returns the amount of turns simulated per second."""
+        return self.get_turns() / self._elapsed if self._elapsed else 0.0
+
+    def wins(self):
+        """(list<int>): Returns the amount of games won by each seat."""
+        wins = []
+        for result in self._results:
+            if result.winner is None:
+                continue
+            while len(wins) <= result.winner:
+                wins.append(0)
+            wins[result.winner] += 1
+        return wins
+
+    def __str__(self):
+        return (f"{self.get_games()} games, {self.get_turns()} turns in "
+                f"{self._elapsed:.3f} seconds ({self.games_per_sec():.0f} games/sec, "
+                f"{self.turns_per_sec():.0f} turns/sec)")
+
+    def __repr__(self):
+        return str(self)
+
+
+class Simulator:
+    """
+    Plays complete games of Sleeping Coders with a policy for each seat.
+    """
+
+    def __init__(self, policies, deck_copies=0, hand_size=HAND_SIZE, interned=False, indexed=False,
+                 recorder=None):
+        """
+        Construct a simulator for games between the given policies.
+
+        Parameters:
+            policies (list<Policy>): The policy controlling each seat, in
+                                     turn order.
+            deck_copies (int): The amount of times the full deck is doubled
+                               when building the pickup pile.
+            hand_size (int): The amount of cards dealt to each player.
+            interned (bool): If True identical cards in every game share a
+                             single flyweight instance.
+            indexed (bool): If True the targets of actions are listed by a
+                            MoveGenerator, which pays off once games have
+                            many sleeping coder slots or collected coders.
+            recorder (replay.ReplayWriter): Records every game played if given.
+        """
+        self._policies = policies
+        self._deck_copies = deck_copies
+        self._hand_size = hand_size
+        cards = build_deck(FULL_DECK)
+        if interned:
+            cards = CardPool().intern_all(cards)
+        self._template = DeckTemplate(cards)
+        self._interned = interned
+        self._indexed = indexed
+        self._recorder = recorder
+
+    def new_game(self, rng):
+        """
+        Deal a new game of Sleeping Coders.
+
+        Parameters:
+            rng (random.Random): Shuffles the pickup pile, which keeps using it
+                                 for any later shuffle.
+
+        Returns:
+            (CodersGame): The freshly dealt game.
+        """
+        if self._interned:
+            cards = self._template.shared_cards()
+        else:
+            cards = self._template.new_cards()
+        if self._recorder is not None:
+            self._recorder.stamp_game(cards, self._template)
+        pickup_pile = Deck(cards)
+        for _ in range(self._deck_copies):
+            pickup_pile.copy(pickup_pile)
+        pickup_pile.set_rng(rng)
+        pickup_pile.shuffle()
+        if self._recorder is not None:
+            self._recorder.begin_game(pickup_pile.get_cards(), len(self._policies),
+                                      self._hand_size)
+
+        players = [Player(f"Player {seat + 1}") for seat in range(len(self._policies))]
+        pickup_pile.deal(players, self._hand_size)
+
+        return TrackedGame(pickup_pile, SleepingCoders(CODERS), players)
+
+    def play_game(self, seed=None):
+        """
+        Play a single game to completion.
+
+        Parameters:
+            seed (int): Seeds the random number generator used for the game.
+
+        Returns:
+            (GameResult): The outcome of the game.
+        """
+        rng = random.Random(seed)
+        game = self.new_game(rng)
+        players = game.players
+        policies = dict(zip(players, self._policies))
+        moves = MoveGenerator(game) if self._indexed else None
+        log = self._recorder.get_moves() if self._recorder is not None else None
+
+        turns = 0
+        while not game.is_over():
+            self.play_turn(game, policies[game.current_player()], rng, moves, log)
+            turns += 1
+        if log is not None:
+            self._recorder.end_game()
+
+        winner = players.index(game.winner) if game.winner is not None else None
+        coders = tuple(player.get_coders().get_amount() for player in players)
+        return GameResult(seed, winner, turns, coders)
+
+    @staticmethod
+    def play_turn(game, policy, rng, moves=None, log=None):
+        """
+        Play one card for the current player and resolve its action.
+
+        Parameters:
+            game (CodersGame): The game to advance.
+            policy (Policy): Chooses the move for the current player.
+            rng (random.Random): The random number generator for the game.
+            moves (MoveGenerator): Lists the targets of the action if given,
+                                   otherwise they are found by find_targets.
+            log (list<int>): If given the slot of the card played is appended,
+                             then the index of the target in the targets if
+                             the action had any.
+        """
+        player = game.current_player()
+        slot = policy.choose_card(game, player, rng)
+        if log is not None:
+            log.append(slot)
+        card = player.get_hand().get_card(slot)
+        game.select_card(player, card)
+
+        action = game.get_action()
+        if action == NO_ACTION:
+            return
+
+        if moves is not None:
+            targets = moves.targets(player, action)
+        else:
+            targets = find_targets(game, player, action)
+        if targets:
+            target = policy.choose_target(game, player, targets, rng)
+            if log is not None:
+                log.append(targets.index(target))
+            owner, slot = target
+            card.action(owner, game, slot)
+        else:
+            # nothing to act on, the turn passes
+            game.set_action(NO_ACTION)
+            game.next_player()
+
+    def run(self, games, seed=0):
+        """
+        Play a batch of games, seeding game k with split_seed(seed, k).
+
+        Parameters:
+            games (int): The amount of games to play.
+            seed (int): The seed of the batch.
+
+        Returns:
+            (SimulationReport): The results of every game and the throughput.
+        """
+        start = timer()
+        results = [self.play_game(split_seed(seed, k)) for k in range(games)]
+        return SimulationReport(results, timer() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate games of Sleeping Coders")
+    parser.add_argument("-n", "--games", type=int, default=10000,
+                        help="The amount of games to simulate")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="The seed of the batch")
+    parser.add_argument("-p", "--policies", nargs="+", default=["random", "random"],
+                        choices=sorted(POLICIES), help="The policy of each seat")
+    parser.add_argument("--deck-copies", type=int, default=0,
+                        help="The amount of times the full deck is doubled")
+    parser.add_argument("--interned", action="store_true",
+                        help="Share a single instance between identical cards")
+    parser.add_argument("--indexed", action="store_true",
+                        help="List the targets of actions from incrementally kept indexes")
+    args = parser.parse_args()
+
+    simulator = Simulator([POLICIES[name]() for name in args.policies],
+                          deck_copies=args.deck_copies, interned=args.interned,
+                          indexed=args.indexed)
+    report = simulator.run(args.games, seed=args.seed)
+    print(report)
+    print(f"Wins by seat: {report.wins()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -955,6 +955,311 @@ class TestPlayAndAction(TestA2):
         self.assertEqual(state.current_player_coders, new_state.prev_player_coders)
 
 
+@skipIfFailed(TestDesign, TestDesign.test_classes_defined.__name__, 'Player')
+@skipIfFailed(TestDesign, TestDesign.test_classes_defined.__name__, 'Deck')
+class TestFlyweights(TestA2):
+    def test_slots(self):
+        """ test cards do not have an instance dictionary """
+        for card in (self.a2.Card(), self.a2.NumberCard(1), self.a2.CoderCard("steven"),
+                     self.a2.TutorCard("steven"), self.a2.KeyboardKidnapperCard(),
+                     self.a2.AllNighterCard()):
+            self.assertFalse(hasattr(card, '__dict__'), msg=f"{card} should use __slots__")
+
+    def test_get_key(self):
+        """ test Card.get_key """
+        self.assertEqual(self.a2.NumberCard(3).get_key(), self.a2.NumberCard(3).get_key())
+        self.assertNotEqual(self.a2.NumberCard(3).get_key(), self.a2.NumberCard(4).get_key())
+        self.assertNotEqual(self.a2.CoderCard("steven").get_key(),
+                            self.a2.TutorCard("steven").get_key())
+        self.assertEqual(self.a2.AllNighterCard().get_key(), self.a2.AllNighterCard().get_key())
+
+    def test_pool(self):
+        """ test CardPool shares identical cards """
+        pool = self.a2.CardPool()
+        card = pool.get(self.a2.NumberCard, 3)
+        self.assertIs(pool.intern(self.a2.NumberCard(3)), card)
+        self.assertIsNot(pool.get(self.a2.NumberCard, 4), card)
+        self.assertIs(pool.get(self.a2.AllNighterCard), pool.intern(self.a2.AllNighterCard()))
+
+        cards = pool.intern_all([self.a2.TutorCard("brae"), self.a2.TutorCard("brae")])
+        self.assertIs(cards[0], cards[1])
+        self.assertEqual(pool.get_amount(), 4)
+
+    def test_play_duplicate(self):
+        """ test playing a flyweight removes exactly one card from the hand """
+        if self.a2_support is None:
+            self.skipTest("Failed to import 'a2_support.py'")
+
+        pool = self.a2.CardPool()
+        card = pool.get(self.a2.NumberCard, 1)
+        player = self.a2.Player("steven")
+        player.get_hand().add_cards([card, pool.get(self.a2.NumberCard, 2), card, card])
+        pickup_pile = self.a2.Deck([pool.get(self.a2.NumberCard, 5)])
+        game = self.a2_support.CodersGame(pickup_pile, [], [player])
+
+        card.play(player, game)
+        self.assertEqual(player.get_hand().get_amount(), 4)
+        self.assertEqual(player.get_hand().get_cards().count(card), 2)
+
+    def test_template(self):
+        """ test DeckTemplate stamps out copies of its cards """
+        a2 = self.a2
+        cards = [a2.NumberCard(1), a2.TutorCard("brae"), a2.NumberCard(1),
+                 a2.AllNighterCard(), a2.CoderCard("anna")]
+        template = a2.DeckTemplate(cards)
+        self.assertEqual(template.get_amount(), 5)
+        self.assertEqual(template.get_ids(), [0, 1, 0, 2, 3])
+
+        new_cards = template.new_cards()
+        self.assertEqual([card.get_key() for card in new_cards], [card.get_key() for card in cards])
+        self.assertEqual(len({id(card) for card in new_cards + cards}), 10)
+        self.assertEqual(str(new_cards), str(cards))
+
+        shared = template.shared_cards()
+        self.assertIs(shared[0], shared[2])
+        self.assertIs(shared[1], template.get_prototypes()[1])
+
+        first = template.new_deck(random.Random(3))
+        second = template.new_deck(random.Random(3))
+        self.assertEqual(str(first), str(second))
+        self.assertEqual(template.new_deck().get_amount(), 5)
+
+
+@skipIfFailed(TestDesign, TestDesign.test_classes_defined.__name__, 'Deck')
+class TestDeckFastPaths(TestA2):
+    def setUp(self):
+        self._cards = [self.a2.NumberCard(i) for i in range(6)]
+
+    def test_remove_instance(self):
+        """ test Deck.remove_instance """
+        deck = self.a2.Deck(self._cards[:])
+        self.assertIsNone(deck.remove_instance(self._cards[2]), msg="Deck.remove_instance should not return")
+        self.assertEqual(deck.get_cards(), self._cards[:2] + self._cards[3:])
+
+        card = self._cards[0]
+        deck = self.a2.Deck([card, self._cards[1], card])
+        deck.remove_instance(card)
+        self.assertEqual(deck.get_cards(), [self._cards[1], card])
+
+    def test_tracked_remove_instance(self):
+        """ test Deck.remove_instance while tracking positions """
+        c0, c1, c2, c3, c4, c5 = self._cards
+        deck = self.a2.Deck([c0, c1, c2, c1, c3])
+        deck.track_positions()
+
+        deck.remove_instance(c0)
+        self.assertEqual(deck.get_cards(), [c3, c1, c2, c1])
+        deck.remove_instance(c1)
+        self.assertListSimilar(deck.get_cards(), [c3, c2, c1])
+
+        deck.add_cards([c4, c5])
+        deck.remove_card(0)
+        self.assertListSimilar(deck.get_cards(), [c2, c1, c4, c5])
+        top = deck.get_cards()[::-1][:2]
+        self.assertEqual(deck.pick(2), top)
+        deck.add_card(c0)
+        self.assertIs(deck.top(), c0)
+
+        for card in deck.get_cards()[:]:
+            deck.remove_instance(card)
+        self.assertEqual(deck.get_amount(), 0)
+
+    def test_tracked_matches_untracked(self):
+        """ test tracked and untracked decks remove the same cards """
+        c0, c1, c2 = self._cards[:3]
+        untracked = self.a2.Deck([c0, c1, c0, c2, c0])
+        tracked = self.a2.Deck(untracked.get_cards()[:])
+        tracked.track_positions()
+
+        untracked.remove_instance(c0)
+        tracked.remove_instance(c0)
+        self.assertCountEqual(tracked.get_cards(), [c0, c1, c0, c2])
+        self.assertEqual(untracked.get_cards(), [c1, c0, c2, c0])
+        with self.assertRaises(ValueError):
+            tracked.remove_instance(self._cards[3])
+
+        tracked = self.a2.Deck([c0, c1, c0, c2])
+        tracked.track_positions()
+        tracked.remove_card(-1)
+        self.assertEqual(tracked.get_cards(), [c0, c1, c0])
+        tracked.remove_card(-3)
+        self.assertEqual(tracked.get_cards(), [c0, c1])
+        with self.assertRaises(IndexError):
+            tracked.remove_card(-3)
+
+    def test_pick_bulk(self):
+        """ test Deck.pick takes many cards at once """
+        deck = self.a2.Deck(self._cards[:])
+        self.assertEqual(deck.pick(4), self._cards[:1:-1])
+        self.assertEqual(deck.get_cards(), self._cards[:2])
+        self.assertEqual(deck.pick(0), [])
+        with self.assertRaises(IndexError):
+            deck.pick(3)
+
+    def test_deal(self):
+        """ test Deck.deal gives each player the cards they would have picked """
+        players = [self.a2.Player(f"Player {i}") for i in range(2)]
+        deck = self.a2.Deck(self._cards[:])
+        self.assertIsNone(deck.deal(players, 3), msg="Deck.deal should not return")
+        self.assertEqual(players[0].get_hand().get_cards(), self._cards[:2:-1])
+        self.assertEqual(players[1].get_hand().get_cards(), self._cards[2::-1])
+        self.assertEqual(deck.get_amount(), 0)
+
+    def test_snapshot(self):
+        """ test Deck.snapshot is unaffected by later changes and vice versa """
+        deck = self.a2.Deck(self._cards[:])
+        snapshot = deck.snapshot()
+        self.assertEqual(snapshot.get_cards(), self._cards)
+
+        deck.pick(2)
+        self.assertEqual(snapshot.get_cards(), self._cards)
+        self.assertEqual(deck.get_cards(), self._cards[:4])
+
+        again = snapshot.snapshot()
+        again.add_card(self._cards[0])
+        self.assertEqual(snapshot.get_cards(), self._cards)
+        self.assertEqual(again.get_cards(), self._cards + self._cards[:1])
+
+    def test_restore(self):
+        """ test Deck.restore can be repeated from the same snapshot """
+        deck = self.a2.Deck(self._cards[:])
+        snapshot = deck.snapshot()
+        for _ in range(2):
+            deck.remove_card(0)
+            deck.add_card(self._cards[3])
+            deck.restore(snapshot)
+            self.assertEqual(deck.get_cards(), self._cards)
+
+    def test_listener(self):
+        """ test Deck listeners are told of every change """
+        c0, c1, c2, c3, c4, c5 = self._cards
+
+        class Mirror:
+            def __init__(self, cards):
+                self.cards = cards[:]
+
+            def card_added(self, deck, slot, card):
+                self.cards.insert(slot, card)
+
+            def card_removed(self, deck, slot, card):
+                self.assertIs(self.cards.pop(slot), card)
+
+        Mirror.assertIs = self.assertIs
+        for tracked in (False, True):
+            deck = self.a2.Deck([c0, c1, c2, c1])
+            if tracked:
+                deck.track_positions()
+            mirror = Mirror(deck.get_cards())
+            deck.add_listener(mirror)
+
+            deck.remove_instance(c0)
+            deck.add_cards([c3, c4])
+            deck.remove_card(1)
+            deck.insert_card(0, c5)
+            deck.pick(2)
+            deck.add_card(c2)
+            deck.shuffle()
+            deck.restore(self.a2.Deck([c4, c3]))
+            self.assertEqual(mirror.cards, deck.get_cards())
+
+            deck.remove_listener(mirror)
+            deck.add_card(c0)
+            self.assertEqual(len(mirror.cards), deck.get_amount() - 1)
+
+    def test_set_rng(self):
+        """ test Deck.shuffle uses the generator given to Deck.set_rng """
+        decks = []
+        for _ in range(2):
+            deck = self.a2.Deck(self._cards[:])
+            deck.set_rng(random.Random(4))
+            random.seed(len(decks))
+            deck.shuffle()
+            decks.append(deck.get_cards())
+        self.assertEqual(decks[0], decks[1])
+        self.assertListSimilar(decks[0], self._cards)
+
+    def test_copy_shares(self):
+        """ test Deck.copy into an empty deck keeps the decks independent """
+        source = self.a2.Deck(self._cards[:])
+        deck = self.a2.Deck()
+        deck.copy(source)
+        source.remove_card(0)
+        self.assertEqual(deck.get_cards(), self._cards)
+        deck.copy(deck)
+        self.assertEqual(deck.get_cards(), self._cards * 2)
+        self.assertEqual(source.get_cards(), self._cards[1:])
+
+
+@skipIfFailed(TestDesign, TestDesign.test_classes_defined.__name__, 'CoderCard')
+@skipIfFailed(TestDesign, TestDesign.test_classes_defined.__name__, 'Player')
+class TestSleepingCoders(TestA2):
+    def setUp(self):
+        self._coders = [self.a2.CoderCard(f"coder {i}") for i in range(6)]
+
+    def test_first_free_slot(self):
+        """ test SleepingCoders.first_free_slot finds the lowest empty slot """
+        coders = self.a2.SleepingCoders(self._coders)
+        self.assertIsNone(coders.first_free_slot())
+        self.assertEqual(coders.get_occupied_amount(), 6)
+
+        coders[4] = None
+        coders[1] = None
+        coders[-1] = None
+        self.assertEqual(coders.first_free_slot(), 1)
+        self.assertEqual(coders.get_occupied_amount(), 3)
+        coders[1] = self._coders[1]
+        self.assertEqual(coders.first_free_slot(), 4)
+
+        coders[:] = [None] * 5 + self._coders[5:]
+        self.assertEqual(coders.first_free_slot(), 0)
+        self.assertEqual(coders.get_occupied_amount(), 1)
+        with self.assertRaises(ValueError):
+            coders[:] = []
+        self.assertEqual(len(coders), 6)
+
+    def test_refill(self):
+        """ test emptying and filling a slot many times keeps the heap small """
+        coders = self.a2.SleepingCoders([None] + self._coders[1:])
+        for _ in range(100):
+            coders[3] = None
+            coders[3] = self._coders[3]
+        self.assertLessEqual(len(coders._free), 2 * len(coders) + 1)
+        self.assertEqual(coders.first_free_slot(), 0)
+
+    def test_fixed_size(self):
+        """ test SleepingCoders keeps its heap in sync or refuses to change size """
+        coders = self.a2.SleepingCoders(self._coders[:3] + [None] * 3)
+        resizes = (lambda: coders.append(None), lambda: coders.extend([None]),
+                   lambda: coders.insert(0, None), coders.pop, lambda: coders.remove(None),
+                   coders.clear, lambda: coders.__delitem__(0),
+                   lambda: coders.__iadd__([None]), lambda: coders.__imul__(2))
+        for resize in resizes:
+            with self.assertRaises(ValueError):
+                resize()
+        self.assertEqual(len(coders), 6)
+        self.assertEqual(coders.first_free_slot(), 3)
+
+        coders.reverse()
+        self.assertEqual(coders.first_free_slot(), 0)
+        self.assertEqual(coders[3:], self._coders[2::-1])
+        coders.sort(key=lambda card: card is None)
+        self.assertEqual(coders.first_free_slot(), 3)
+        self.assertEqual(coders.get_occupied_amount(), 3)
+
+    def test_all_nighter(self):
+        """ test AllNighterCard fills the same slot with SleepingCoders as with a list """
+        if self.a2_support is None:
+            self.skipTest("Failed to import 'a2_support.py'")
+
+        for make in (list, self.a2.SleepingCoders):
+            coders = make(self._coders[:2] + [None, self._coders[3], None, None])
+            player = self.a2.Player("Player")
+            player.get_coders().add_card(self._coders[2])
+            game = self.a2_support.CodersGame(self.a2.Deck(), coders, [player])
+            self.a2.AllNighterCard().action(player, game, 0)
+            self.assertEqual(game.get_sleeping_coders(), self._coders[:4] + [None, None])
+
+
 def main():
     test_cases = [
         TestDesign,
@@ -966,7 +1271,10 @@ def main():
         TestAllNighterCard,
         TestDeck,
         TestPlayer,
-        TestPlayAndAction
+        TestPlayAndAction,
+        TestFlyweights,
+        TestDeckFastPaths,
+        TestSleepingCoders
     ]
 
     master = TestMaster(max_diff=None,
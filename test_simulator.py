@@ -0,0 +1,1134 @@
+#!/usr/bin/env python3
+
+import functools
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+import testrunner
+
+from testrunner import OrderedTestCase, TestCase, TestLoader, TestMaster, TestResult, find_recursion, skipIfFailed
+
+
+class TestSimulation(OrderedTestCase):
+    a2: ...
+    a2_support: ...
+    simulator: ...
+    parallel: ...
+    vectorized: ...
+    gamestate: ...
+    journal: ...
+    zobrist: ...
+    mcts: ...
+    endgame: ...
+    moves: ...
+    replay: ...
+    archive: ...
+    analytics: ...
+
+    def setUp(self):
+        if self.simulator is None:
+            self.skipTest("Failed to import 'simulator.py'")
+
+
+class TestSimulator(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        sim = self.simulator
+        self._simulator = sim.Simulator([sim.RandomPolicy(), sim.RandomPolicy()])
+
+    def test_no_tk(self):
+        """ test simulator does not import tkinter """
+        output = subprocess.run([sys.executable, '-c', "import sys, simulator; print('tkinter' in sys.modules)"],
+                                capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+    def test_game_completes(self):
+        """ test Simulator.play_game plays a game to completion """
+        result = self._simulator.play_game(7)
+        self.assertGreater(result.turns, 0)
+        self.assertEqual(len(result.coders), 2)
+        if result.winner is not None:
+            self.assertGreaterEqual(result.coders[result.winner], 4)
+
+    def test_reproducible(self):
+        """ test games with the same seed have the same outcome """
+        self.assertEqual(self._simulator.play_game(42), self._simulator.play_game(42))
+
+    @skipIfFailed(test_name=test_game_completes.__name__)
+    def test_run(self):
+        """ test Simulator.run reports every game """
+        report = self._simulator.run(20, seed=100)
+        self.assertEqual(report.get_games(), 20)
+        self.assertEqual([result.seed for result in report.get_results()],
+                         [self.simulator.split_seed(100, k) for k in range(20)])
+        self.assertEqual(report.get_turns(), sum(r.turns for r in report.get_results()))
+        self.assertGreater(report.turns_per_sec(), 0)
+
+    def test_split_seed(self):
+        """ test split_seed gives distinct 64-bit seeds depending only on the batch and position """
+        split_seed = self.simulator.split_seed
+        seeds = [split_seed(0, k) for k in range(1000)] + [split_seed(1, k) for k in range(1000)]
+        self.assertEqual(len(set(seeds)), len(seeds))
+        self.assertTrue(all(0 <= seed < 2 ** 64 for seed in seeds))
+        self.assertEqual(split_seed(7, 3), split_seed(7, 3))
+
+    def test_global_random_unused(self):
+        """ test games do not depend on the state of the random module """
+        random.seed(1)
+        first = self._simulator.run(5, seed=9).get_results()
+        random.seed(2)
+        self.assertEqual(self._simulator.run(5, seed=9).get_results(), first)
+
+    def test_coders_conserved(self):
+        """ test no coder is created or lost during a game """
+        sim = self.simulator
+        simulator = sim.Simulator([sim.GreedyPolicy(), sim.RandomPolicy(), sim.RandomPolicy()])
+        for seed in range(20):
+            result = simulator.play_game(seed)
+            self.assertLessEqual(sum(result.coders), len(self.a2_support.CODERS))
+
+    def test_win_tracker(self):
+        """ test TrackedGame.is_over agrees with CodersGame.is_over """
+        a2, sim = self.a2, self.simulator
+        coders = self.a2_support.CODERS
+        players = [a2.Player(f"Player {seat}") for seat in range(3)]
+        plain = self.a2_support.CodersGame(a2.Deck([a2.NumberCard(1)]), coders[:], players)
+        tracked = sim.TrackedGame(a2.Deck([a2.NumberCard(1)]), coders[:], players)
+        tracker = tracked.get_win_tracker()
+
+        def check():
+            self.assertEqual(tracked.is_over(), plain.is_over())
+            self.assertIs(tracked.winner, plain.winner)
+
+        players[2].get_coders().add_cards(coders[:4])
+        self.assertTrue(tracker.has_winner())
+        check()
+        players[0].get_coders().add_cards(coders[4:8])
+        check()
+        self.assertIs(tracker.get_winner(), players[2])
+        players[2].get_coders().remove_card(0)
+        self.assertIs(tracker.get_winner(), players[0])
+        check()
+        players[0].get_coders().pick()
+        self.assertFalse(tracker.has_winner())
+        check()
+
+    def test_snapshot_restore(self):
+        """ test restore_game returns a game to its snapshot """
+        sim = self.simulator
+        rng = random.Random(3)
+        game = self._simulator.new_game(rng)
+        policy = sim.RandomPolicy()
+        for _ in range(5):
+            self._simulator.play_turn(game, policy, rng)
+
+        before = (str(game.players), str(game.get_pickup_pile()), game.get_sleeping_coders()[:],
+                  game.current_player(), game.get_action())
+        snapshot = sim.snapshot_game(game)
+        for _ in range(2):
+            while not game.is_over():
+                self._simulator.play_turn(game, policy, rng)
+            sim.restore_game(game, snapshot)
+            after = (str(game.players), str(game.get_pickup_pile()), game.get_sleeping_coders()[:],
+                     game.current_player(), game.get_action())
+            self.assertEqual(after, before)
+
+
+class TestParallel(TestSimulation):
+    def setUp(self):
+        if self.parallel is None:
+            self.skipTest("Failed to import 'parallel.py'")
+
+    def test_split_batch(self):
+        """ test split_batch covers every game exactly once """
+        chunks = self.parallel.split_batch(10, 5, 4)
+        self.assertEqual(chunks, [(5, 3), (8, 3), (11, 2), (13, 2)])
+        self.assertEqual(self.parallel.split_batch(2, 0, 8), [(0, 1), (1, 1)])
+
+    def test_matches_serial(self):
+        """ test run_parallel gives the same results as Simulator.run """
+        sim = self.simulator
+        simulator = sim.Simulator([sim.RandomPolicy(), sim.GreedyPolicy()])
+        serial = simulator.run(12, seed=3)
+        parallel = self.parallel.run_parallel(simulator, 12, seed=3, workers=2)
+        self.assertEqual(parallel.get_results(), serial.get_results())
+
+
+class TestVectorized(TestSimulation):
+    def setUp(self):
+        if self.vectorized is None:
+            self.skipTest("Failed to import 'vectorized.py'")
+
+    def test_equivalence(self):
+        """ test vectorized engine matches the object engine """
+        self.assertEqual(self.vectorized.check_equivalence(50, players=2, seed=0), [])
+        self.assertEqual(self.vectorized.check_equivalence(20, players=4, seed=50, deck_copies=1), [])
+
+    def test_random_batch(self):
+        """ test a random batch plays every game to completion """
+        report = self.vectorized.run(200, players=3, seed=1)
+        self.assertEqual(report.get_games(), 200)
+        for result in report.get_results():
+            self.assertGreater(result.turns, 0)
+            if result.winner is not None:
+                self.assertGreaterEqual(result.coders[result.winner], 4)
+
+
+class TestGameState(TestSimulation):
+    def setUp(self):
+        if self.gamestate is None:
+            self.skipTest("Failed to import 'gamestate.py'")
+
+    @staticmethod
+    def _summary(game):
+        players = [(player.get_hand().get_cards(), player.get_coders().get_cards())
+                   for player in game.players]
+        return (players, game.get_pickup_pile().get_amount(), list(game.get_sleeping_coders()),
+                game.players.index(game.current_player()), game.get_action())
+
+    @staticmethod
+    def _state_summary(state):
+        players = [(player.hand.get_cards(), player.coders.get_cards()) for player in state.players]
+        return (players, state.pickup_pile.get_amount(), list(state.sleeping_coders),
+                state.turn, state.action)
+
+    def test_matches_coders_game(self):
+        """ test GameState moves match CodersGame moves """
+        sim = self.simulator
+        simulator = sim.Simulator([sim.RandomPolicy()] * 3)
+        for seed in range(10):
+            rng = random.Random(seed)
+            game = simulator.new_game(rng)
+            game.set_action(sim.NO_ACTION)
+            state = self.gamestate.GameState.from_game(game)
+
+            while not game.is_over():
+                self.assertIs(state.is_over(), False)
+                slot = rng.randrange(game.current_player().get_hand().get_amount())
+                player = game.current_player()
+                game.select_card(player, player.get_hand().get_card(slot))
+                state = state.play(slot)
+
+                targets = state.targets()
+                if state.action != sim.NO_ACTION:
+                    if targets:
+                        seat, target = rng.choice(targets)
+                        game.get_last_card().action(game.players[seat], game, target)
+                        state = state.act(seat, target)
+                    else:
+                        game.set_action(sim.NO_ACTION)
+                        game.next_player()
+                        state = state.skip_action()
+                self.assertEqual(self._state_summary(state), self._summary(game))
+
+            self.assertIs(state.is_over(), True)
+            winner = None if game.winner is None else game.players.index(game.winner)
+            self.assertEqual(state.winner(), winner)
+
+    def test_persistent(self):
+        """ test applying a move leaves the original state unchanged """
+        sim = self.simulator
+        game = sim.Simulator([sim.RandomPolicy()] * 2).new_game(random.Random(1))
+        game.set_action(sim.NO_ACTION)
+        state = self.gamestate.GameState.from_game(game)
+        before = self._state_summary(state)
+
+        branches = [state.play(slot) for slot in range(5)]
+        self.assertEqual(self._state_summary(state), before)
+        for branch in branches:
+            self.assertIs(branch.players[1], state.players[1])
+            self.assertEqual(branch.pickup_pile.get_amount(), state.pickup_pile.get_amount() - 1)
+
+    def test_persistent_deck(self):
+        """ test PersistentDeck operations """
+        cards = [self.a2.NumberCard(i) for i in range(5)]
+        deck = self.gamestate.PersistentDeck.from_cards(cards)
+        self.assertEqual(deck.get_cards(), cards)
+        self.assertIs(deck.get_card(1), cards[1])
+        self.assertIs(deck.top(), cards[4])
+
+        picked, rest = deck.pick(2)
+        self.assertEqual(picked, [cards[4], cards[3]])
+        self.assertEqual(rest.get_cards(), cards[:3])
+        self.assertEqual(deck.remove_card(1).get_cards(), cards[:1] + cards[2:])
+        self.assertEqual(deck.get_cards(), cards)
+        self.assertEqual(str(deck), str(self.a2.Deck(cards)))
+
+
+class TestJournal(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        if self.journal is None:
+            self.skipTest("Failed to import 'journal.py'")
+        sim = self.simulator
+        self._simulator = sim.Simulator([sim.RandomPolicy(), sim.GreedyPolicy()])
+
+    @staticmethod
+    def _summary(game):
+        return (str(game.players), str(game.get_pickup_pile()), str(game.putdown_pile),
+                game.get_sleeping_coders()[:], game.current_player(), game.get_action())
+
+    def test_undo_redo(self):
+        """ test Journal.undo and Journal.redo step through a whole game """
+        rng = random.Random(11)
+        game = self._simulator.new_game(rng)
+        policy = self.simulator.RandomPolicy()
+        journal = self.journal.Journal(game)
+
+        states = [self._summary(game)]
+        while not game.is_over():
+            journal.begin()
+            self._simulator.play_turn(game, policy, rng)
+            journal.commit()
+            states.append(self._summary(game))
+
+        for state in reversed(states[:-1]):
+            journal.undo()
+            self.assertEqual(self._summary(game), state)
+        self.assertFalse(journal.can_undo())
+        for state in states[1:]:
+            journal.redo()
+            self.assertEqual(self._summary(game), state)
+        self.assertFalse(journal.can_redo())
+
+    def test_rollback(self):
+        """ test Journal.rollback abandons the move being recorded """
+        rng = random.Random(5)
+        game = self._simulator.new_game(rng)
+        policy = self.simulator.GreedyPolicy()
+        journal = self.journal.Journal(game)
+
+        before = self._summary(game)
+        for _ in range(3):
+            journal.begin()
+            self._simulator.play_turn(game, policy, rng)
+            journal.rollback()
+            self.assertEqual(self._summary(game), before)
+        self.assertFalse(journal.can_undo())
+
+    def test_unrecorded_change(self):
+        """ test a change outside of a move forgets the journal's history """
+        rng = random.Random(2)
+        game = self._simulator.new_game(rng)
+        journal = self.journal.Journal(game)
+        journal.begin()
+        self._simulator.play_turn(game, self.simulator.FirstPolicy(), rng)
+        journal.commit()
+        self.assertTrue(journal.can_undo())
+
+        game.get_pickup_pile().pick()
+        self.assertFalse(journal.can_undo())
+        journal.detach()
+        with self.assertRaises(IndexError):
+            journal.undo()
+
+    def test_requires_sleeping_coders(self):
+        """ test a game with a plain list of sleeping coders is refused """
+        support = self.a2_support
+        game = support.CodersGame(self.a2.Deck(), support.CODERS[:], [self.a2.Player("a")])
+        with self.assertRaises(TypeError):
+            self.journal.Journal(game)
+
+
+class TestZobrist(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        if self.zobrist is None:
+            self.skipTest("Failed to import 'zobrist.py'")
+        sim = self.simulator
+        self._simulator = sim.Simulator([sim.RandomPolicy(), sim.GreedyPolicy(), sim.RandomPolicy()])
+
+    def test_incremental(self):
+        """ test ZobristHash matches the hash computed from scratch every turn """
+        for seed in range(5):
+            rng = random.Random(seed)
+            game = self._simulator.new_game(rng)
+            policy = self.simulator.RandomPolicy()
+            hashed = self.zobrist.ZobristHash(game)
+            while not game.is_over():
+                self._simulator.play_turn(game, policy, rng)
+                self.assertEqual(hashed.value(), self.zobrist.hash_game(game))
+            self.assertLess(hashed.value(), 2 ** 64)
+
+    def test_undo(self):
+        """ test undoing moves restores the hash """
+        rng = random.Random(8)
+        game = self._simulator.new_game(rng)
+        policy = self.simulator.RandomPolicy()
+        hashed = self.zobrist.ZobristHash(game)
+        journal = self.journal.Journal(game)
+
+        hashes = [hashed.value()]
+        for _ in range(20):
+            journal.begin()
+            self._simulator.play_turn(game, policy, rng)
+            journal.commit()
+            hashes.append(hashed.value())
+        self.assertEqual(len(set(hashes)), len(hashes))
+        for value in reversed(hashes[:-1]):
+            journal.undo()
+            self.assertEqual(hashed.value(), value)
+
+    def test_bulk_changes(self):
+        """ test the hash of the piles follows operations moving many cards """
+        game = self._simulator.new_game(random.Random(0))
+        hashed = self.zobrist.ZobristHash(game)
+        pile = game.get_pickup_pile()
+        game.putdown_pile.add_cards(pile.pick(3))
+        self.assertEqual(hashed.value(), self.zobrist.hash_game(game))
+
+        snapshot = pile.snapshot()
+        pile.pick(5)
+        pile.restore(snapshot)
+        self.assertEqual(hashed.value(), self.zobrist.hash_game(game))
+        game.putdown_pile.insert_card(1, pile.pick()[0])
+        self.assertEqual(hashed.value(), self.zobrist.hash_game(game))
+
+    def test_tracked_rejected(self):
+        """ test decks tracking positions can't be hashed """
+        game = self._simulator.new_game(random.Random(0))
+        game.get_pickup_pile().track_positions()
+        with self.assertRaises(ValueError):
+            self.zobrist.ZobristHash(game)
+
+    def test_equal_states(self):
+        """ test equal states hash alike whatever the card instances or hand order """
+        first = self._simulator.new_game(random.Random(4))
+        second = self._simulator.new_game(random.Random(4))
+        self.assertEqual(self.zobrist.hash_game(first), self.zobrist.hash_game(second))
+
+        hashed = self.zobrist.ZobristHash(second)
+        hand = second.players[0].get_hand()
+        hand.insert_card(0, hand.pick()[0])
+        self.assertEqual(hashed.value(), self.zobrist.hash_game(first))
+
+        second.players[0].get_coders().add_card(second.players[1].get_hand().pick()[0])
+        self.assertNotEqual(hashed.value(), self.zobrist.hash_game(first))
+        self.assertEqual(hashed.value(), self.zobrist.hash_game(second))
+
+
+class TestMCTS(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        if self.mcts is None:
+            self.skipTest("Failed to import 'mcts.py'")
+
+    def _state(self, seed=1):
+        sim = self.simulator
+        game = sim.Simulator([sim.RandomPolicy(), sim.RandomPolicy()]).new_game(random.Random(seed))
+        return self.gamestate.GameState.from_game(game)
+
+    def test_determinize(self):
+        """ test determinize only reshuffles the cards hidden from the player """
+        state = self._state()
+        sample = self.mcts.determinize(state, 0, random.Random(0))
+        self.assertEqual(sample.players[0], state.players[0])
+        self.assertEqual(sample.putdown_pile, state.putdown_pile)
+        self.assertEqual(sample.players[1].hand.get_amount(), state.players[1].hand.get_amount())
+
+        def hidden(state):
+            cards = state.pickup_pile.get_cards() + state.players[1].hand.get_cards()
+            return sorted(map(str, cards))
+        self.assertEqual(hidden(sample), hidden(state))
+
+    def test_legal_moves(self):
+        """ test legal_moves offers each distinct card and apply_move plays it """
+        state = self._state()
+        moves = self.mcts.legal_moves(state)
+        hand = state.current_player().hand.get_cards()
+        self.assertEqual(len(moves), len({card.get_key() for card in hand}))
+        for move in moves:
+            after = self.mcts.apply_move(state, move)
+            self.assertEqual(after.putdown_pile.top().get_key(), move[1])
+
+    def test_plays_game(self):
+        """ test an MCTSPolicy plays complete games """
+        sim = self.simulator
+        policy = self.mcts.MCTSPolicy(time_limit=1, iterations=20)
+        result = sim.Simulator([policy, sim.RandomPolicy()]).play_game(3)
+        self.assertGreater(result.turns, 0)
+        self.assertGreater(policy.get_total_stats().rollouts, 0)
+
+    def test_time_limit(self):
+        """ test a decision stops at its deadline """
+        policy = self.mcts.MCTSPolicy(time_limit=0.1)
+        policy.choose_move(self._state(), random.Random(0))
+        stats = policy.get_stats()
+        self.assertLess(stats.elapsed, 0.15)
+        self.assertGreater(stats.rollouts_per_sec(), 0)
+
+        policy = self.mcts.MCTSPolicy(time_limit=0.005)
+        policy.choose_move(self._state(), random.Random(0))
+        self.assertGreaterEqual(policy.get_stats().rollouts, 1)
+
+    def test_workers(self):
+        """ test a decision searched by a pool of workers """
+        policy = self.mcts.MCTSPolicy(time_limit=1, workers=2, iterations=10)
+        try:
+            move = policy.choose_move(self._state(), random.Random(0))
+        finally:
+            policy.close()
+        self.assertIn(move, self.mcts.legal_moves(self._state()))
+        self.assertEqual(policy.get_stats().rollouts, 20)
+
+    def test_player(self):
+        """ test MCTSPlayer chooses a card from its own hand """
+        sim = self.simulator
+        game = sim.Simulator([sim.RandomPolicy(), sim.RandomPolicy()]).new_game(random.Random(6))
+        player = self.mcts.MCTSPlayer("Bot", time_limit=1, iterations=10, seed=0)
+        player.get_hand().copy(game.players[0].get_hand())
+        game.players[0] = player
+        self.assertIn(player.choose_card(game), player.get_hand().get_cards())
+
+
+class TestEndgame(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        if self.endgame is None:
+            self.skipTest("Failed to import 'endgame.py'")
+
+    def _winning_position(self):
+        """ player 1 holds 3 coders and a tutor with coders asleep """
+        a2, support = self.a2, self.a2_support
+        players = [a2.Player("Player 1"), a2.Player("Player 2")]
+        players[0].get_hand().add_cards([a2.NumberCard(1), a2.TutorCard("tutor"), a2.NumberCard(2)])
+        players[0].get_coders().add_cards(support.CODERS[:3])
+        players[1].get_hand().add_cards([a2.KeyboardKidnapperCard(), a2.NumberCard(3), a2.NumberCard(4)])
+        coders = self.a2.SleepingCoders([None] * 3 + support.CODERS[3:])
+        pile = a2.Deck([a2.NumberCard(number) for number in range(5)])
+        game = support.CodersGame(pile, coders, players)
+        game.set_action(self.simulator.NO_ACTION)
+        return game
+
+    def test_table(self):
+        """ test the transposition table forgets the least recently used entry """
+        table = self.endgame.TranspositionTable(2)
+        table.put(1, 'a')
+        table.put(2, 'b')
+        self.assertEqual(table.get(1), 'a')
+        table.put(3, 'c')
+        self.assertIsNone(table.get(2))
+        self.assertEqual((table.get(1), table.get(3), len(table)), ('a', 'c', 2))
+        self.assertEqual((table.get_hits(), table.get_probes()), (3, 4))
+
+    def test_ordered_moves(self):
+        """ test cards moving coders are ordered before number cards """
+        moves = self.endgame.ordered_moves(self._winning_position())
+        self.assertEqual(moves[0], (self.mcts.PLAY, self.a2.TutorCard("tutor").get_key()))
+        self.assertEqual(len(moves), 3)
+
+    def test_finds_win(self):
+        """ test the search takes a winning coder and leaves the game unchanged """
+        game = self._winning_position()
+        before = str(game.players)
+        search = self.endgame.EndgameSearch(depth=4, determinizations=2)
+        state = self.gamestate.GameState.from_game(game)
+        move = search.choose_move(state, random.Random(0))
+        self.assertEqual(move, (self.mcts.PLAY, self.a2.TutorCard("tutor").get_key()))
+        self.assertEqual(str(game.players), before)
+
+        move = search.choose_move(state.play(1), random.Random(0))
+        self.assertEqual(move[0], self.mcts.ACT)
+        stats = search.get_stats()
+        self.assertGreater(stats.nodes, 0)
+        self.assertGreater(stats.nodes_per_sec(), 0)
+        self.assertLessEqual(stats.hit_rate(), 1)
+
+    def test_plays_game(self):
+        """ test an EndgamePolicy plays complete games """
+        sim = self.simulator
+        policy = self.endgame.EndgamePolicy(threshold=4, depth=4, determinizations=2)
+        result = sim.Simulator([policy, sim.GreedyPolicy()]).play_game(5)
+        self.assertGreater(result.turns, 0)
+
+
+class TestMoves(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        if self.moves is None:
+            self.skipTest("Failed to import 'moves.py'")
+
+    def test_tables(self):
+        """ test the action of each card class """
+        a2, moves = self.a2, self.moves
+        self.assertEqual(moves.card_action(a2.NumberCard(3)), moves.NO_ACTION)
+        self.assertEqual(moves.card_action(a2.TutorCard("t")), moves.PICKUP_CODER)
+        self.assertEqual(moves.card_action(a2.KeyboardKidnapperCard()), moves.STEAL_CODER)
+        self.assertEqual(moves.card_action(a2.AllNighterCard()), moves.SLEEP_CODER)
+
+    def test_matches_find_targets(self):
+        """ test MoveGenerator lists the same targets as find_targets every turn """
+        sim = self.simulator
+        simulator = sim.Simulator([sim.RandomPolicy(), sim.GreedyPolicy(), sim.RandomPolicy()])
+        for seed in range(5):
+            rng = random.Random(seed)
+            game = simulator.new_game(rng)
+            generator = self.moves.MoveGenerator(game)
+            policy = sim.RandomPolicy()
+            while not game.is_over():
+                player = game.current_player()
+                for action in (sim.PICKUP_CODER, sim.STEAL_CODER, sim.SLEEP_CODER):
+                    targets = sim.find_targets(game, player, action)
+                    self.assertEqual(generator.targets(player, action), targets)
+                    self.assertEqual(generator.has_targets(player, action), bool(targets))
+                coders = game.get_sleeping_coders()
+                self.assertEqual(generator.get_empty_slots(),
+                                 [slot for slot, card in enumerate(coders) if card is None])
+                simulator.play_turn(game, policy, rng, generator)
+
+    def test_indexed_simulator(self):
+        """ test an indexed Simulator plays the same games """
+        sim = self.simulator
+        policies = [sim.GreedyPolicy(), sim.RandomPolicy()]
+        plain = sim.Simulator(policies).run(20).get_results()
+        indexed = sim.Simulator(policies, indexed=True).run(20).get_results()
+        self.assertEqual(indexed, plain)
+
+    def test_card_moves(self):
+        """ test MoveGenerator.card_moves lists every card in hand """
+        sim = self.simulator
+        game = sim.Simulator([sim.RandomPolicy(), sim.RandomPolicy()]).new_game(random.Random(0))
+        generator = self.moves.MoveGenerator(game)
+        player = game.players[0]
+        card_moves = generator.card_moves(player)
+        self.assertEqual([card for _, card, _ in card_moves], player.get_hand().get_cards())
+        self.assertEqual([action for _, card, action in card_moves],
+                         [card.PLAY_ACTION for card in player.get_hand().get_cards()])
+        generator.detach()
+
+
+class TestReplay(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        if self.replay is None:
+            self.skipTest("Failed to import 'replay.py'")
+
+    def _record(self, policies, games, **kwargs):
+        stream = io.BytesIO()
+        writer = self.replay.ReplayWriter(stream)
+        report = self.simulator.Simulator(policies, recorder=writer, **kwargs).run(games, seed=3)
+        self.assertEqual(writer.get_game_count(), games)
+        return report.get_results(), stream.getvalue()
+
+    def test_varint(self):
+        """ test integers round trip through varints """
+        replay = self.replay
+        buffer = bytearray()
+        values = [0, 1, 127, 128, 300, 2 ** 40]
+        for value in values:
+            replay.write_varint(buffer, value)
+        self.assertEqual(len(buffer), 1 + 1 + 1 + 2 + 2 + 6)
+        position = 0
+        for value in values:
+            read, position = replay.read_varint(buffer, position)
+            self.assertEqual(read, value)
+        self.assertEqual(position, len(buffer))
+
+    def test_round_trip(self):
+        """ test replaying a log ends every game as it was played """
+        sim = self.simulator
+        # copying a deck of fresh cards shares some equal cards and not others
+        for interned, deck_copies in ((False, 0), (True, 0), (False, 2)):
+            policies = [sim.RandomPolicy(), sim.GreedyPolicy(), sim.RandomPolicy()]
+            results, data = self._record(policies, 30, interned=interned, deck_copies=deck_copies)
+            records = list(self.replay.ReplayReader(data))
+            self.assertEqual(len(records), len(results))
+            for result, record in zip(results, records):
+                game = record.final()
+                players = game.players
+                winner = players.index(game.winner) if game.winner is not None else None
+                coders = tuple(player.get_coders().get_amount() for player in players)
+                self.assertEqual((winner, coders), (result.winner, result.coders))
+
+    def test_unchanged_games(self):
+        """ test recording does not change the games played """
+        sim = self.simulator
+        policies = [sim.GreedyPolicy(), sim.RandomPolicy()]
+        results, _ = self._record(policies, 20)
+        self.assertEqual(results, sim.Simulator(policies).run(20, seed=3).get_results())
+
+    def test_size(self):
+        """ test a game takes under 100 bytes """
+        sim = self.simulator
+        results, data = self._record([sim.RandomPolicy(), sim.RandomPolicy()], 200)
+        self.assertLess(len(data) / len(results), 100)
+
+    def test_replay_turns(self):
+        """ test replay yields the game before and after every turn """
+        sim = self.simulator
+        results, data = self._record([sim.RandomPolicy(), sim.RandomPolicy()], 5)
+        for result, record in zip(results, self.replay.ReplayReader(data)):
+            states = record.replay()
+            game = next(states)
+            self.assertEqual(game.get_pickup_pile().get_amount(),
+                             len(self.a2_support.build_deck(self.a2_support.FULL_DECK)) - 2 * 5)
+            self.assertEqual(sum(1 for _ in states), result.turns)
+            self.assertTrue(game.is_over())
+
+    def test_unknown_card(self):
+        """ test recording a card missing from the dictionary raises ValueError """
+        replay = self.replay
+        writer = replay.ReplayWriter(io.BytesIO(), cards=[(self.a2.NumberCard, 1)], coders=[])
+        writer.begin_game([self.a2.NumberCard(1)], 2, 0)
+        writer.end_game()
+        with self.assertRaises(ValueError):
+            writer.begin_game([self.a2.NumberCard(2)], 2, 0)
+
+    def test_bad_log(self):
+        """ test reading data which is not a log raises ValueError """
+        replay = self.replay
+        stream = io.BytesIO()
+        replay.ReplayWriter(stream)
+        header = stream.getvalue()
+        deck = io.BytesIO()
+        replay.ReplayWriter(deck, cards=[(self.a2.Deck,)], coders=[])
+        for data in (b"not a log", header[:len(header) // 2], header[:len(replay.MAGIC)],
+                     header[:len(replay.MAGIC)] + bytes([1]) + header[len(replay.MAGIC) + 1:],
+                     deck.getvalue()):
+            with self.assertRaises(ValueError, msg=data):
+                replay.ReplayReader(data)
+
+
+class TestArchive(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        if self.archive is None:
+            self.skipTest("Failed to import 'archive.py'")
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "games.sca")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _record(self, games, seed):
+        sim = self.simulator
+        with self.archive.ArchiveWriter(self.path) as writer:
+            simulator = sim.Simulator([sim.RandomPolicy(), sim.GreedyPolicy()], recorder=writer)
+            return simulator.run(games, seed=seed).get_results()
+
+    @staticmethod
+    def _final_outcome(record):
+        game = record.final()
+        players = game.players
+        winner = players.index(game.winner) if game.winner is not None else None
+        return winner, tuple(player.get_coders().get_amount() for player in players)
+
+    def test_random_access(self):
+        """ test fetching games by position after appending to an archive """
+        results = self._record(20, 1) + self._record(10, 2)
+        with self.archive.Archive(self.path) as archive:
+            self.assertEqual(len(archive), 30)
+            for game in (0, 19, 20, 29, -1):
+                result = results[game]
+                self.assertEqual(self._final_outcome(archive[game]), (result.winner, result.coders))
+            with self.assertRaises(IndexError):
+                archive[30]
+
+    def test_ranges(self):
+        """ test iterating over ranges of games """
+        results = self._record(12, 3)
+        expected = [(result.winner, result.coders) for result in results]
+        with self.archive.Archive(self.path) as archive:
+            self.assertEqual([self._final_outcome(record) for record in archive], expected)
+            self.assertEqual([self._final_outcome(record) for record in archive.games(4, 8)],
+                             expected[4:8])
+            self.assertEqual([self._final_outcome(record) for record in archive[::5]], expected[::5])
+
+    def test_appends(self):
+        """ test each append adds only its records, their index and a footer """
+        results = self._record(8, 1)
+        for games, seed in ((5, 2), (0, 3), (7, 4)):
+            size = os.path.getsize(self.path)
+            results += self._record(games, seed)
+            with self.archive.Archive(self.path) as archive:
+                if games:
+                    self.assertEqual(archive.get_offset(len(archive) - games), size)
+                    self.assertEqual(os.path.getsize(self.path),
+                                     archive.get_records_size() + 8 * games + self.archive.FOOTER.size)
+                else:
+                    self.assertEqual(os.path.getsize(self.path), size)
+        with self.archive.Archive(self.path) as archive:
+            self.assertEqual([self._final_outcome(record) for record in archive.get_reader()],
+                             [(result.winner, result.coders) for result in results])
+
+    def test_interrupted_append(self):
+        """ test an append cut short loses none of the games already archived """
+        sim = self.simulator
+        results = self._record(15, 1)
+        writer = self.archive.ArchiveWriter(self.path)
+        sim.Simulator([sim.RandomPolicy(), sim.RandomPolicy()], recorder=writer).run(5, seed=2)
+        # the process dies before close writes the index and footer
+        writer._stream.close()
+        with self.archive.Archive(self.path) as archive:
+            self.assertEqual(len(archive), 15)
+            self.assertEqual(self._final_outcome(archive[-1]), (results[-1].winner, results[-1].coders))
+
+        results += self._record(10, 3)
+        with self.archive.Archive(self.path) as archive:
+            self.assertEqual([self._final_outcome(record) for record in archive],
+                             [(result.winner, result.coders) for result in results])
+
+    def test_not_archive(self):
+        """ test opening a file which is not an archive raises ValueError """
+        with open(self.path, 'wb') as file:
+            file.write(b"not an archive at all")
+        with self.assertRaises(ValueError):
+            self.archive.Archive(self.path)
+
+    def test_different_cards(self):
+        """ test appending with another card dictionary raises ValueError """
+        self._record(1, 0)
+        with self.assertRaises(ValueError):
+            self.archive.ArchiveWriter(self.path, cards=[(self.a2.NumberCard, 1)])
+
+
+class TestAnalytics(TestSimulation):
+    def setUp(self):
+        super().setUp()
+        if self.analytics is None:
+            self.skipTest("Failed to import 'analytics.py'")
+        self._directory = tempfile.TemporaryDirectory()
+        sim = self.simulator
+        self.policies = [sim.GreedyPolicy(), sim.RandomPolicy()]
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self._directory.name, name)
+
+    def test_replay_game(self):
+        """ test replayed games match the games played """
+        sim, analytics = self.simulator, self.analytics
+        path = self._path("games.scr")
+        with open(path, 'wb') as file:
+            simulator = sim.Simulator(self.policies, recorder=self.replay.ReplayWriter(file))
+            results = simulator.run(20, seed=4).get_results()
+        games = list(analytics.Pipeline.open(path).replay())
+        self.assertEqual([(game.winner, game.turns, game.coders) for game in games],
+                         [(result.winner, result.turns, result.coders) for result in results])
+        for game in games:
+            self.assertEqual(len(game.moves), game.turns)
+            self.assertEqual(game.moves[0].seat, 0)
+
+    def test_aggregate(self):
+        """ test aggregating an archive in one pass """
+        sim, analytics = self.simulator, self.analytics
+        path = self._path("games.sca")
+        with self.archive.ArchiveWriter(path) as writer:
+            report = sim.Simulator(self.policies, recorder=writer).run(40, seed=5)
+        results = report.get_results()
+
+        count, wins, turns = analytics.Pipeline.open(path).replay().aggregate(
+            analytics.Count(), analytics.WinRate(), analytics.Mean(lambda game: game.turns))
+        self.assertEqual(count, 40)
+        self.assertEqual(wins, [seat_wins / 40 for seat_wins in report.wins()])
+        self.assertAlmostEqual(turns, sum(result.turns for result in results) / 40)
+
+        won = analytics.Pipeline.open(path, 10, 30).replay() \
+            .filter(lambda game: game.winner == 0).map(lambda game: game.turns)
+        self.assertEqual(list(won), [result.turns for result in results[10:30] if result.winner == 0])
+
+    def test_action_count(self):
+        """ test counting the moves performing an action """
+        sim, analytics = self.simulator, self.analytics
+        path = self._path("games.sca")
+        with self.archive.ArchiveWriter(path) as writer:
+            sim.Simulator(self.policies, recorder=writer).run(10, seed=6)
+        count = analytics.action_count(sim.STEAL_CODER)
+        for game in analytics.Pipeline.open(path).replay():
+            steals = [move for move in game.moves
+                      if isinstance(move.card, self.a2.KeyboardKidnapperCard) and move.target]
+            self.assertEqual(count(game), len(steals))
+            for move in steals:
+                self.assertNotEqual(move.target[0], move.seat)
+
+
+def _count(n):
+    return sum(range(n))
+
+
+def _countdown(n):
+    return n if n == 0 else _countdown(n - 1)
+
+
+def _spread(n):
+    return [_count(i) for i in range(n)] if n >= 0 else _countdown(-n)
+
+
+@functools.lru_cache(maxsize=None)
+def _fib(n):
+    return n if n < 2 else _fib(n - 1) + _fib(n - 2)
+
+
+def _walk(n):
+    return 0 if n == 0 else _HANDLERS['walk'](n - 1)
+
+
+_HANDLERS = {'walk': _walk}
+
+
+def _apply(g, n):
+    return 0 if n == 0 else g(g, n - 1)
+
+
+class _Node:
+    def __init__(self, children):
+        self.children = children
+
+    def size(self):
+        return 1 + sum(map(lambda child: child.size(), self.children))
+
+
+class TestRecursion(OrderedTestCase):
+    def test_find_recursion(self):
+        """ test find_recursion tells calls which can't recurse from those which do """
+        self.assertIs(find_recursion(_count), False)
+        self.assertIs(find_recursion(_countdown), True)
+        self.assertIs(find_recursion(_fib), True)
+
+    def test_unresolved(self):
+        """ test find_recursion is inconclusive for calls it can't resolve """
+        for func in (_walk, _apply, _Node.size, functools.partial(_apply, _apply)):
+            self.assertIsNone(find_recursion(func), msg=func)
+
+    def test_assert_not_recursive(self):
+        """ test assertIsNotRecursive traces the calls find_recursion can't rule out """
+        self.assertIsNotRecursive(_count, 10)
+        for func, *args in ((_countdown, 5), (_fib, 20), (_walk, 5), (_apply, _apply, 5),
+                            (_Node([_Node([])]).size,)):
+            with self.assertRaises(self.failureException, msg=func):
+                self.assertIsNotRecursive(func, *args)
+
+    def test_budget(self):
+        """ test the budget only limits tracing calls find_recursion is inconclusive for """
+        self.recursion_budget = 10
+        # a cycle which is never taken is traced in full
+        self.assertIsNotRecursive(_spread, 20)
+        with self.assertRaises(self.failureException):
+            self.assertIsNotRecursive(_spread, -3)
+        # running out of budget stops tracing rather than failing
+        self.assertIsNotRecursive(_apply, lambda g, n: [_count(i) for i in range(20)], 1)
+        with self.assertRaises(self.failureException):
+            self.assertIsNotRecursive(_walk, 3)
+
+    def test_a2(self):
+        """ test find_recursion and assertIsNotRecursive on the methods of a2 """
+        if self.a2 is None:
+            self.skipTest("Failed to import 'a2.py'")
+        a2 = self.a2
+        self.assertIs(find_recursion(a2.Deck.get_cards), False)
+        self.assertIs(find_recursion(a2.SleepingCoders.sort), False)
+        # both may call the listeners of a deck
+        self.assertIsNone(find_recursion(a2.Deck.pick))
+        self.assertIsNone(find_recursion(a2.Card.play))
+
+        self.recursion_budget = 10
+        deck = a2.Deck([a2.NumberCard(number) for number in range(50)])
+        self.assertIsNotRecursive(deck.pick, 20)
+        self.assertEqual(deck.get_amount(), 30)
+
+
+class _BrokenSetUp(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        raise RuntimeError("setUpClass failed")
+
+    def test_never_run(self):
+        pass
+
+
+class _Streamed(OrderedTestCase):
+    records = []
+
+    def test_fail(self):
+        self.fail("failed")
+
+    def test_streamed(self):
+        self.assertEqual([record[1] for record in self.records], ['test_fail'])
+
+
+def _run_output(script, *args):
+    """ Run a script of test cases in a new process, returning what it output """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "script.py")
+        with open(path, 'w') as file:
+            file.write(script)
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(testrunner.__file__)))
+        return subprocess.run([sys.executable, path, *args], capture_output=True,
+                              text=True, env=env, cwd=directory).stdout
+
+
+def _run_script(script, *args):
+    """ Run a script of test cases in a new process, returning its ndjson records """
+    return [json.loads(line) for line in _run_output(script, '--ndjson', *args).splitlines()]
+
+
+class TestRecords(OrderedTestCase):
+    def test_class_error(self):
+        """ test an error in setUpClass is recorded as soon as it happens """
+        records = []
+        result = TestResult()
+        result.on_record = records.append
+        TestLoader().loadTestCases([_BrokenSetUp]).run(result)
+        self.assertEqual([(record[0], record[1], record[5]) for record in records],
+                         [('_BrokenSetUp', 'setUpClass', 'ERROR')])
+        self.assertIn("setUpClass failed", records[0][6])
+        self.assertEqual(result.to_records(), records)
+
+        merged = TestResult()
+        merged.add_records(records)
+        self.assertEqual((merged.testsRun, len(merged.errors)), (0, 1))
+
+    def test_streamed(self):
+        """ test each record is passed on as its test stops and the test is then only counted """
+        result = TestResult()
+        result.on_record = _Streamed.records.append
+        TestLoader().loadTestCases([_Streamed]).run(result)
+        self.assertEqual([(record[1], record[5]) for record in _Streamed.records],
+                         [('test_fail', 'FAIL'), ('test_streamed', None)])
+        self.assertEqual((result.failures, result.timings['_Streamed']), ([], {}))
+        self.assertEqual((result.testsRun, result.counts()), (2, (1, 0)))
+        self.assertFalse(result.wasSuccessful())
+
+    def test_worker_died(self):
+        """ test the tests of a worker process which dies are reported as errors """
+        script = textwrap.dedent("""
+            import os
+            from testrunner import OrderedTestCase, TestMaster
+
+            class TestDies(OrderedTestCase):
+                def test_exit(self):
+                    os._exit(1)
+
+            class TestPasses(OrderedTestCase):
+                def test_pass(self):
+                    pass
+
+            TestMaster().run([TestDies, TestPasses])
+        """)
+        lines = _run_script(script, '--jobs', '2')
+        outcomes = {line['test_case']: line.get('flavour') for line in lines[:-1]}
+        self.assertEqual(outcomes, {'TestDies': 'ERROR', 'TestPasses': None})
+        self.assertEqual((lines[-1]['total'], lines[-1]['failed']), (2, 1))
+
+
+class TestTimeouts(OrderedTestCase):
+    def test_caught_timeout(self):
+        """ test a test which catches every Exception is still skipped once it times out """
+        script = textwrap.dedent("""
+            import time
+            from testrunner import OrderedTestCase, TestMaster, timeout
+
+            class TestCatches(OrderedTestCase):
+                @timeout(0.2)
+                def test_loop(self):
+                    end = time.monotonic() + 5
+                    while time.monotonic() < end:
+                        try:
+                            sum(range(100))
+                        except Exception:
+                            pass
+
+            TestMaster().run([TestCatches])
+        """)
+        for mode in ('signal', 'trace'):
+            record = _run_script(script, '--timeout-mode', mode)[0]
+            self.assertEqual(record['flavour'], 'SKIP', msg=mode)
+            self.assertLess(record['wall_time'], 4, msg=mode)
+
+
+class TestTimings(OrderedTestCase):
+    script = textwrap.dedent("""
+        import time
+        from testrunner import OrderedTestCase, TestMaster
+
+        class TestSleeps(OrderedTestCase):
+            def test_short(self):
+                time.sleep(0.01)
+
+            def test_long(self):
+                time.sleep(0.2)
+
+            def test_allocates(self):
+                data = bytearray(4 * 1024 * 1024)
+
+        TestMaster().run([TestSleeps])
+    """)
+
+    def test_timings(self):
+        """ test the wall and CPU time of each test are recorded """
+        records = {record['test']: record for record in _run_script(self.script)[:-1]}
+        self.assertGreaterEqual(records['test_long']['wall_time'], 0.2)
+        self.assertLess(records['test_short']['wall_time'], records['test_long']['wall_time'])
+        self.assertLess(records['test_long']['cpu_time'], 0.1)
+        self.assertEqual({record['memory'] for record in records.values()}, {None})
+
+    def test_durations(self):
+        """ test --durations lists the given number of slowest tests """
+        output = _run_output(self.script, '--durations', '2').split('Slowest 2 Tests')[1]
+        lines = [line for line in output.splitlines() if 'TestSleeps.' in line]
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith('TestSleeps.test_long'))
+
+    def test_trace_memory(self):
+        """ test --trace-memory records the peak memory allocated by each test """
+        if not testrunner.CAN_TRACE_MEMORY:
+            self.skipTest("tracemalloc can't reset its peak before Python 3.9")
+        records = {record['test']: record for record in _run_script(self.script, '--trace-memory')[:-1]}
+        self.assertGreaterEqual(records['test_allocates']['memory'], 4 * 1024 * 1024)
+        self.assertLess(records['test_short']['memory'], 1024 * 1024)
+        output = _run_output(self.script, '--durations', '1', '--trace-memory')
+        self.assertIn('KiB peak', output.split('Slowest 1 Tests')[1])
+
+
+def main():
+    test_cases = [
+        TestSimulator,
+        TestParallel,
+        TestVectorized,
+        TestGameState,
+        TestJournal,
+        TestZobrist,
+        TestMCTS,
+        TestEndgame,
+        TestMoves,
+        TestReplay,
+        TestArchive,
+        TestAnalytics,
+        TestRecursion,
+        TestRecords,
+        TestTimeouts,
+        TestTimings,
+    ]
+
+    master = TestMaster(max_diff=None,
+                        ignore_import_fails=True,
+                        timeout=10,
+                        scripts=[
+                            ('a2', 'a2.py'),
+                            ('a2_support', 'a2_support.py'),
+                            ('simulator', 'simulator.py'),
+                            ('parallel', 'parallel.py'),
+                            ('vectorized', 'vectorized.py'),
+                            ('gamestate', 'gamestate.py'),
+                            ('journal', 'journal.py'),
+                            ('zobrist', 'zobrist.py'),
+                            ('mcts', 'mcts.py'),
+                            ('endgame', 'endgame.py'),
+                            ('moves', 'moves.py'),
+                            ('replay', 'replay.py'),
+                            ('archive', 'archive.py'),
+                            ('analytics', 'analytics.py')
+                        ])
+    master.run(test_cases)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,20 @@ __author__ = 'Steven Summers'
 __version__ = '1.0.2'
 
 import argparse
+import ast
 import difflib
 import importlib.util
 import inspect
 import io
 import json
+import multiprocessing
 import re
+import signal
 import sys
 import textwrap
+import time
 import traceback
+import tracemalloc
 import unittest
 
 import tkinter as tk
@@ -18,13 +23,15 @@ import _tkinter
 
 from bdb import Bdb
 from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from enum import Enum, unique
-from functools import wraps
+from functools import partial, wraps
 from pathlib import Path
-from threading import Event, Timer
+from threading import Event, Timer, current_thread, main_thread
 from timeit import default_timer as timer
-from types import FrameType, FunctionType, ModuleType, TracebackType
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+from types import CodeType, FrameType, FunctionType, ModuleType, TracebackType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Type, Union
 
 # GLOBALS TO EXCLUDE FILES IN TRACEBACK
 __TEST_RUNNER = True
@@ -41,11 +48,17 @@ __all__ = [
 
 # DEFAULTS
 DEFAULT_TIMEOUT = 0
+DEFAULT_TIMEOUT_MODE = 'signal'
+DEFAULT_JOBS = 1
+DEFAULT_RECURSION_BUDGET = 100000
 
 # CONSTANTS
+TIMEOUT_MODES = ('signal', 'trace')
 DIFF_OMITTED = '\nDiff is {} characters long. Set TestMaster(max_diff=None) to see it.'
 DUPLICATE_MSG = 'AS ABOVE'
 CLOSE_MATCH_CUTOFF = 0.8
+# the peak memory of each test is only measured where tracemalloc has reset_peak, new in Python 3.9
+CAN_TRACE_MEMORY = hasattr(tracemalloc, 'reset_peak')
 TAB_SIZE = 4
 BLOCK_WIDTH = 80
 BLOCK_TEMPLATE = """\
@@ -55,8 +68,12 @@ BLOCK_TEMPLATE = """\
 """.format('-' * (BLOCK_WIDTH - 2), BLOCK_WIDTH - 2)
 
 
-class TestTimeout(Exception):
-    pass
+class TestTimeout(BaseException):
+    """
+    Raised in a test which runs longer than its timeout. Not an Exception, so
+    code under test catching Exception can't swallow it, which would also
+    stop the trace of a TimeoutDetector for good.
+    """
 
 
 @unique
@@ -135,8 +152,9 @@ def import_module(path: str) -> Tuple[Optional[ModuleType], Optional[Tuple[Type,
 
 def _test_wrapper(test_func):
     """
-    Runs the given test_func with a trace from TimeoutDetector
-    exiting with TestTimeout exception if the test_func runs longer
+    Runs the given test_func with a TimeoutAlarm, or a trace from
+    TimeoutDetector if signals can't be used or TestCase.timeout_mode is
+    'trace', exiting with TestTimeout exception if the test_func runs longer
     than the interval specified by the __time__ attribute
     """
 
@@ -153,16 +171,18 @@ def _test_wrapper(test_func):
             except (EOFError, SystemExit) as err:
                 error = err
         else:
-            td = TimeoutDetector(interval, inspect.currentframe())
+            if TestCase.timeout_mode == 'signal' and TimeoutAlarm.is_available():
+                detector = TimeoutAlarm(interval, inspect.currentframe())
+            else:
+                detector = TimeoutDetector(interval, inspect.currentframe())
 
             try:
-                td.set_trace()
+                detector.set_trace()
                 test_func(self)
             except (TestTimeout, EOFError, SystemExit) as err:
                 error = err
             finally:
-                sys.settrace(None)
-                td.cancel()
+                detector.cancel()
 
             if isinstance(error, TestTimeout):
                 self.skipTest(f'Function ran longer than {interval} second(s)')
@@ -326,11 +346,13 @@ class RedirectStdIO:
 
 
 class RecursionDetector(Bdb):
-    __slots__ = ['_stack']
+    __slots__ = ['_stack', '_budget']
 
-    def __init__(self, *args):
+    def __init__(self, *args, budget: int = 0):
+        """ budget: the number of calls traced before the rest run untraced, unlimited if 0 """
         super().__init__(*args)
         self._stack = set()
+        self._budget = budget
 
     def do_clear(self, arg):
         pass
@@ -340,9 +362,214 @@ class RecursionDetector(Bdb):
         if code in self._stack:
             raise RecursionError
         self._stack.add(code)
+        if self._budget:
+            self._budget -= 1
+            if not self._budget:
+                self.set_continue()
 
     def user_return(self, frame, return_value):
-        self._stack.remove(frame.f_code)
+        self._stack.discard(frame.f_code)
+
+
+# calling a method with one of these names on an object which isn't known is
+# taken to call the method of a built-in type
+_BUILTIN_METHODS = frozenset(name for cls in (bytes, dict, float, frozenset, int, list, set, str, tuple)
+                             for name in dir(cls))
+_MISSING = object()
+
+# (code, owning class) -> _references of a function called on an instance of that class
+_references_cache: Dict[Tuple[CodeType, Optional[type]], Tuple[list, bool]] = {}
+# (code, owning class) -> result of find_recursion
+_recursion_cache: Dict[Tuple[CodeType, Optional[type]], Optional[bool]] = {}
+
+
+def _defining_class(func: FunctionType) -> Optional[type]:
+    """ The class func is a method of, None for functions and static methods """
+    *path, name = func.__qualname__.split('.')
+    if not path or '<locals>' in path:
+        return None
+    owner = func.__globals__.get(path[0])
+    for part in path[1:]:
+        owner = getattr(owner, part, None)
+    if not isinstance(owner, type) or isinstance(inspect.getattr_static(owner, name, None), staticmethod):
+        return None
+    return owner
+
+
+def _callees(obj, owner: Optional[type] = None) -> Optional[List[Tuple[FunctionType, Optional[type]]]]:
+    """
+    Python functions that may run when obj is called, each with the class self
+    is an instance of. None if obj is a callable they can't be found for.
+    """
+    if isinstance(obj, (staticmethod, classmethod)):
+        obj = obj.__func__
+    if isinstance(obj, property):
+        return [(func, owner) for func in (obj.fget, obj.fset, obj.fdel) if isinstance(func, FunctionType)]
+    if inspect.ismethod(obj):
+        owner = obj.__self__ if isinstance(obj.__self__, type) else type(obj.__self__)
+        obj = obj.__func__
+    if isinstance(obj, FunctionType):
+        return [(obj, owner or _defining_class(obj))]
+    if isinstance(obj, type):
+        methods = (getattr(obj, '__new__', None), getattr(obj, '__init__', None))
+        return [(method, obj) for method in methods if isinstance(method, FunctionType)]
+    # wrappers such as functools.lru_cache and functools.partial
+    wrapped = obj.func if isinstance(obj, partial) else inspect.getattr_static(obj, '__wrapped__', None)
+    if wrapped is not None:
+        return _callees(wrapped)
+    if isinstance(obj, ModuleType) or inspect.isroutine(obj) or not callable(obj):
+        return []
+    call = inspect.getattr_static(type(obj), '__call__', None)
+    return [(call, type(obj))] if isinstance(call, FunctionType) else None
+
+
+def _references(func: FunctionType, owner: Optional[type]) -> Tuple[List[Tuple[FunctionType, Optional[type]]], bool]:
+    """
+    Reads the source code of func, called on an instance of owner, for the
+    functions it refers to through its globals, closure, self and super().
+    Returns those, each with the class self is an instance of, and whether
+    func calls anything else: an argument, a local or nested function, an
+    item, the result of a call or a method of another object which built-in
+    types don't have. Other attributes of other objects are taken to be data.
+    """
+    key = (func.__code__, owner)
+    if key in _references_cache:
+        return _references_cache[key]
+    try:
+        node = ast.parse(textwrap.dedent(inspect.getsource(func))).body[0]
+    except (OSError, TypeError, SyntaxError, IndexError):
+        node = None
+    if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) or node.name != func.__name__:
+        # lambdas and functions without source code
+        _references_cache[key] = [], True
+        return _references_cache[key]
+    node.decorator_list = []
+    nodes = list(ast.walk(node))
+
+    local = {arg.arg for sub in nodes if isinstance(sub, ast.arguments)
+             for arg in (*sub.posonlyargs, *sub.args, sub.vararg, *sub.kwonlyargs, sub.kwarg) if arg}
+    local.update(sub.id for sub in nodes if isinstance(sub, ast.Name) and not isinstance(sub.ctx, ast.Load))
+    local.update(sub.name for sub in nodes if isinstance(sub, (ast.FunctionDef, ast.AsyncFunctionDef,
+                                                               ast.ClassDef, ast.ExceptHandler)) and sub is not node)
+    local.update((alias.asname or alias.name).split('.')[0] for sub in nodes
+                 if isinstance(sub, (ast.Import, ast.ImportFrom)) for alias in sub.names)
+    this = node.args.args[0].arg if owner is not None and node.args.args else None
+
+    cells = {}
+    for name, cell in zip(func.__code__.co_freevars, func.__closure__ or ()):
+        try:
+            cells[name] = cell.cell_contents
+        except ValueError:
+            pass
+    builtins = func.__globals__.get('__builtins__', {})
+    builtins = vars(builtins) if isinstance(builtins, ModuleType) else builtins
+
+    def lookup(name: str):
+        if name in cells:
+            return cells[name]
+        return func.__globals__.get(name, builtins.get(name, _MISSING))
+
+    called = {id(sub.func) for sub in nodes if isinstance(sub, ast.Call)}
+    functions, opaque = [], False
+    for sub in nodes:
+        is_called = id(sub) in called
+        if isinstance(sub, ast.Call):
+            opaque |= not isinstance(sub.func, (ast.Name, ast.Attribute))
+            continue
+        if isinstance(sub, ast.Name) and isinstance(sub.ctx, ast.Load):
+            if sub.id in local:
+                opaque |= is_called
+                continue
+            value, base = lookup(sub.id), None
+        elif isinstance(sub, ast.Attribute) and isinstance(sub.ctx, ast.Load):
+            receiver = sub.value
+            if isinstance(receiver, ast.Name) and receiver.id == this:
+                value, base = inspect.getattr_static(owner, sub.attr, _MISSING), owner
+            elif (isinstance(receiver, ast.Call) and isinstance(receiver.func, ast.Name)
+                  and receiver.func.id == 'super' and 'super' not in local):
+                value, base = _super_attribute(owner, cells.get('__class__'), sub.attr), owner
+            elif (isinstance(receiver, ast.Name) and receiver.id not in local
+                  and isinstance(lookup(receiver.id), (ModuleType, type))):
+                base = lookup(receiver.id)
+                value = inspect.getattr_static(base, sub.attr, _MISSING)
+            else:
+                opaque |= is_called and sub.attr not in _BUILTIN_METHODS
+                continue
+        else:
+            continue
+
+        if value is _MISSING:
+            # an attribute of an instance or a global assigned later
+            opaque |= is_called
+            continue
+        callees = _callees(value, base if isinstance(base, type) else None)
+        if callees is None:
+            opaque = True
+        else:
+            functions.extend(callees)
+    _references_cache[key] = functions, opaque
+    return functions, opaque
+
+
+def _super_attribute(owner: Optional[type], defining: Optional[type], name: str):
+    """ The attribute super().name looks up in a method of defining called on an owner """
+    if owner is None or not isinstance(defining, type) or defining not in owner.__mro__:
+        return _MISSING
+    mro = owner.__mro__
+    for cls in mro[mro.index(defining) + 1:]:
+        if name in vars(cls):
+            return vars(cls)[name]
+    return _MISSING
+
+
+def find_recursion(func: Callable) -> Optional[bool]:
+    """
+    Checks statically whether calling func may recurse by walking the calls
+    _references finds from the source code of each function reached. Methods
+    looked up on a class are taken to be called on an instance of it.
+    Returns True if the calls have a cycle, False if they have none and None
+    if a function reached calls something that can't be resolved.
+    Results are cached per code object.
+    """
+    callees = _callees(func)
+    if callees is None:
+        return None
+    results = [_find_cycle(callee, owner) for callee, owner in callees]
+    if True in results:
+        return True
+    return None if None in results else False
+
+
+def _find_cycle(root: FunctionType, owner: Optional[type]) -> Optional[bool]:
+    """
+    find_recursion of a function called on an instance of owner, a depth
+    first search for a function reached again along the path to it.
+    """
+    key = (root.__code__, owner)
+    if key in _recursion_cache:
+        return _recursion_cache[key]
+    visited, path = set(), set()
+    opaque = False
+    stack = [(root, owner, False)]
+    while stack:
+        func, self_type, leaving = stack.pop()
+        node = (func.__code__, self_type)
+        if leaving:
+            path.discard(node)
+            continue
+        if node in path:
+            _recursion_cache[key] = True
+            return True
+        if node in visited:
+            continue
+        visited.add(node)
+        path.add(node)
+        functions, node_opaque = _references(func, self_type)
+        opaque |= node_opaque
+        stack.append((func, self_type, True))
+        stack.extend((callee, callee_owner, False) for callee, callee_owner in functions)
+    _recursion_cache[key] = None if opaque else False
+    return _recursion_cache[key]
 
 
 class TimeoutDetector(Bdb):
@@ -374,9 +601,46 @@ class TimeoutDetector(Bdb):
         super().set_trace(self._frame)
 
     def cancel(self):
+        sys.settrace(None)
         self._timer.cancel()
 
 
+class TimeoutAlarm:
+    """
+    Raises TestTimeout in the main thread once the interval has passed using
+    an interval timer and SIGALRM, so the code under test runs untraced.
+    The alarm repeats until cancelled, in case the code under test catches
+    the exception.
+    """
+    __slots__ = ['_interval', '_frame', '_handler']
+    repeat_interval = 0.05
+
+    def __init__(self, interval: float, frame: FrameType):
+        self._interval = interval
+        self._frame = frame
+        self._handler = None
+
+    @staticmethod
+    def is_available() -> bool:
+        """ True iff SIGALRM can be handled, only on Unix in the main thread """
+        return hasattr(signal, 'setitimer') and current_thread() is main_thread()
+
+    def _timeout(self, signum, frame: FrameType):
+        # not once the test is over and the alarm is being cancelled
+        if frame is not self._frame and frame.f_code is not TimeoutAlarm.cancel.__code__:
+            raise TestTimeout
+
+    def set_trace(self):
+        self._handler = signal.signal(signal.SIGALRM, self._timeout)
+        signal.setitimer(signal.ITIMER_REAL, self._interval, self.repeat_interval)
+
+    def cancel(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if self._handler is not None:
+            signal.signal(signal.SIGALRM, self._handler)
+            self._handler = None
+
+
 class AttributeGuesser:
     """
     Wrapper class for objects to return the attribute with the
@@ -509,6 +773,8 @@ class TestCase(unittest.TestCase, metaclass=_TestCaseMeta):
     Extends the unittest.TestCase defining additional assert methods.
     """
     timeout_interval = DEFAULT_TIMEOUT
+    timeout_mode = DEFAULT_TIMEOUT_MODE
+    recursion_budget = DEFAULT_RECURSION_BUDGET
     member_names: List[str]
     _modules: Dict[str, ModuleType] = {}
 
@@ -611,7 +877,19 @@ class TestCase(unittest.TestCase, metaclass=_TestCaseMeta):
             self.fail(msg=msg)
 
     def assertIsNotRecursive(self, func, *args, **kwargs):
-        detector = RecursionDetector()
+        """
+        Fails if calling func with args recurses. If find_recursion shows func
+        and the functions passed to it can't recurse the call runs untraced.
+        If it found a cycle the call is traced in full. If it is inconclusive
+        the call is traced for recursion_budget calls (all if 0) and the rest
+        of it runs untraced.
+        """
+        results = [find_recursion(obj) for obj in (func, *args, *kwargs.values()) if callable(obj)]
+        if all(result is False for result in results):
+            func(*args, **kwargs)
+            return
+
+        detector = RecursionDetector(budget=0 if True in results else self.recursion_budget)
         is_recursive = False
         try:
             detector.set_trace()
@@ -688,23 +966,71 @@ class TestTkinterApp(OrderedTestCase):
             pass
 
 
+class RemoteTest:
+    """
+    Stands in for a TestCase which was run in a worker process, holding what
+    is needed to report its outcome and to check skipIfFailed against it
+    """
+    _classes: Dict[str, Type['RemoteTest']] = {}
+
+    def __init__(self, name: str, description: str, aggregated_tests: List[Tuple[Optional[str], Optional[str]]]):
+        self.name = name
+        self.description = description
+        self.aggregated_tests = aggregated_tests
+
+    @classmethod
+    def create(cls, test_cls_name: str, *args) -> 'RemoteTest':
+        """ Create a RemoteTest whose class has the name of the TestCase it stands in for """
+        remote_cls = cls._classes.get(test_cls_name)
+        if remote_cls is None:
+            remote_cls = cls._classes[test_cls_name] = type(test_cls_name, (cls,), {})
+        return remote_cls(*args)
+
+
+class TestTiming(NamedTuple):
+    """ Resources used by a test, memory is the peak in bytes allocated if traced """
+    wall_time: float
+    cpu_time: float
+    memory: Optional[int] = None
+
+
 class TestResult(unittest.TestResult):
     """
     TestResult stores the result of each test in the order they were executed
+    and the time taken by each, with its peak memory if trace_memory is True.
+    Once the record of a test is passed to on_record only its outcome is kept,
+    for skipIfFailed, and its failure or skip is counted instead of stored.
     """
+    trace_memory = False
+    # called with the record of each test as soon as it has run, see to_records
+    on_record: Optional[Callable[[Tuple], None]] = None
+
     def __init__(self, stream=None, descriptions=None, verbosity=None):
         super().__init__(stream, descriptions, verbosity)
         self._start = 0
         self._stop = 0
+        self._test_start: Tuple[float, float, int] = (0, 0, 0)
+        self._tracing_memory = False
         # TestCaseClassName  TestCaseName
         self.results: Dict[str, Dict[str, Tuple[TestCase, TestOutcome]]] = OrderedDict()
+        self.timings: Dict[str, Dict[str, TestTiming]] = OrderedDict()
+        # records of errors outside any test, such as in setUpClass
+        self.error_records: List[Tuple] = []
+        # failures, errors and skips of tests whose records were passed to on_record
+        self.streamed = {'FAIL': 0, 'ERROR': 0, 'SKIP': 0}
 
     def startTestRun(self):
+        if self.trace_memory and CAN_TRACE_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing_memory = True
         self._start = timer()
         super().startTestRun()
 
     def stopTestRun(self):
         self._stop = timer()
+        if self._tracing_memory:
+            tracemalloc.stop()
+            self._tracing_memory = False
         super().stopTestRun()
 
     @property
@@ -721,6 +1047,45 @@ class TestResult(unittest.TestResult):
         self._apply_skip(test, test_method)
 
         super().startTest(test)
+        memory = 0
+        if CAN_TRACE_MEMORY and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        self._test_start = (timer(), time.process_time(), memory)
+
+    def stopTest(self, test: TestCase):
+        wall_time, cpu_time = timer(), time.process_time()
+        start_wall, start_cpu, start_memory = self._test_start
+        memory = None
+        if CAN_TRACE_MEMORY and tracemalloc.is_tracing():
+            memory = tracemalloc.get_traced_memory()[1] - start_memory
+        self.timings.setdefault(test.__class__.__name__, OrderedDict())[test.name] = \
+            TestTiming(wall_time - start_wall, cpu_time - start_cpu, memory)
+        super().stopTest(test)
+        if self.on_record is not None:
+            record = self.to_record(test)
+            if record is not None:
+                self.on_record(record)
+                self._forget(record)
+
+    def _forget(self, record: Tuple):
+        """ Drops all but the outcome of a test whose record has been passed to on_record """
+        test_cls, name, description, outcome, aggregated, flavour, _, _ = record
+        self.results[test_cls][name] = (RemoteTest.create(test_cls, name, description, aggregated),
+                                        TestOutcome(outcome))
+        self.timings.get(test_cls, {}).pop(name, None)
+        if flavour is not None:
+            tests = {'FAIL': self.failures, 'ERROR': self.errors, 'SKIP': self.skipped}[flavour]
+            tests.pop()
+            self.streamed[flavour] += 1
+
+    def counts(self) -> Tuple[int, int]:
+        """ The number of tests which failed or had an error and the number skipped """
+        fails = len(self.failures) + len(self.errors) + self.streamed['FAIL'] + self.streamed['ERROR']
+        return fails, len(self.skipped) + self.streamed['SKIP']
+
+    def wasSuccessful(self):
+        return super().wasSuccessful() and not (self.streamed['FAIL'] or self.streamed['ERROR'])
 
     def _apply_skip(self, test: TestCase, test_item: Union[Type[TestCase], FunctionType]):
         """
@@ -798,6 +1163,14 @@ class TestResult(unittest.TestResult):
 
     @unittest.result.failfast
     def addError(self, test: TestCase, err: Tuple[Type[Exception], BaseException, TracebackType]):
+        if not isinstance(test, unittest.TestCase):
+            # an error in setUpClass, setUpModule or their tear downs, which never reaches stopTest
+            super().addError(test, err)
+            record = self._error_record(test, self.errors[-1][1])
+            self.error_records.append(record)
+            if self.on_record is not None:
+                self.on_record(record)
+            return
         self.add_outcome(test, TestOutcome.FAIL)
         super().addError(test, err)
 
@@ -812,6 +1185,88 @@ class TestResult(unittest.TestResult):
         """
         return '__TEST_RUNNER' in tb.tb_frame.f_globals or super()._is_relevant_tb_level(tb)
 
+    def to_records(self) -> List[Tuple]:
+        """
+        Picklable summary of every test run, in order, as tuples of
+        (TestCase class name, name, description, outcome, aggregated tests, flavour, message, timing)
+        where flavour and message are None unless the test failed or was skipped
+        """
+        messages = {}
+        for flavour, tests in (('FAIL', self.failures), ('ERROR', self.errors), ('SKIP', self.skipped)):
+            for test, msg in tests:
+                messages[id(test)] = (flavour, msg)
+
+        records = []
+        for test_cls, res in self.results.items():
+            for name, (test, outcome) in res.items():
+                flavour, msg = messages.get(id(test), (None, None))
+                records.append(self._make_record(test_cls, name, test, outcome, flavour, msg))
+        return records + self.error_records
+
+    def to_record(self, test: TestCase) -> Optional[Tuple]:
+        """ The record of the test which has just run, see to_records, None if it has no outcome """
+        test_cls = test.__class__.__name__
+        test_result = self.results.get(test_cls, {}).get(test.name)
+        if test_result is None or test_result[0] is not test:
+            return None
+
+        flavour, msg = None, None
+        # the test's message, if any, was the last one added
+        for flavour_, tests in (('FAIL', self.failures), ('ERROR', self.errors), ('SKIP', self.skipped)):
+            if tests and tests[-1][0] is test:
+                flavour, msg = flavour_, tests[-1][1]
+        return self._make_record(test_cls, test.name, test, test_result[1], flavour, msg)
+
+    def _make_record(self, test_cls: str, name: str, test: TestCase, outcome: TestOutcome,
+                     flavour: Optional[str], msg: Optional[str]) -> Tuple:
+        aggregated = [(None if err is None else str(err), tag) for err, tag in test.aggregated_tests]
+        timing = self.timings.get(test_cls, {}).get(name)
+        return (test_cls, name, test.description, outcome.value, aggregated, flavour, msg,
+                None if timing is None else tuple(timing))
+
+    @staticmethod
+    def _error_record(holder, msg: str) -> Tuple:
+        """
+        The record of an error outside any test, see to_records, named after
+        the class or module and the method it happened in. Its aggregated
+        tests are None.
+        """
+        match = re.fullmatch(r'(\w+) \((.*)\)', holder.description)
+        name, parent = match.groups() if match else (holder.description, '')
+        return (parent.rsplit('.', 1)[-1], name, holder.description, TestOutcome.FAIL.value, None, 'ERROR', msg,
+                None)
+
+    def add_records(self, records: List[Tuple], outcomes_only: bool = False) -> List[RemoteTest]:
+        """
+        Merge the records of tests run elsewhere, see to_records. If
+        outcomes_only is True they are only made visible to skipIfFailed and
+        are not counted as run.
+        """
+        tests = []
+        for record in records:
+            test_cls, name, description, outcome, aggregated, flavour, msg, timing = record
+            if aggregated is None:
+                # an error outside any test, not counted as run
+                if not outcomes_only:
+                    self.errors.append((RemoteTest.create(test_cls, name, description, []), msg))
+                    self.error_records.append(record)
+                continue
+            test = RemoteTest.create(test_cls, name, description, aggregated)
+            self.results.setdefault(test_cls, OrderedDict())[name] = (test, TestOutcome(outcome))
+            tests.append(test)
+            if outcomes_only:
+                continue
+            self.testsRun += 1
+            if timing is not None:
+                self.timings.setdefault(test_cls, OrderedDict())[name] = TestTiming(*timing)
+            if flavour == 'FAIL':
+                self.failures.append((test, msg))
+            elif flavour == 'ERROR':
+                self.errors.append((test, msg))
+            elif flavour == 'SKIP':
+                self.skipped.append((test, msg))
+        return tests
+
     def to_dict(self):
         return {
             test_cls:
@@ -819,6 +1274,20 @@ class TestResult(unittest.TestResult):
             for test_cls, res in self.results.items()
         }
 
+    def timings_to_dict(self):
+        return {
+            test_cls:
+                {name: timing._asdict() for name, timing in timings.items()}
+            for test_cls, timings in self.timings.items()
+        }
+
+    def slowest(self, count: int) -> List[Tuple[str, str, TestTiming]]:
+        """ The count tests which took the longest, as (TestCase class name, name, timing) """
+        timings = [(test_cls, name, timing) for test_cls, res in self.timings.items()
+                   for name, timing in res.items()]
+        timings.sort(key=lambda item: item[2].wall_time, reverse=True)
+        return timings[:count]
+
 
 class TestNoPrint(TestCase):
     def __init__(self, stdio: RedirectStdIO):
@@ -830,6 +1299,60 @@ class TestNoPrint(TestCase):
         self.assertEqual(self._stdio.stdout, '')
 
 
+# TestCases being run by TestMaster.run_parallel, inherited by forked workers
+_parallel_test_cases: List[Union[TestCase, Type[TestCase]]] = []
+
+
+def _run_parallel_test_case(index: int, prerequisites: List[Tuple], suppress_stdout: bool) -> Tuple[List[Tuple], str]:
+    """
+    Runs _parallel_test_cases[index] in a worker process
+
+    Parameters:
+        index: position of the TestCase in _parallel_test_cases
+        prerequisites: records of the tests it depends on through skipIfFailed
+        suppress_stdout: if True stdout output is captured and returned
+
+    Returns:
+        The records of the tests run and the stdout output captured
+    """
+    test_case = _parallel_test_cases[index]
+    suite = TestLoader().loadTestCases([test_case])
+    result = TestResult()
+    # records are reported by the parent process
+    result.on_record = None
+    result.add_records(prerequisites, outcomes_only=True)
+    with RedirectStdIO(stdin=True, stdout=suppress_stdout, stderr=True) as stdio:
+        result.startTestRun()
+        suite.run(result)
+        result.stopTestRun()
+    test_cls_name = _test_case_name(test_case)
+    records = [record for record in result.to_records() if record[0] == test_cls_name or record[4] is None]
+    return records, stdio.stdout if suppress_stdout else ''
+
+
+def _died_records(test_case: Union[TestCase, Type[TestCase]], error: BaseException) -> List[Tuple]:
+    """ Records reporting each test of a TestCase whose worker process died as an error, see to_records """
+    msg = f"The worker process running the test died\n{''.join(traceback.format_exception_only(type(error), error))}"
+    return [(_test_case_name(test_case), test.name, test.description, TestOutcome.FAIL.value, [], 'ERROR', msg, None)
+            for test in TestLoader().loadTestCases([test_case])]
+
+
+def _test_case_name(test_case: Union[TestCase, Type[TestCase]]) -> str:
+    return test_case.__name__ if inspect.isclass(test_case) else test_case.__class__.__name__
+
+
+def _prerequisites(test_case: Union[TestCase, Type[TestCase]]) -> set:
+    """ Names of the other TestCases which test_case depends on through skipIfFailed """
+    test_cls = test_case if inspect.isclass(test_case) else test_case.__class__
+    items = [test_cls] + [getattr(test_cls, name) for name in getattr(test_cls, 'member_names', ())]
+    names = set()
+    for item in items:
+        for dependency, _, _ in getattr(item, '__skip_test__', None) or ():
+            if dependency is not None and dependency is not test_cls:
+                names.add(dependency.__name__)
+    return names
+
+
 class TestMaster:
     """
     Core driving class which creates the TestSuite from the provided TestCases
@@ -847,11 +1370,16 @@ class TestMaster:
                  max_diff: int = None,
                  suppress_stdout: bool = True,
                  timeout: float = DEFAULT_TIMEOUT,
+                 timeout_mode: str = DEFAULT_TIMEOUT_MODE,
                  output_json: bool = False,
+                 output_ndjson: bool = False,
                  hide_paths: bool = True,
                  ignore_import_fails: bool = False,
                  include_no_print: bool = False,
                  disable_tk: bool = False,
+                 jobs: int = DEFAULT_JOBS,
+                 durations: int = 0,
+                 trace_memory: bool = False,
                  scripts: List[Tuple[str, str]] = ()):
         """
         Parameters:
@@ -859,8 +1387,16 @@ class TestMaster:
                 methods that report diffs on failure. Set to None for no max
             suppress_stdout: If True all uncaught stdout output is suppressed
             timeout: global timeout value in seconds, if a timeout > 0 is
-                specified then the tests are run in killable threads.
+                specified then tests running longer are interrupted and skipped.
+            timeout_mode: how timeouts are enforced, 'signal' interrupts the
+                test with SIGALRM at no cost while it runs, 'trace' checks the
+                time on every line executed which works on any platform but
+                slows the test down. 'signal' falls back to 'trace' where
+                SIGALRM is unavailable.
             output_json: outputs text summary if True else in json format.
+            output_ndjson: outputs a line of compact json for each test as
+                soon as it has run, then one for the summary. Takes
+                precedence over output_json.
             hide_paths: if True file paths in traceback messages for failures
                 are removed to only contain the filename.
             ignore_import_fails: If set to True not tests will run if any module
@@ -869,6 +1405,15 @@ class TestMaster:
             include_no_print: iff True adds a test for uncaught prints during
                 tests. Requires suppress_stdout to be set as well.
             disable_tk: Used to patch tkinter.Tk with a mainloop that does nothing
+            jobs: the number of worker processes TestCases are spread across,
+                a TestCase only starts once those it depends on through
+                skipIfFailed have finished. Tests run serially if 1 or where
+                processes can't be forked.
+            durations: the number of slowest tests listed after the summary,
+                the time taken by every test is part of the json output.
+            trace_memory: if True the peak memory allocated by each test is
+                measured with tracemalloc, which slows tests down. Needs
+                Python 3.9 or later, memory is left out on older versions.
             scripts: list of tuples, these tuples are a pair of module name and
                 module path that gets imported using 'path' with the __name__
                 attribute of the module set to 'name'. On successful import a
@@ -881,6 +1426,10 @@ class TestMaster:
                             help="Whether or not to display output in JSON format.",
                             action='store_true',
                             default=output_json)
+        parser.add_argument("--ndjson",
+                            help="Output a line of JSON for each test as it completes",
+                            action='store_true',
+                            default=output_ndjson)
         parser.add_argument("-d", "--diff",
                             help="The maximum number of characters in a diff",
                             action="store",
@@ -891,6 +1440,24 @@ class TestMaster:
                             action="store",
                             default=timeout,
                             type=float)
+        parser.add_argument("--timeout-mode",
+                            help="How timeouts are enforced, 'signal' (default) or 'trace'",
+                            choices=TIMEOUT_MODES,
+                            default=timeout_mode)
+        parser.add_argument("--jobs",
+                            help="The number of worker processes to run test cases in",
+                            action="store",
+                            default=jobs,
+                            type=int)
+        parser.add_argument("--durations",
+                            help="The number of slowest tests to list",
+                            action="store",
+                            default=durations,
+                            type=int)
+        parser.add_argument("--trace-memory",
+                            help="Measure the peak memory allocated by each test (Python 3.9+)",
+                            action="store_true",
+                            default=trace_memory)
         parser.add_argument('-p', '--paths', nargs="+")
         parser.add_argument('-s', '--scripts', nargs="+")
         parser.add_argument("--hide-tb-paths",
@@ -921,6 +1488,8 @@ class TestMaster:
 
         TestCase.maxDiff = args.diff
         TestCase.timeout_interval = args.timeout
+        TestCase.timeout_mode = args.timeout_mode
+        TestResult.trace_memory = args.trace_memory
 
         if args.disable_tk:
             tk.Tk = MockTk
@@ -932,6 +1501,8 @@ class TestMaster:
             scripts = zip(args.scripts, args.paths)
 
         self._import_errors: List[Tuple[str, Tuple[str, str, str]]] = []
+        # ndjson records are written here while stdout is redirected
+        self._stream = sys.stdout
         # import scripts
         for name, path in scripts:
             name = name.strip()
@@ -980,6 +1551,13 @@ class TestMaster:
                     self.print_error(flavour, test, DUPLICATE_MSG if msg == prev else msg.strip())
                     prev = msg
 
+    def print_durations(self, result: TestResult):
+        print(self.separator2)
+        print(BLOCK_TEMPLATE.format(f'Slowest {self._args.durations} Tests'))
+        for test_cls, name, timing in result.slowest(self._args.durations):
+            memory = f', {timing.memory / 1024:.1f} KiB peak' if timing.memory is not None else ''
+            print(f'{timing.wall_time:.3f}s ({timing.cpu_time:.3f}s CPU{memory}) {test_cls}.{name}')
+
     def print_error(self, flavour: str, test: TestCase, msg: str):
         print(self.separator1)
         print(f'{flavour}: {test.__class__.__name__} {test.description}')
@@ -1014,18 +1592,43 @@ class TestMaster:
 
         return err_type, msg, err_msg
 
+    def write_record(self, record: Tuple):
+        """ Writes the record of a test, see TestResult.to_records, as a line of compact json """
+        test_cls, name, description, outcome, _, flavour, msg, timing = record
+        data = dict(test_case=test_cls, test=name, description=description, outcome=outcome)
+        if timing is not None:
+            data.update(TestTiming(*timing)._asdict())
+        if flavour is not None:
+            if self._args.hide_tb_paths:
+                msg = self._remove_path.sub(r'File "\1"', msg)
+            data.update(flavour=flavour, message=msg)
+        self._write_line(data)
+
+    def _write_line(self, data: dict):
+        json.dump(data, self._stream, separators=(',', ':'))
+        self._stream.write('\n')
+        self._stream.flush()
+
     def output_results(self, all_tests: List[TestCase], result: TestResult):
         runtime = result.run_time
-        total = result.testsRun
-        fails, skips = len(result.failures) + len(result.errors), len(result.skipped)
+        # errors outside any test count as failed tests
+        total = result.testsRun + len(result.error_records)
+        fails, skips = result.counts()
         passed = total - fails - skips
 
-        if self._args.json:
+        if self._args.ndjson:
+            errors = []
+            for _, (err_type, msg, err_msg) in self._import_errors:
+                errors.append(dict(error=err_type, error_message=f'{msg}\n{err_msg}'))
+            self._write_line(dict(total=total, failed=fails, skipped=skips, passed=passed,
+                                  time=runtime, errors=errors))
+        elif self._args.json:
             errors = []
             for _, (err_type, msg, err_msg) in self._import_errors:
                 errors.append(dict(error=err_type, error_message=f'{msg}\n{err_msg}'))
             data = dict(total=total, failed=fails, skipped=skips, passed=passed,
-                        time=runtime, results=result.to_dict(), errors=errors)
+                        time=runtime, results=result.to_dict(), timings=result.timings_to_dict(),
+                        errors=errors)
             json.dump(data, sys.stdout, indent=4)
         else:
             # Join the lists sorted by the test order
@@ -1033,8 +1636,11 @@ class TestMaster:
                 self._add_flavour('FAIL', result.failures) +
                 self._add_flavour('ERROR', result.errors) +
                 self._add_flavour('SKIP', result.skipped),
-                key=lambda t: all_tests.index(t[1]))
+                # errors outside any test come last
+                key=lambda t: all_tests.index(t[1]) if t[1] in all_tests else len(all_tests))
             self.print_results(failed_tests, result)
+            if self._args.durations > 0:
+                self.print_durations(result)
             print(self.separator2)
             print(f'Ran {total} tests in {runtime:.3f} seconds with '
                   f'{passed} passed/{skips} skipped/{fails} failed.')
@@ -1042,7 +1648,9 @@ class TestMaster:
     def run(self, test_cases: List[Union[TestCase, Type[TestCase]]]) -> Optional[TestResult]:
         if not self._args.ignore_import_fails and self._import_errors:
             _, (err_type, msg, err_msg) = self._import_errors[0]
-            if self._args.json:
+            if self._args.ndjson:
+                self._write_line(dict(error=err_type, error_message=f'{msg}\n{err_msg}'))
+            elif self._args.json:
                 data = dict(error=err_type, error_message=f'{msg}\n{err_msg}')
                 json.dump(data, sys.stdout, indent=4)
             else:
@@ -1053,6 +1661,8 @@ class TestMaster:
 
         suite = TestLoader().loadTestCases(test_cases)
 
+        TestResult.on_record = self.write_record if self._args.ndjson else None
+
         # redirect stderr to hide unittest output
         with RedirectStdIO(stdin=True,
                            stdout=self._args.suppress_stdout,
@@ -1065,8 +1675,99 @@ class TestMaster:
                     raise RuntimeError("Can't test for no print without suppressing stdout")
                 suite.addTest(TestNoPrint(stdio))
 
-            all_tests = list(suite)
-            result = runner.run(suite)
+            if self._args.jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+                all_tests, result = self.run_parallel(test_cases, stdio)
+            else:
+                all_tests = list(suite)
+                result = runner.run(suite)
 
         self.output_results(all_tests, result)
         return result
+
+    def _finish(self, index: int, records: Dict[int, List[Tuple]], finished: set, test_cls_names: List[str]):
+        """ Marks the TestCase at index as finished by run_parallel, writing its records if ndjson """
+        if self._args.ndjson:
+            for record in records[index]:
+                self.write_record(record)
+        finished.add(test_cls_names[index])
+
+    def run_parallel(self, test_cases: List[Union[TestCase, Type[TestCase]]],
+                     stdio: RedirectStdIO) -> Tuple[List[TestCase], TestResult]:
+        """
+        Runs each TestCase in a forked worker process once the TestCases it
+        depends on have finished, merging their results in the given order.
+        If a worker dies the TestCases running are rerun one at a time, and
+        the tests of one whose worker dies running alone are reported as errors.
+        """
+        global _parallel_test_cases
+        _parallel_test_cases = list(test_cases)
+        dependencies = [_prerequisites(test_case) for test_case in test_cases]
+        test_cls_names = [_test_case_name(test_case) for test_case in test_cases]
+
+        result = TestResult()
+        result.startTestRun()
+        records: Dict[int, List[Tuple]] = {}
+        finished = set()
+        pending = list(range(len(test_cases)))
+        running = {}
+        # TestCases running when a worker died, each is run alone
+        isolated = set()
+        context = multiprocessing.get_context('fork')
+        executor = ProcessPoolExecutor(max_workers=self._args.jobs, mp_context=context)
+        try:
+            while pending or running:
+                for index in list(pending):
+                    if isolated & set(running.values()):
+                        break
+                    # prerequisites not being run are left for skipIfFailed to report
+                    waiting = (dependencies[index] & set(test_cls_names)) - finished
+                    if waiting or (index in isolated and running):
+                        continue
+                    pending.remove(index)
+                    prerequisites = [record for i, name in enumerate(test_cls_names)
+                                     if name in dependencies[index] and i in records for record in records[i]]
+                    future = executor.submit(_run_parallel_test_case, index, prerequisites,
+                                             self._args.suppress_stdout)
+                    running[future] = index
+
+                if not running:
+                    raise RuntimeError("TestCases depend on each other through skipIfFailed")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = None
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        records[index], stdout = future.result()
+                    except BrokenProcessPool as error:
+                        broken = error
+                        running[future] = index
+                        continue
+                    sys.stdout.write(stdout)
+                    self._finish(index, records, finished, test_cls_names)
+
+                if broken is not None:
+                    # the pool died with every TestCase running in it
+                    died = list(running.values())
+                    running.clear()
+                    executor.shutdown()
+                    executor = ProcessPoolExecutor(max_workers=self._args.jobs, mp_context=context)
+                    for index in died:
+                        if len(died) == 1 or index in isolated:
+                            records[index] = _died_records(test_cases[index], broken)
+                            self._finish(index, records, finished, test_cls_names)
+                        else:
+                            isolated.add(index)
+                            pending.append(index)
+        finally:
+            executor.shutdown()
+
+        all_tests = []
+        for index in range(len(test_cases)):
+            all_tests.extend(result.add_records(records[index]))
+
+        if self._args.include_no_print:
+            test = TestNoPrint(stdio)
+            test(result)
+            all_tests.append(test)
+        result.stopTestRun()
+        return all_tests, result
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Vectorized Sleeping Coders engine
+
+Plays a batch of games in lockstep with NumPy. Cards are encoded as small
+integer ids, every Deck of every game (pickup pile, hands, coder decks and
+sleeping coders) is a row of an array and one turn is advanced across the
+whole batch at once.
+
+Requires NumPy, unlike the rest of the simulator.
+"""
+
+import argparse
+import random
+
+from timeit import default_timer as timer
+
+import numpy as np
+
+from a2 import AllNighterCard, CoderCard, KeyboardKidnapperCard, NumberCard, TutorCard
+from a2_support import CODERS, FULL_DECK, build_deck
+from moves import WIN_CODERS
+from simulator import HAND_SIZE, FirstPolicy, GameResult, SimulationReport, Simulator
+
+# Card kinds, the behaviour shared by every card of a class
+NUMBER, TUTOR, KIDNAPPER, ALL_NIGHTER, CODER = range(5)
+
+KINDS = {
+    NumberCard: NUMBER,
+    TutorCard: TUTOR,
+    KeyboardKidnapperCard: KIDNAPPER,
+    AllNighterCard: ALL_NIGHTER,
+    CoderCard: CODER,
+}
+
+# Id of an empty slot, e.g. a sleeping coder slot which has been picked up
+EMPTY = 0
+
+POLICIES = ('first', 'random')
+
+
+class CardTable:
+    """
+    Bidirectional mapping between cards and their small integer ids.
+
+    Cards with the same class and number or name share an id.
+    """
+
+    def __init__(self, cards=()):
+        """
+        Construct a table containing the given cards.
+
+        Parameters:
+            cards (list<Card>): Cards to assign ids to.
+        """
+        self._ids = {}
+        self._cards = [None]
+        self._kinds = [-1]
+        for card in cards:
+            self.encode(card)
+
+    def encode(self, card):
+        """
+        Get the id of a card, assigning a new id if the card is unseen.
+
+        Parameters:
+            card (Card): The card to encode, or None for an empty slot.
+
+        Returns:
+            (int): The id of the card.
+        """
+        if card is None:
+            return EMPTY
+
+        key = card.get_key()
+        card_id = self._ids.get(key)
+        if card_id is None:
+            card_id = self._ids[key] = len(self._cards)
+            self._cards.append(card)
+            self._kinds.append(KINDS[card.__class__])
+        return card_id
+
+    def decode(self, card_id):
+        """(Card): Returns a card with the given id, None if the id is EMPTY."""
+        return self._cards[card_id]
+
+    def kinds(self):
+        """(np.ndarray): Returns the kind of each card, indexed by id."""
+        return np.array(self._kinds, dtype=np.int8)
+
+    def __len__(self):
+        return len(self._cards)
+
+
+class VectorGames:
+    """
+    A batch of games of Sleeping Coders stored as NumPy arrays.
+
+    The top of the pickup pile and of every coder deck is the last used
+    column of its row, matching Deck.
+    """
+
+    def __init__(self, table, pile, pile_len, hands, coders, coders_len, sleeping, seeds=None):
+        """
+        Construct a batch from its encoded decks.
+
+        Parameters:
+            table (CardTable): Maps the card ids used in the arrays.
+            pile (np.ndarray): [games, cards] pickup pile of each game.
+            pile_len (np.ndarray): [games] amount of cards in each pickup pile.
+            hands (np.ndarray): [games, players, hand size] each player's hand.
+            coders (np.ndarray): [games, players, coders] each player's coders.
+            coders_len (np.ndarray): [games, players] amount of coders held.
+            sleeping (np.ndarray): [games, coders] sleeping coder slots.
+            seeds (list<int>): The seed of each game, if known.
+        """
+        self.table = table
+        self.pile = pile
+        self.pile_len = pile_len
+        self.hands = hands
+        self.coders = coders
+        self.coders_len = coders_len
+        self.sleeping = sleeping
+        self.seeds = seeds
+        self._kinds = table.kinds()
+
+        games, players = coders_len.shape
+        self.turn = np.zeros(games, dtype=np.int64)
+        self.turns = np.zeros(games, dtype=np.int64)
+        self.over = np.zeros(games, dtype=bool)
+        self.winner = np.full(games, -1, dtype=np.int64)
+
+    @classmethod
+    def from_games(cls, games, seeds=None):
+        """
+        Encode freshly dealt CodersGame instances.
+
+        Parameters:
+            games (list<CodersGame>): Games with the same amount of players
+                                      and pickup pile size.
+            seeds (list<int>): The seed each game was dealt with.
+
+        Returns:
+            (VectorGames): The encoded batch.
+        """
+        table = CardTable(CODERS)
+        count, players = len(games), len(games[0].players)
+        slots = len(games[0].get_sleeping_coders())
+
+        pile = np.array([[table.encode(card) for card in game.get_pickup_pile().get_cards()]
+                         for game in games], dtype=np.int16)
+        hands = np.array([[[table.encode(card) for card in player.get_hand().get_cards()]
+                           for player in game.players] for game in games], dtype=np.int16)
+        sleeping = np.array([[table.encode(card) for card in game.get_sleeping_coders()]
+                             for game in games], dtype=np.int16)
+        pile_len = np.full(count, pile.shape[1], dtype=np.int64)
+        coders = np.zeros((count, players, slots), dtype=np.int16)
+        coders_len = np.zeros((count, players), dtype=np.int64)
+        return cls(table, pile, pile_len, hands, coders, coders_len, sleeping, seeds)
+
+    @classmethod
+    def deal(cls, games, players, rng, deck_copies=0, hand_size=HAND_SIZE):
+        """
+        Deal a batch of games entirely in NumPy.
+
+        Parameters:
+            games (int): The amount of games to deal.
+            players (int): The amount of players in each game.
+            rng (np.random.Generator): Shuffles the pickup piles.
+            deck_copies (int): The amount of times the full deck is doubled.
+            hand_size (int): The amount of cards dealt to each player.
+
+        Returns:
+            (VectorGames): The dealt batch.
+        """
+        table = CardTable(CODERS)
+        deck = np.array([table.encode(card) for card in build_deck(FULL_DECK)], dtype=np.int16)
+        deck = np.tile(deck, 2 ** deck_copies)
+
+        pile = rng.permuted(np.tile(deck, (games, 1)), axis=1)
+        size = pile.shape[1]
+        # Deck.pick takes from the end, seat by seat
+        order = size - 1 - np.arange(players * hand_size).reshape(players, hand_size)
+        hands = pile[:, order]
+        pile_len = np.full(games, size - players * hand_size, dtype=np.int64)
+
+        sleeping = np.tile(np.array([table.encode(card) for card in CODERS], dtype=np.int16),
+                           (games, 1))
+        coders = np.zeros((games, players, len(CODERS)), dtype=np.int16)
+        coders_len = np.zeros((games, players), dtype=np.int64)
+        return cls(table, pile, pile_len, hands, coders, coders_len, sleeping)
+
+    def _remove_from_rows(self, rows, games, seats, slots):
+        """
+        Remove the card at slots from rows, shifting later cards down a slot
+        as list.pop does.
+        """
+        width = rows.shape[2]
+        columns = np.arange(width - 1)
+        source = columns + (columns >= slots[:, None])
+        rows[games[:, None], seats[:, None], columns] = rows[games[:, None], seats[:, None], source]
+        rows[games, seats, width - 1] = EMPTY
+
+    def _check_over(self, active):
+        """Mark active games which are over, as CodersGame.is_over does."""
+        exhausted = self.pile_len[active] == 0
+        won = self.coders_len[active] >= WIN_CODERS
+        has_winner = won.any(axis=1) & ~exhausted
+
+        players = won.shape[1]
+        # CodersGame.is_over keeps the last winning player
+        last = players - 1 - np.argmax(won[:, ::-1], axis=1)
+        self.winner[active[has_winner]] = last[has_winner]
+        self.over[active[exhausted | has_winner]] = True
+
+    def _choose(self, counts, policy, rng):
+        """Choose an index below each count, counts must be positive."""
+        if policy == 'first':
+            return np.zeros(len(counts), dtype=np.int64)
+        return (rng.random(len(counts)) * counts).astype(np.int64)
+
+    def step(self, policy='first', rng=None):
+        """
+        Advance every game which is not over by one turn.
+
+        Parameters:
+            policy (str): 'first' to mirror simulator.FirstPolicy, otherwise
+                          'random' to play uniformly random moves.
+            rng (np.random.Generator): Used by the random policy.
+
+        Returns:
+            (int): The amount of games advanced.
+        """
+        active = np.flatnonzero(~self.over)
+        self._check_over(active)
+        active = active[~self.over[active]]
+        if len(active) == 0:
+            return 0
+
+        seats = self.turn[active]
+        hand_size = self.hands.shape[2]
+        slots = self._choose(np.full(len(active), hand_size), policy, rng)
+        cards = self.hands[active, seats, slots]
+
+        # Card.play: remove from hand, pick up from the pile
+        self._remove_from_rows(self.hands, active, seats, slots)
+        self.pile_len[active] -= 1
+        self.hands[active, seats, hand_size - 1] = self.pile[active, self.pile_len[active]]
+
+        kinds = self._kinds[cards]
+        self._tutor(active[kinds == TUTOR], seats[kinds == TUTOR], policy, rng)
+        for kind in (KIDNAPPER, ALL_NIGHTER):
+            self._action(active[kinds == kind], seats[kinds == kind], kind, policy, rng)
+
+        # every card ends by moving to the next player
+        self.turn[active] = (seats + 1) % self.coders_len.shape[1]
+        self.turns[active] += 1
+        return len(active)
+
+    def _tutor(self, games, seats, policy, rng):
+        """TutorCard.action: take a sleeping coder, if there are any left."""
+        occupied = self.sleeping[games] != EMPTY
+        counts = occupied.sum(axis=1)
+        has_target = counts > 0
+        games, seats, occupied, counts = \
+            games[has_target], seats[has_target], occupied[has_target], counts[has_target]
+        if len(games) == 0:
+            return
+
+        rank = self._choose(counts, policy, rng)
+        slots = np.argmax(np.cumsum(occupied, axis=1) > rank[:, None], axis=1)
+        self._add_coders(games, seats, self.sleeping[games, slots])
+        self.sleeping[games, slots] = EMPTY
+
+    def _action(self, games, seats, kind, policy, rng):
+        """ActionCard.action: take a coder from an opponent, if any have one."""
+        counts = self.coders_len[games].copy()
+        counts[np.arange(len(games)), seats] = 0
+        totals = counts.sum(axis=1)
+        has_target = totals > 0
+        games, seats, counts, totals = \
+            games[has_target], seats[has_target], counts[has_target], totals[has_target]
+        if len(games) == 0:
+            return
+
+        rank = self._choose(totals, policy, rng)
+        cumulative = np.cumsum(counts, axis=1)
+        owners = np.argmax(cumulative > rank[:, None], axis=1)
+        index = np.arange(len(games))
+        slots = rank - (cumulative[index, owners] - counts[index, owners])
+
+        coders = self.coders[games, owners, slots]
+        self._remove_from_rows(self.coders, games, owners, slots)
+        self.coders_len[games, owners] -= 1
+
+        if kind == KIDNAPPER:
+            self._add_coders(games, seats, coders)
+        else:
+            free = np.argmax(self.sleeping[games] == EMPTY, axis=1)
+            self.sleeping[games, free] = coders
+
+    def _add_coders(self, games, seats, coders):
+        self.coders[games, seats, self.coders_len[games, seats]] = coders
+        self.coders_len[games, seats] += 1
+
+    def run(self, policy='first', rng=None):
+        """
+        Play every game in the batch to completion.
+
+        Parameters:
+            policy (str): The policy of every seat, one of POLICIES.
+            rng (np.random.Generator): Used by the random policy.
+
+        Returns:
+            (int): The total amount of turns played.
+        """
+        while self.step(policy, rng):
+            pass
+        return int(self.turns.sum())
+
+    def results(self):
+        """(list<GameResult>): Returns the outcome of each game."""
+        seeds = self.seeds if self.seeds is not None else [None] * len(self.turns)
+        return [GameResult(seed, None if winner < 0 else winner, turns, tuple(coders))
+                for seed, winner, turns, coders in zip(seeds, self.winner.tolist(),
+                                                       self.turns.tolist(),
+                                                       self.coders_len.tolist())]
+
+
+def check_equivalence(games, players=2, seed=0, deck_copies=0):
+    """
+    Play the same seeded games with the object engine and the vectorized
+    engine, both playing the first card and first target.
+
+    Parameters:
+        games (int): The amount of games to compare.
+        players (int): The amount of players in each game.
+        seed (int): The seed of the first game.
+        deck_copies (int): The amount of times the full deck is doubled.
+
+    Returns:
+        (list<tuple<GameResult, GameResult>>): The object and vectorized
+            results of each game which differed, empty if equivalent.
+    """
+    simulator = Simulator([FirstPolicy() for _ in range(players)], deck_copies=deck_copies)
+    seeds = list(range(seed, seed + games))
+
+    expected = [simulator.play_game(game_seed) for game_seed in seeds]
+
+    batch = VectorGames.from_games([simulator.new_game(random.Random(game_seed))
+                                    for game_seed in seeds], seeds)
+    batch.run('first')
+
+    return [(object_result, vector_result)
+            for object_result, vector_result in zip(expected, batch.results())
+            if object_result != vector_result]
+
+
+def run(games, players=2, seed=0, policy='random', deck_copies=0):
+    """
+    Deal and play a batch of games with the vectorized engine.
+
+    Parameters:
+        games (int): The amount of games to play.
+        players (int): The amount of players in each game.
+        seed (int): Seeds the NumPy random number generator.
+        policy (str): The policy of every seat, one of POLICIES.
+        deck_copies (int): The amount of times the full deck is doubled.
+
+    Returns:
+        (SimulationReport): The results of every game and the throughput.
+    """
+    rng = np.random.default_rng(seed)
+    start = timer()
+    batch = VectorGames.deal(games, players, rng, deck_copies=deck_copies)
+    batch.run(policy, rng)
+    return SimulationReport(batch.results(), timer() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate games of Sleeping Coders with NumPy")
+    parser.add_argument("-n", "--games", type=int, default=100000,
+                        help="The amount of games to simulate")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="Seeds the random number generator")
+    parser.add_argument("--players", type=int, default=2,
+                        help="The amount of players in each game")
+    parser.add_argument("-p", "--policy", default="random", choices=POLICIES,
+                        help="The policy of every seat")
+    parser.add_argument("--deck-copies", type=int, default=0,
+                        help="The amount of times the full deck is doubled")
+    parser.add_argument("--check", type=int, default=0, metavar="GAMES",
+                        help="Compare GAMES seeded games against the object engine")
+    args = parser.parse_args()
+
+    if args.check:
+        differences = check_equivalence(args.check, players=args.players, seed=args.seed,
+                                        deck_copies=args.deck_copies)
+        print(f"{args.check - len(differences)}/{args.check} games equivalent")
+        for expected, actual in differences[:10]:
+            print(f"object: {expected}\nvector: {actual}")
+        return
+
+    report = run(args.games, players=args.players, seed=args.seed,
+                 policy=args.policy, deck_copies=args.deck_copies)
+    print(report)
+    print(f"Wins by seat: {report.wins()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Zobrist hashing of games of Sleeping Coders
+
+A ZobristHash listens to every deck and the sleeping coder slots of a game and
+keeps a 64-bit hash of the game up to date as cards move. Adding or removing
+the top card of a pile, or any card of a hand or coder collection, takes
+constant time. A card placed or taken below the top of a pile shifts every
+card above it, which are rehashed, so it takes time linear in the size of
+the pile. The current player and pending action are folded in when the hash
+is read, since they are changed without telling any listener.
+
+Hands and coder collections are hashed as multisets, so the order of the cards
+in them does not change the hash. The pickup and putdown piles are hashed by
+slot, as their order matters. Keys are derived from the cards' get_key rather
+than their identity, so identical states hash alike in any process.
+"""
+
+import hashlib
+
+from a2 import SleepingCoders
+from gamestate import get_turn_state
+
+# Salt of every key, change it to get an unrelated family of hashes
+ZOBRIST_SALT = b"sleeping-coders"
+
+# role of the decks hashed by slot
+PICKUP = "pickup"
+PUTDOWN = "putdown"
+# role of the decks hashed as multisets, followed by the seat
+HAND = "hand"
+CODERS = "coders"
+SLEEPING = "sleeping"
+TURN = "turn"
+ACTION = "action"
+
+_keys = {}
+
+
+def zobrist_key(*parts):
+    """
+    Returns the random 64-bit key of a feature of a game, the same in every
+    process.
+
+    Parameters:
+        *parts (tuple): Describes the feature, e.g. a role, slot and card key.
+
+    Returns:
+        (int): The key of the feature.
+    """
+    key = _keys.get(parts)
+    if key is None:
+        text = repr(_stable(parts))
+        digest = hashlib.blake2b(text.encode(), digest_size=8, key=ZOBRIST_SALT).digest()
+        key = _keys[parts] = int.from_bytes(digest, 'little')
+    return key
+
+
+def _stable(part):
+    """Replace the classes within part by their names, which repr the same in every process."""
+    if isinstance(part, tuple):
+        return tuple(_stable(item) for item in part)
+    if isinstance(part, type):
+        return part.__name__
+    return part
+
+
+def _card_key(card):
+    """(tuple): Returns the key of a card, None for an empty slot."""
+    return None if card is None else card.get_key()
+
+
+class ZobristHash:
+    """
+    An incrementally maintained 64-bit hash of a CodersGame.
+    """
+
+    def __init__(self, game):
+        """
+        Start hashing a game, computing its hash from scratch.
+
+        Parameters:
+            game (CodersGame): The game to hash. Its sleeping coders must be a
+                               SleepingCoders for changes to them to be seen,
+                               and none of its decks may track positions.
+        """
+        coders = game.get_sleeping_coders()
+        if not isinstance(coders, SleepingCoders):
+            raise TypeError("the sleeping coders of a hashed game must be a SleepingCoders")
+        decks = [game.get_pickup_pile(), game.putdown_pile]
+        for player in game.players:
+            decks.extend((player.get_hand(), player.get_coders()))
+        for deck in decks:
+            # removing a card moves the top card into its slot, which the
+            # pile hashes can't follow
+            if deck.tracks_positions():
+                raise ValueError("cannot hash a deck tracking positions")
+
+        self._game = game
+        self._coders = coders
+        # deck -> role, seat is None for the piles
+        self._roles = {game.get_pickup_pile(): (PICKUP, None), game.putdown_pile: (PUTDOWN, None)}
+        for seat, player in enumerate(game.players):
+            self._roles[player.get_hand()] = (HAND, seat)
+            self._roles[player.get_coders()] = (CODERS, seat)
+        # multiset deck -> {card key: amount held}
+        self._counts = {}
+        self._hash = _board_hash(game, self._counts)
+        # pile -> amount of cards hashed, the pile itself may already hold
+        # the cards of later notifications of the same operation
+        self._sizes = {deck: deck.get_amount() for deck, (_, seat) in self._roles.items()
+                       if seat is None}
+
+        for deck in self._roles:
+            deck.add_listener(self)
+        coders.add_listener(self)
+
+    def detach(self):
+        """Stop keeping the hash of the game up to date."""
+        for deck in self._roles:
+            deck.remove_listener(self)
+        self._coders.remove_listener(self)
+
+    def value(self):
+        """(int): Returns the 64-bit hash of the game."""
+        game = self._game
+        return (self._hash
+                ^ zobrist_key(TURN, *get_turn_state(game))
+                ^ zobrist_key(ACTION, game.get_action()))
+
+    def _shift(self, deck, role, start, offset):
+        """
+        Rehash the cards of a pile from start upwards after they moved by
+        offset slots.
+        """
+        hash_ = self._hash
+        for slot in range(start, deck.get_amount()):
+            key = _card_key(deck.get_card(slot))
+            hash_ ^= zobrist_key(role, slot - offset, key) ^ zobrist_key(role, slot, key)
+        self._hash = hash_
+
+    def card_added(self, deck, slot, card):
+        """Hash a card placed at a slot in a deck."""
+        role, seat = self._roles[deck]
+        key = _card_key(card)
+        if seat is None:
+            size = self._sizes[deck] = self._sizes[deck] + 1
+            if slot != size - 1:
+                self._shift(deck, role, slot + 1, 1)
+            self._hash ^= zobrist_key(role, slot, key)
+        else:
+            counts = self._counts[deck]
+            count = counts[key] = counts.get(key, 0) + 1
+            self._hash ^= zobrist_key(role, seat, key, count)
+
+    def card_removed(self, deck, slot, card):
+        """Unhash a card taken from a slot in a deck."""
+        role, seat = self._roles[deck]
+        key = _card_key(card)
+        if seat is None:
+            self._hash ^= zobrist_key(role, slot, key)
+            size = self._sizes[deck] = self._sizes[deck] - 1
+            if slot != size:
+                self._shift(deck, role, slot, -1)
+        else:
+            counts = self._counts[deck]
+            count = counts[key]
+            self._hash ^= zobrist_key(role, seat, key, count)
+            if count == 1:
+                del counts[key]
+            else:
+                counts[key] = count - 1
+
+    def slot_changed(self, coders, slot, old_card, new_card):
+        """Rehash a sleeping coder slot being set."""
+        self._hash ^= (zobrist_key(SLEEPING, slot, _card_key(old_card))
+                       ^ zobrist_key(SLEEPING, slot, _card_key(new_card)))
+
+
+def _board_hash(game, counts):
+    """
+    Compute the hash of the cards of a game from scratch.
+
+    Parameters:
+        game (CodersGame): The game to hash.
+        counts (dict<Deck, dict<tuple, int>>): Filled with the amount of each
+            card held in each hand and coder collection.
+
+    Returns:
+        (int): The hash of every deck and sleeping coder slot.
+    """
+    hash_ = 0
+    for role, deck in ((PICKUP, game.get_pickup_pile()), (PUTDOWN, game.putdown_pile)):
+        for slot in range(deck.get_amount()):
+            hash_ ^= zobrist_key(role, slot, _card_key(deck.get_card(slot)))
+
+    for seat, player in enumerate(game.players):
+        for role, deck in ((HAND, player.get_hand()), (CODERS, player.get_coders())):
+            deck_counts = counts[deck] = {}
+            for slot in range(deck.get_amount()):
+                key = _card_key(deck.get_card(slot))
+                count = deck_counts[key] = deck_counts.get(key, 0) + 1
+                hash_ ^= zobrist_key(role, seat, key, count)
+
+    for slot, card in enumerate(game.get_sleeping_coders()):
+        hash_ ^= zobrist_key(SLEEPING, slot, _card_key(card))
+    return hash_
+
+
+def hash_game(game):
+    """
+    Compute the hash of a game from scratch, equal to ZobristHash(game).value().
+
+    Parameters:
+        game (CodersGame): The game to hash.
+
+    Returns:
+        (int): The 64-bit hash of the game.
+    """
+    return (_board_hash(game, {})
+            ^ zobrist_key(TURN, *get_turn_state(game))
+            ^ zobrist_key(ACTION, game.get_action()))